@@ -0,0 +1,242 @@
+import functools
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+# Prefixes MaxQuant adds to accessions of contaminants and decoys, such as "CON__P02768" and "REV__P02768"
+ACCESSION_PREFIXES: list[str] = ["CON__", "REV__"]
+
+# A UniProt accession in FASTA header form, such as "sp|P02768|ALBU_HUMAN", and its accession
+FASTA_HEADER_PATTERN = re.compile(r"^(?:sp|tr)\|(?P<accession>[^|]+)\|")
+
+# An isoform ("P02768-2") or version ("P02768.3") suffix of an accession
+SUFFIX_PATTERN = re.compile(r"(?:-\d+|\.\d+)+$")
+
+
+@functools.lru_cache(maxsize=None)
+def canonical_accession(accession: str) -> str:
+    """
+    This function will convert a single accession to its canonical form, the key used to match proteins
+
+    For example, "P02768-2", "CON__P02768", "REV__P02768", "sp|P02768|ALBU_HUMAN", and "P02768.3" all become "P02768"
+
+    Decoys become the accession they were reversed from, so proteins should be matched after decoys are excluded
+    Each distinct accession is only parsed once, as results are cached
+
+    :param accession: An accession from MaxQuant results or the clinically relevant proteins
+    :return: The canonical accession
+    """
+    accession = accession.strip()
+
+    stripped = True
+    while stripped:
+        stripped = False
+        for prefix in ACCESSION_PREFIXES:
+            if accession.startswith(prefix):
+                accession = accession[len(prefix) :]
+                stripped = True
+
+    match = FASTA_HEADER_PATTERN.match(accession)
+    if match:
+        accession = match["accession"]
+
+    return SUFFIX_PATTERN.sub("", accession)
+
+
+def canonical_key(protein_ids: str) -> str:
+    """
+    This function will convert a semi-colon (;) separated list of accessions to a canonical key
+
+    Each accession is converted with canonical_accession, and repeated accessions (such as two isoforms
+    of the same protein) are kept once, in the order they first appear
+
+    :param protein_ids: A semi-colon separated list of accessions, such as "P02768-2;CON__P02768;Q9Y6R7"
+    :return: The canonical key, such as "P02768;Q9Y6R7"
+    """
+    accessions = dict.fromkeys(
+        canonical_accession(accession) for accession in str(protein_ids).split(";")
+    )
+    return ";".join(accession for accession in accessions if accession)
+
+
+def _canonical_ids_arrow(protein_ids: pd.Series) -> pd.Series:
+    """
+    This function will find the canonical key of every protein of a column with arrow compute functions
+    It gives the same keys as canonical_key: every accession of every row is converted at once, and repeated
+    accessions of a row are removed from the flattened (row, accession) pairs before they are joined again
+
+    :param protein_ids: The protein IDs of each row
+    :return: The canonical key of each row, with the same index
+    """
+    import pyarrow
+    import pyarrow.compute
+
+    if isinstance(protein_ids.dtype, pd.StringDtype) and protein_ids.dtype.storage == "pyarrow":
+        # Arrow-backed strings, as read by file_operations, are used without conversion
+        values = pyarrow.array(protein_ids.array)
+        if isinstance(values, pyarrow.ChunkedArray):
+            values = values.combine_chunks()
+    else:
+        values = pyarrow.array(protein_ids.astype(str).to_numpy(dtype=object), type=pyarrow.string())
+    lists = pyarrow.compute.split_pattern(values, ";")
+    rows = pyarrow.compute.list_parent_indices(lists).to_numpy()
+
+    accessions = pyarrow.compute.utf8_trim_whitespace(pyarrow.compute.list_flatten(lists))
+    accessions = pyarrow.compute.replace_substring_regex(
+        accessions, f"^(?:{'|'.join(ACCESSION_PREFIXES)})+", ""
+    )
+    accessions = pyarrow.compute.replace_substring_regex(
+        accessions, r"^(?:sp|tr)\|([^|]+)\|.*$", r"\1"
+    )
+    accessions = pyarrow.compute.replace_substring_regex(accessions, SUFFIX_PATTERN.pattern, "")
+
+    # Each accession is numbered, so the first occurrence of each non-empty (row, accession) pair is found on integers
+    encoded = pyarrow.compute.dictionary_encode(accessions)
+    codes = encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+    candidates = np.flatnonzero(pyarrow.compute.not_equal(accessions, "").to_numpy(zero_copy_only=False))
+    _, first = np.unique(rows[candidates] * len(encoded.dictionary) + codes[candidates], return_index=True)
+    kept = np.sort(candidates[first])
+
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(rows[kept], minlength=len(values)))])
+    keys = pyarrow.compute.binary_join(
+        pyarrow.ListArray.from_arrays(
+            pyarrow.array(offsets, type=pyarrow.int32()), accessions.take(pyarrow.array(kept))
+        ),
+        ";",
+    )
+
+    return pd.Series(keys.to_numpy(zero_copy_only=False), index=protein_ids.index, dtype=object)
+
+
+def canonical_ids(protein_ids: pd.Series) -> pd.Series:
+    """
+    This function will find the canonical key of every protein of a column
+
+    If pyarrow is installed, every row is converted at once with _canonical_ids_arrow
+    Otherwise each distinct protein ID is converted once, and the keys are mapped back to the rows
+
+    :param protein_ids: The protein IDs of each row
+    :return: The canonical key of each row, with the same index
+    """
+    try:
+        return _canonical_ids_arrow(protein_ids)
+    except ImportError:
+        pass
+
+    unique_ids = pd.unique(protein_ids.astype(str))
+    keys = {protein_id: canonical_key(protein_id) for protein_id in unique_ids}
+
+    return protein_ids.astype(str).map(keys)
+
+
+def add_canonical_ids(data_frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function will add the "canonical_id" column after the "protein_id" column of the data frame
+    It is called once when the input is read, so matching and joining proteins never parses accessions again
+
+    :param data_frame: A data frame with a "protein_id" column
+    :return: The data frame, with a "canonical_id" column
+    """
+    if "canonical_id" in data_frame.columns:
+        data_frame = data_frame.drop(columns="canonical_id")
+
+    data_frame.insert(
+        data_frame.columns.get_loc("protein_id") + 1,
+        "canonical_id",
+        canonical_ids(data_frame["protein_id"]),
+    )
+    return data_frame
+
+
+def protein_keys(data_frame: pd.DataFrame) -> pd.Series:
+    """
+    This function will return the canonical key of each row of the data frame
+    Data frames saved before canonical keys were added are converted from their protein IDs
+
+    :param data_frame: A data frame with a "canonical_id" or "protein_id" column
+    :return: The canonical key of each row
+    """
+    if "canonical_id" in data_frame.columns:
+        return data_frame["canonical_id"].astype(str)
+
+    return canonical_ids(data_frame["protein_id"])
+
+
+class AccessionIndex:
+    def __init__(self, protein_ids: list[str]):
+        """
+        An index of the canonical accessions of a list of entries, such as the clinically relevant proteins
+
+        Each canonical accession is mapped to the first entry that contains it, so a protein is matched to the
+        first entry sharing any of its accessions with a dictionary lookup per accession
+
+        :param protein_ids: The semi-colon separated accessions of each entry
+        """
+        self._first_entries: dict[str, int] = {}
+        for entry, entry_ids in enumerate(protein_ids):
+            for accession in canonical_key(entry_ids).split(";"):
+                if accession:
+                    self._first_entries.setdefault(accession, entry)
+
+    def match(self, key: str) -> int:
+        """
+        This function will find the first entry sharing an accession with a canonical key
+
+        :param key: A canonical key, created by canonical_key
+        :return: The index of the entry, or -1 if no entry matches
+        """
+        return min(
+            (
+                self._first_entries[accession]
+                for accession in key.split(";")
+                if accession in self._first_entries
+            ),
+            default=-1,
+        )
+
+    def match_all(self, keys: pd.Series) -> np.ndarray:
+        """
+        This function will match every canonical key of a column, matching each distinct key once
+
+        :param keys: The canonical key of each row
+        :return: The index of the matching entry of each row, or -1 if no entry matches
+        """
+        entries = {key: self.match(key) for key in pd.unique(keys)}
+        return keys.map(entries).to_numpy(dtype=np.int64)
+
+
+if __name__ == "__main__":
+    # Compare matching every protein against every entry with matching through the index
+    num_proteins = 50_000
+    num_entries = 200
+    random_generator = np.random.default_rng(0)
+    entry_ids = [f"P{i:05d}" for i in random_generator.choice(100_000, num_entries, replace=False)]
+    protein_ids = pd.Series(
+        [
+            f"P{i:05d}-{i % 3 + 1};CON__Q{i:05d}"
+            for i in random_generator.integers(0, 100_000, num_proteins)
+        ]
+    )
+
+    start = time.perf_counter()
+    index = AccessionIndex(entry_ids)
+    matches = index.match_all(canonical_ids(protein_ids))
+    indexed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    nested_matches = 0
+    for protein_id in protein_ids[:5000]:
+        for entry in entry_ids:
+            if any(
+                canonical_accession(accession) == entry for accession in protein_id.split(";")
+            ):
+                nested_matches += 1
+                break
+    nested_seconds = (time.perf_counter() - start) * num_proteins / 5000
+
+    print(
+        f"{num_proteins} proteins x {num_entries} entries: {int((matches >= 0).sum())} matched through the index in "
+        f"{1000 * indexed_seconds:.0f} ms, about {1000 * nested_seconds:.0f} ms with nested loops"
+    )
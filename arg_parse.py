@@ -1,5 +1,209 @@
 import argparse
 
+import file_operations
+import image_export
+import normalization
+import peptide_reader
+import table_export
+
+
+def add_analysis_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    This function will add the arguments that control the analysis to a parser
+    They are shared by every entry point that runs the analysis
+
+    :param parser: The parser to add arguments to
+    :return: None
+    """
+    parser.add_argument(
+        "--normalization",
+        choices=normalization.NORMALIZATION_METHODS,
+        default="none",
+        help="Normalize replicate intensities before calculating statistics (default: none)",
+    )
+    parser.add_argument(
+        "--imputation",
+        choices=normalization.IMPUTATION_METHODS,
+        default="none",
+        help="Replace missing (zero) intensities with low random values before calculating statistics (default: none)",
+    )
+
+    parser.add_argument(
+        "-t",
+        "--test",
+        choices=["welch", "mann_whitney"],
+        default="welch",
+        help="The statistical test used to compare dried and liquid intensities (default: welch)",
+    )
+
+    parser.add_argument(
+        "-r",
+        "--regression",
+        choices=["ordinary", "huber", "theil_sen"],
+        default="ordinary",
+        help="The method used to fit the Dried vs Liquid intensity trendline (default: ordinary)",
+    )
+    parser.add_argument(
+        "--weighted-regression",
+        action="store_true",
+        help="Weight each protein by the inverse of its %%CV when fitting the trendline",
+    )
+    parser.add_argument(
+        "--log-regression",
+        action="store_true",
+        help="Fit the trendline to log10 intensities",
+    )
+
+    parser.add_argument(
+        "-b",
+        "--bootstrap",
+        type=int,
+        default=2000,
+        metavar="N",
+        help="The number of bootstrap resamples used for trendline confidence intervals (default: 2000)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="The seed used for random resampling and imputation, for reproducible results (default: 0)",
+    )
+
+    parser.add_argument(
+        "--exclude-rows",
+        choices=list(file_operations.ROW_FLAG_COLUMNS),
+        nargs="*",
+        default=list(file_operations.DEFAULT_EXCLUDED_ROWS),
+        metavar="REASON",
+        help="Skip input rows flagged for these reasons: reverse, potential_contaminant, only_identified_by_site "
+        "(default: all). Give the flag without reasons to keep every row",
+    )
+
+    parser.add_argument(
+        "-m",
+        "--max-variation",
+        type=float,
+        default=20,
+        help="The maximum dried or liquid %%CV of proteins to keep (default: 20)",
+    )
+    parser.add_argument(
+        "--variation-rule",
+        choices=["or", "and"],
+        default="or",
+        help="Keep proteins with dried OR liquid %%CV below the maximum, or require both (default: or)",
+    )
+    parser.add_argument(
+        "--variation-sweep",
+        type=float,
+        nargs="+",
+        default=None,
+        metavar="CV",
+        help="Count the proteins kept at each of these %%CV thresholds, using both rules (e.g. 5 10 15 20 30)",
+    )
+
+    parser.add_argument(
+        "--image-formats",
+        nargs="+",
+        choices=image_export.IMAGE_FORMATS,
+        default=[],
+        metavar="FORMAT",
+        help=f"Also write each plot as an image in these formats ({', '.join(image_export.IMAGE_FORMATS)}). "
+        "Requires kaleido",
+    )
+    parser.add_argument(
+        "--table-formats",
+        nargs="+",
+        choices=list(table_export.TABLE_FORMATS),
+        default=[],
+        metavar="FORMAT",
+        help=f"Also write the results next to the input file in these formats ({', '.join(table_export.TABLE_FORMATS)}). "
+        "Requires pyarrow",
+    )
+    parser.add_argument(
+        "--history",
+        default=None,
+        metavar="DIRECTORY",
+        help="Append the statistics of every quantified protein to the run history in this directory, "
+        "to follow them over time with history.py. Requires pyarrow",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        dest="cache_directory",
+        default=None,
+        help="The directory to store stage checkpoints in (default: .checkpoints next to the input file)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="cache",
+        action="store_false",
+        help="Compute every stage, without reading or writing checkpoints",
+    )
+    parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="Print which stages ran and which were loaded from a checkpoint",
+    )
+
+
+def add_excel_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    This function will add the arguments that choose the excel file results are written to
+    Exactly one of --excel and --no-excel must be given
+
+    :param parser: The parser to add arguments to
+    :return: None
+    """
+    excel_group = parser.add_mutually_exclusive_group(required=True)
+    excel_group.add_argument(
+        "-x",
+        "--excel",
+        metavar="file.xlsx",
+        help="The excel file to write all results to",
+    )
+    excel_group.add_argument(
+        "--no-excel",
+        action="store_true",
+        help="Do not write an excel file, for automated pipelines that use --table-formats instead",
+    )
+
+
+def validate_excel_arguments(args: argparse.Namespace) -> None:
+    """
+    This function will validate the arguments added by add_excel_arguments
+
+    :param args: The parsed arguments
+    :return: None
+    """
+    # Validate we are writing to an excel file
+    if not args.no_excel and ".xlsx" not in args.excel:
+        print("You have not given the location of an excel file. Please try again.")
+        print(
+            "Make sure the --excel flag points to an excel file with an extension '.xlsx'"
+        )
+        print("Try using 'python3 main.py --help' for examples")
+        exit(1)
+
+
+def validate_analysis_arguments(args: argparse.Namespace) -> None:
+    """
+    This function will validate the arguments added by add_analysis_arguments
+
+    :param args: The parsed arguments
+    :return: None
+    """
+    # Validate the number of bootstrap resamples
+    if args.bootstrap < 1:
+        print("The number of bootstrap resamples must be at least 1. Please try again.")
+        exit(1)
+
+    # Validate the maximum variation
+    if args.max_variation <= 0:
+        print("The maximum variation must be greater than 0. Please try again.")
+        exit(1)
+    if args.variation_sweep is not None and min(args.variation_sweep) <= 0:
+        print("Every variation threshold of the sweep must be greater than 0. Please try again.")
+        exit(1)
+
 
 class ArgParse:
     def __init__(self):
@@ -10,7 +214,26 @@ class ArgParse:
         sdc
         urea
         input
-        output
+        excel
+        no_excel
+        normalization
+        imputation
+        test
+        regression
+        weighted_regression
+        log_regression
+        bootstrap
+        seed
+        exclude_rows
+        max_variation
+        variation_rule
+        variation_sweep
+        image_formats
+        table_formats
+        history
+        cache_directory
+        cache
+        explain
         """
         description = """
 MaxQuantAnalysis is a tool to provide a platform for downstream analysis after execution of the MaxQuant program.
@@ -27,6 +250,7 @@ Protein Name | Protein ID | Dried Avg. | Dried %CV | Liquid Avg. | Liquid %CV |
 EXAMPLE
 python3 main.py --direct --urea --input ./data/direct/urea/proteinGroups.txt --excel ./data/experiment_results.xlsx
 python3 main.py --c18 --sdc --input ./data/c18/sdc/proteinGroups.txt --excel ./data/experiment_results.xlsx
+python3 main.py --c18 --sdc --input ./data/c18/sdc/proteinGroups.txt --no-excel --table-formats parquet arrow
 
 
 """
@@ -66,13 +290,9 @@ python3 main.py --c18 --sdc --input ./data/c18/sdc/proteinGroups.txt --excel ./d
             help="The full input file path",
         )
 
-        self.__parser.add_argument(
-            "-x",
-            "--excel",
-            metavar="file.xlsx",
-            help="The excel file to write all results to",
-            required=True,
-        )
+        add_excel_arguments(self.__parser)
+
+        add_analysis_arguments(self.__parser)
 
         self.__args = self.__parser.parse_args()
         self.__validate_arguments()
@@ -94,26 +314,25 @@ python3 main.py --c18 --sdc --input ./data/c18/sdc/proteinGroups.txt --excel ./d
         else:
             self.__args.experiment = "SDC"
 
-        # Validate we have a 'proteinGroups.txt' file
-        if "proteinGroups.txt" not in self.__args.input:
+        # Validate we have a 'proteinGroups.txt', 'peptides.txt', or 'evidence.txt' file, which can be compressed
+        try:
+            peptide_reader.input_level(self.__args.input)
+        except ValueError:
             print(
-                "You have not passed in the 'proteinGroups' text file. Please try again."
+                "You have not passed in the 'proteinGroups', 'peptides', or 'evidence' text file. Please try again."
             )
             print(
-                "Make sure the '--input' flag points to a file named 'proteinGroups.txt'"
+                "Make sure the '--input' flag points to a file named 'proteinGroups.txt', 'peptides.txt', or 'evidence.txt'"
             )
-            print("Try using 'python3 main.py --help' for examples")
-            exit(1)
-
-        # Validate we are writing to an excel file
-        if ".xlsx" not in self.__args.excel:
-            print("You have not given the location of an excel file. Please try again.")
             print(
-                "Make sure the --excel flag points to an excel file with an extension '.xlsx'"
+                f"Compressed files are also accepted, ending in {', '.join(file_operations.COMPRESSION_SUFFIXES)}"
             )
             print("Try using 'python3 main.py --help' for examples")
             exit(1)
 
+        validate_excel_arguments(self.__args)
+        validate_analysis_arguments(self.__args)
+
     @property
     def args(self) -> argparse.Namespace:
         return self.__args
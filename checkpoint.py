@@ -0,0 +1,274 @@
+import copy
+import dataclasses
+import functools
+import hashlib
+import inspect
+import json
+import pathlib
+import pickle
+import sys
+import time
+import types
+from typing import Any, Callable
+
+import pandas as pd
+
+# Increase this value when the format of checkpoint files changes
+# Changes to the code of a stage are detected by code_fingerprint, which is part of every key
+CHECKPOINT_VERSION = 3
+
+
+@dataclasses.dataclass
+class Stage:
+    """
+    A named step of the pipeline
+
+    The output of a stage only depends on the outputs of its input stages, on its parameters, and on its code,
+    so it is checkpointed under a key calculated from those
+
+    :param name: The name of the stage
+    :param function: Called with the output of each input stage (in order), followed by the parameters as keyword arguments
+    :param inputs: The names of the stages whose outputs are passed to function
+    :param parameters: The keyword arguments passed to function
+    :param key_parameters: Additional values the output depends on that are not passed to function, such as the hash of an input file
+    """
+
+    name: str
+    function: Callable[..., Any]
+    inputs: list[str] = dataclasses.field(default_factory=list)
+    parameters: dict[str, Any] = dataclasses.field(default_factory=dict)
+    key_parameters: dict[str, Any] = dataclasses.field(default_factory=dict)
+
+
+@dataclasses.dataclass
+class StageRecord:
+    """
+    How the output of a stage was obtained
+
+    :param name: The name of the stage
+    :param key: The checkpoint key of the stage
+    :param status: "ran" if the stage was computed, or "cached" if its output was loaded from a checkpoint
+    :param seconds: The time taken to compute or load the output
+    """
+
+    name: str
+    key: str
+    status: str
+    seconds: float
+
+
+@functools.lru_cache(maxsize=None)
+def _module_fingerprint(module_name: str) -> str:
+    """
+    This function will hash the source of a module, and of every module it uses from the same directory
+
+    Modules are followed through the modules, functions, and classes they import, so a change to any code a stage
+    can call changes the fingerprint. Installed packages are not followed, they are not part of this program
+    Each module is only hashed once per process, as its code can not change once imported
+
+    :param module_name: The name of an imported module
+    :return: A hexadecimal hash of the sources
+    """
+    module = sys.modules[module_name]
+    directory = pathlib.Path(module.__file__).resolve().parent
+
+    modules = {module_name: module}
+    pending = [module]
+    while pending:
+        for value in vars(pending.pop()).values():
+            if isinstance(value, types.ModuleType):
+                used = value
+            elif isinstance(getattr(value, "__module__", None), str):
+                used = sys.modules.get(value.__module__)
+            else:
+                continue
+
+            used_file = getattr(used, "__file__", None)
+            if (
+                used is not None
+                and used.__name__ not in modules
+                and used_file is not None
+                and pathlib.Path(used_file).resolve().parent == directory
+            ):
+                modules[used.__name__] = used
+                pending.append(used)
+
+    digest = hashlib.sha256()
+    for name in sorted(modules):
+        digest.update(name.encode())
+        digest.update(pathlib.Path(modules[name].__file__).read_bytes())
+
+    return digest.hexdigest()
+
+
+def code_fingerprint(function: Callable[..., Any]) -> str:
+    """
+    This function will fingerprint the code of a stage function, see _module_fingerprint
+
+    Partial functions and wrappers (functools.wraps) are fingerprinted with every function they wrap
+
+    :param function: The function of a stage
+    :return: A hexadecimal hash of the code the function can call
+    """
+    fingerprints = []
+    while function is not None:
+        if isinstance(function, functools.partial):
+            function = function.func
+            continue
+
+        module = inspect.getmodule(function)
+        if module is not None and getattr(module, "__file__", None) is not None:
+            fingerprints.append(_module_fingerprint(module.__name__))
+        function = getattr(function, "__wrapped__", None)
+
+    return hashlib.sha256("".join(fingerprints).encode()).hexdigest()
+
+
+def _copy_output(output: Any) -> Any:
+    """
+    This function will copy the output of a stage, so modifying the copy does not modify the stored output
+
+    :param output: The output of a stage
+    :return: A deep copy of the output
+    """
+    if isinstance(output, pd.DataFrame):
+        # DataFrame.copy also copies attrs, such as the rows excluded while reading
+        copied = output.copy(deep=True)
+        copied.attrs = copy.deepcopy(output.attrs)
+        return copied
+
+    return copy.deepcopy(output)
+
+
+class StageRunner:
+    def __init__(self, stages: list[Stage], cache_directory: pathlib.Path | str | None):
+        """
+        Run a set of stages, only computing stages whose checkpoint does not exist
+
+        Keys are calculated from parameters and input keys before anything is computed,
+        so a stage whose checkpoint exists does not require its inputs to be computed or loaded
+
+        :param stages: The stages, in any order
+        :param cache_directory: The directory to store checkpoints in. If None, nothing is checkpointed
+        """
+        self._stages: dict[str, Stage] = {stage.name: stage for stage in stages}
+        self._cache_directory = (
+            pathlib.Path(cache_directory) if cache_directory is not None else None
+        )
+        self._keys: dict[str, str] = {}
+        self._outputs: dict[str, Any] = {}
+        self.records: list[StageRecord] = []
+
+    def key(self, name: str) -> str:
+        """
+        This function will calculate the checkpoint key of a stage
+
+        :param name: The name of the stage
+        :return: A hexadecimal hash of the stage name, code, parameters, and input keys
+        """
+        if name not in self._keys:
+            stage = self._stages[name]
+            description = json.dumps(
+                {
+                    "version": CHECKPOINT_VERSION,
+                    "code": code_fingerprint(stage.function),
+                    "name": stage.name,
+                    "parameters": stage.parameters,
+                    "key_parameters": stage.key_parameters,
+                    "inputs": [self.key(input_name) for input_name in stage.inputs],
+                },
+                sort_keys=True,
+                default=str,
+            )
+            self._keys[name] = hashlib.sha256(description.encode()).hexdigest()
+
+        return self._keys[name]
+
+    def output(self, name: str) -> Any:
+        """
+        This function will return the output of a stage, loading it from its checkpoint or computing it
+
+        Each call returns a new copy of the output, as stage functions (and callers) modify the frames they are given
+        The stored output is then the same whether it was computed or loaded from its checkpoint
+
+        :param name: The name of the stage
+        :return: A copy of the output of the stage
+        """
+        return _copy_output(self._output(name))
+
+    def _output(self, name: str) -> Any:
+        """
+        This function will return the stored output of a stage, loading it from its checkpoint or computing it
+        The stored output must not be modified, see output
+
+        :param name: The name of the stage
+        :return: The output of the stage
+        """
+        if name in self._outputs:
+            return self._outputs[name]
+
+        stage = self._stages[name]
+        key = self.key(name)
+        checkpoint_path = self._checkpoint_path(name, key)
+
+        start = time.perf_counter()
+        if checkpoint_path is not None and checkpoint_path.exists():
+            with open(checkpoint_path, "rb") as i_stream:
+                output = pickle.load(i_stream)
+            status = "cached"
+        else:
+            # Each stage is given its own copy of its inputs
+            inputs = [self.output(input_name) for input_name in stage.inputs]
+
+            # Inputs are timed by their own stages
+            start = time.perf_counter()
+            output = stage.function(*inputs, **stage.parameters)
+            status = "ran"
+
+            if checkpoint_path is not None:
+                self._write_checkpoint(checkpoint_path, output)
+
+        self.records.append(
+            StageRecord(
+                name=name, key=key, status=status, seconds=time.perf_counter() - start
+            )
+        )
+        self._outputs[name] = output
+        return output
+
+    def _checkpoint_path(self, name: str, key: str) -> pathlib.Path | None:
+        if self._cache_directory is None:
+            return None
+        return self._cache_directory / f"{name}-{key[:16]}.pkl"
+
+    @staticmethod
+    def _write_checkpoint(checkpoint_path: pathlib.Path, output: Any) -> None:
+        """
+        This function will write the output of a stage to its checkpoint file
+
+        The output is written to a temporary file first, so a checkpoint is never left partially written
+
+        :param checkpoint_path: The checkpoint file
+        :param output: The output of the stage
+        :return: None
+        """
+        checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = checkpoint_path.with_suffix(".tmp")
+        with open(temporary_path, "wb") as o_stream:
+            pickle.dump(output, o_stream, protocol=pickle.HIGHEST_PROTOCOL)
+        temporary_path.replace(checkpoint_path)
+
+    def explain(self) -> str:
+        """
+        This function will describe which stages ran and which were loaded from their checkpoint
+
+        :return: A table with one line per stage, in the order the stages finished
+        """
+        name_width = max([len(record.name) for record in self.records] + [len("Stage")])
+        lines = [f"{'Stage':<{name_width}}  Status  Seconds  Key"]
+        for record in self.records:
+            lines.append(
+                f"{record.name:<{name_width}}  {record.status:<6}  {record.seconds:>7.3f}  {record.key[:16]}"
+            )
+
+        return "\n".join(lines)
@@ -0,0 +1,325 @@
+import argparse
+import concurrent.futures
+import dataclasses
+import pathlib
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import accession
+import file_operations
+import schema
+import statistics
+
+# The per-run values that can be stored in the cohort matrix, calculated by statistics.calculate_statistics
+COHORT_VALUES = ["average_intensity", "dried_average", "liquid_average"]
+
+
+@dataclasses.dataclass
+class CohortMatrix:
+    """
+    A protein x run intensity matrix of many MaxQuant runs
+
+    The matrix is stored as a scipy sparse matrix, so memory grows with the number of quantified values,
+    not with the number of proteins times the number of runs
+    A protein that was not quantified in a run has no value in the matrix
+
+    :param matrix: A (proteins x runs) sparse matrix
+    :param proteins: The protein_id, canonical_id, gene_name, and protein_name of each row of the matrix
+    :param runs: The name of each column of the matrix
+    :param value: The per-run value stored in the matrix, one of COHORT_VALUES
+    """
+
+    matrix: sparse.csr_matrix
+    proteins: pd.DataFrame
+    runs: list[str]
+    value: str
+
+    def summary(self) -> pd.DataFrame:
+        """
+        This function will calculate statistics of each protein across the runs it was quantified in
+
+        Statistics are calculated from the sums of the sparse matrix rows, so no dense matrix is created
+
+        :return: The proteins dataframe, with the number of runs, detection rate, average, standard deviation, and %CV
+        """
+        values = self.matrix.astype(np.float64)
+        quantified_runs = values.getnnz(axis=1)
+        sums = np.asarray(values.sum(axis=1)).ravel()
+        squares = np.asarray(values.multiply(values).sum(axis=1)).ravel()
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            average = sums / quantified_runs
+            std_dev = np.sqrt(
+                np.maximum(squares - quantified_runs * average**2, 0) / (quantified_runs - 1)
+            )
+            variation = std_dev / average * 100
+
+        summary_df = self.proteins.assign(
+            detection_rate=np.round(quantified_runs / max(len(self.runs), 1), 4),
+            cohort_average=np.round(average, 4),
+            cohort_std_dev=np.round(std_dev, 4),
+            cohort_variation=np.round(variation, 4),
+        )
+
+        # As in statistics.calculate_statistics, statistics that could not be calculated are set to 0
+        summary_df.fillna(0, inplace=True)
+        summary_df = schema.apply_compact_schema(summary_df)
+        summary_df.insert(3, "quantified_runs", quantified_runs.astype(np.int32))
+
+        return summary_df
+
+    def save(self, output_directory: pathlib.Path | str) -> list[pathlib.Path]:
+        """
+        This function will write the cohort to a directory
+
+        The matrix is written as "cohort_matrix.npz", and the proteins and runs (rows and columns) as tab-separated files
+
+        :param output_directory: The directory to write to
+        :return: The written files
+        """
+        output_directory = pathlib.Path(output_directory)
+        output_directory.mkdir(parents=True, exist_ok=True)
+
+        output_paths = [
+            output_directory / "cohort_matrix.npz",
+            output_directory / "cohort_proteins.tsv",
+            output_directory / "cohort_runs.tsv",
+        ]
+        sparse.save_npz(output_paths[0], self.matrix)
+        self.summary().to_csv(output_paths[1], sep="\t", index=False)
+        pd.DataFrame({"run": self.runs, "value": self.value}).to_csv(
+            output_paths[2], sep="\t", index=False
+        )
+
+        return output_paths
+
+    @classmethod
+    def load(cls, output_directory: pathlib.Path | str) -> "CohortMatrix":
+        """
+        This function will read a cohort written by save
+
+        :param output_directory: The directory the cohort was written to
+        :return: A CohortMatrix
+        """
+        output_directory = pathlib.Path(output_directory)
+        runs_df = pd.read_csv(output_directory / "cohort_runs.tsv", sep="\t")
+        proteins_df = pd.read_csv(
+            output_directory / "cohort_proteins.tsv",
+            sep="\t",
+            usecols=lambda column: column
+            in ["protein_id", "canonical_id", "gene_name", "protein_name"],
+            keep_default_na=False,
+        )
+        # Cohorts written before canonical keys were stored are converted from their protein IDs
+        proteins_df = accession.add_canonical_ids(proteins_df)
+
+        return cls(
+            matrix=sparse.load_npz(output_directory / "cohort_matrix.npz").tocsr(),
+            proteins=schema.apply_compact_schema(proteins_df),
+            runs=runs_df["run"].tolist(),
+            value=runs_df["value"].iloc[0] if len(runs_df) else COHORT_VALUES[0],
+        )
+
+
+def _read_run(
+    input_file: pathlib.Path, value: str, exclude: list[str] | None
+) -> tuple[list[str], list[str], list[str], list[str], np.ndarray]:
+    """
+    This function will read the quantified proteins of one run
+
+    Only proteins with a value above 0 are returned, as the cohort matrix does not store missing values
+
+    :param input_file: The proteinGroups.txt file of the run
+    :param value: The per-run value, one of COHORT_VALUES
+    :param exclude: The reasons to skip rows for, see file_operations.create_intensity_dataframe
+    :return: The protein IDs, canonical keys, gene names, protein names, and values of the quantified proteins
+    """
+    run_df = statistics.calculate_statistics(
+        file_operations.create_intensity_dataframe(input_file, exclude=exclude)
+    )
+    run_df = run_df[run_df[value] > 0]
+
+    return (
+        run_df["protein_id"].astype(str).tolist(),
+        accession.protein_keys(run_df).tolist(),
+        run_df["gene_name"].astype(str).tolist(),
+        run_df["protein_name"].astype(str).tolist(),
+        run_df[value].to_numpy(dtype=schema.INTENSITY_DTYPE),
+    )
+
+
+def build_cohort(
+    input_files: list[pathlib.Path],
+    run_names: list[str] | None = None,
+    value: str = "average_intensity",
+    exclude: list[str] | None = None,
+    workers: int = 1,
+) -> CohortMatrix:
+    """
+    This function will join many runs into a single protein x run matrix
+
+    Runs are read in a pool of worker processes
+    Proteins are matched on the canonical keys of their majority protein IDs (see accession.py) with a hash table, which gives the row of each protein,
+    so every run is joined in a single pass over its proteins, without sorting or merging data frames
+
+    :param input_files: The proteinGroups.txt file of each run
+    :param run_names: The name of each run (default: the directory of each input file)
+    :param value: The per-run value to store, one of COHORT_VALUES
+    :param exclude: The reasons to skip rows for, see file_operations.create_intensity_dataframe
+    :param workers: The number of worker processes
+    :return: A CohortMatrix
+    """
+    if value not in COHORT_VALUES:
+        raise ValueError(f"Unknown value '{value}', expected one of {', '.join(COHORT_VALUES)}")
+    if run_names is None:
+        run_names = [str(pathlib.Path(input_file).parent) for input_file in input_files]
+
+    protein_rows: dict[str, int] = {}
+    protein_ids: list[str] = []
+    gene_names: list[str] = []
+    protein_names: list[str] = []
+    row_indices: list[np.ndarray] = []
+    column_indices: list[np.ndarray] = []
+    values: list[np.ndarray] = []
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        run_results = executor.map(
+            _read_run,
+            input_files,
+            [value] * len(input_files),
+            [exclude] * len(input_files),
+        )
+
+        for column, (
+            run_protein_ids,
+            run_keys,
+            run_gene_names,
+            run_protein_names,
+            run_values,
+        ) in enumerate(run_results):
+            rows = np.empty(len(run_keys), dtype=np.int64)
+            for i, key in enumerate(run_keys):
+                row = protein_rows.get(key)
+                if row is None:
+                    row = len(protein_rows)
+                    protein_rows[key] = row
+                    # The protein IDs of the first run a protein is quantified in are kept
+                    protein_ids.append(run_protein_ids[i])
+                    gene_names.append(run_gene_names[i])
+                    protein_names.append(run_protein_names[i])
+                rows[i] = row
+
+            row_indices.append(rows)
+            column_indices.append(np.full(len(rows), column, dtype=np.int64))
+            values.append(run_values)
+
+    shape = (len(protein_rows), len(input_files))
+    if values:
+        # Duplicate proteins within a run are summed
+        matrix = sparse.coo_matrix(
+            (
+                np.concatenate(values),
+                (np.concatenate(row_indices), np.concatenate(column_indices)),
+            ),
+            shape=shape,
+            dtype=schema.INTENSITY_DTYPE,
+        ).tocsr()
+    else:
+        matrix = sparse.csr_matrix(shape, dtype=schema.INTENSITY_DTYPE)
+
+    proteins_df = pd.DataFrame(
+        {
+            "protein_id": protein_ids,
+            "canonical_id": list(protein_rows),
+            "gene_name": gene_names,
+            "protein_name": protein_names,
+        }
+    )
+
+    return CohortMatrix(
+        matrix=matrix,
+        proteins=schema.apply_compact_schema(proteins_df),
+        runs=list(run_names),
+        value=value,
+    )
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    This function will parse the cohort command line arguments
+
+    :return: The parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Join many MaxQuant runs into a protein x run intensity matrix, with per-protein statistics across runs"
+    )
+    inputs_group = parser.add_mutually_exclusive_group(required=True)
+    inputs_group.add_argument(
+        "--inputs",
+        nargs="+",
+        metavar="proteinGroups.txt",
+        help="The proteinGroups.txt file of each run",
+    )
+    inputs_group.add_argument(
+        "--directory",
+        help="A directory containing the runs. Every proteinGroups.txt file in it (including subdirectories) is used",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="The directory to write the cohort matrix and protein statistics to",
+    )
+    parser.add_argument(
+        "--value",
+        choices=COHORT_VALUES,
+        default="average_intensity",
+        help="The per-run value stored in the matrix (default: average_intensity)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=2, help="The number of worker processes"
+    )
+
+    args = parser.parse_args()
+    if args.directory is not None:
+        args.inputs = sorted(pathlib.Path(args.directory).rglob("proteinGroups.txt"))
+        if not args.inputs:
+            print(f"No proteinGroups.txt files were found in {args.directory}")
+            exit(1)
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    input_files = [pathlib.Path(input_file) for input_file in args.inputs]
+
+    # Runs are named by their directory, relative to the cohort directory if one was given
+    root = pathlib.Path(args.directory) if args.directory is not None else None
+    run_names = [
+        str(input_file.parent.relative_to(root) if root else input_file.parent)
+        for input_file in input_files
+    ]
+
+    start = time.perf_counter()
+    cohort = build_cohort(
+        input_files, run_names=run_names, value=args.value, workers=args.workers
+    )
+    print(
+        f"Joined {len(cohort.runs)} runs, {cohort.matrix.shape[0]} proteins in {time.perf_counter() - start:.2f} seconds"
+    )
+
+    density = cohort.matrix.nnz / max(cohort.matrix.shape[0] * cohort.matrix.shape[1], 1)
+    matrix_bytes = (
+        cohort.matrix.data.nbytes + cohort.matrix.indices.nbytes + cohort.matrix.indptr.nbytes
+    )
+    print(
+        f"Matrix density {100 * density:.1f}%, {matrix_bytes / 1024**2:.1f} MB "
+        f"({cohort.matrix.shape[0] * cohort.matrix.shape[1] * 4 / 1024**2:.1f} MB as a dense matrix)"
+    )
+
+    for output_path in cohort.save(args.output):
+        print(f"Wrote {output_path}")
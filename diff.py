@@ -0,0 +1,216 @@
+import argparse
+import pathlib
+import time
+
+import numpy as np
+import pandas as pd
+
+import accession
+import pipeline
+import plotter
+import schema
+import statistics
+import table_export
+
+# The metrics compared between the two result sets
+DIFF_METRICS = [
+    "dried_average",
+    "liquid_average",
+    "dried_liquid_ratio",
+    "dried_variation",
+    "liquid_variation",
+]
+
+# Suffixes of data frames saved by the pipeline, which are loaded directly instead of being recalculated
+FRAME_SUFFIXES = [".pkl", ".pickle", ".parquet", ".arrow", ".feather"]
+
+
+def load_results(input_file: pathlib.Path | str) -> pd.DataFrame:
+    """
+    This function will load the results of a run, from a MaxQuant results file or a saved data frame
+
+    Saved data frames are checkpoints of the pipeline (.pkl), or tables exported with --table-formats (.parquet, .arrow),
+    which are memory-mapped if they are Arrow files
+    Pickled checkpoints can run code when they are loaded, so only load checkpoints you have written yourself
+    Statistics are calculated if the data frame does not contain them
+
+    :param input_file: A proteinGroups.txt, peptides.txt, or evidence.txt file, or a saved data frame
+    :return: A dataframe containing the protein IDs and DIFF_METRICS
+    """
+    input_file = pathlib.Path(input_file)
+    suffix = input_file.suffix.lower()
+
+    if suffix in [".pkl", ".pickle"]:
+        data_frame = pd.read_pickle(input_file)
+    elif suffix in [".parquet", ".arrow", ".feather"]:
+        data_frame = table_export.read_table(input_file)
+    else:
+        data_frame = pipeline.read_intensities(input_file)
+
+    if not set(DIFF_METRICS).issubset(data_frame.columns):
+        data_frame = statistics.calculate_statistics(data_frame)
+
+    return data_frame
+
+
+def _unique_index(data_frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function will index the data frame by canonical protein key, keeping the first row of duplicated keys
+    Keys are created by accession.canonical_key, so isoforms and versions of a protein are aligned between runs
+
+    :param data_frame: The results of a run
+    :return: The dataframe, indexed by canonical protein key
+    """
+    data_frame = data_frame.set_index(accession.protein_keys(data_frame))
+    return data_frame[~data_frame.index.duplicated(keep="first")]
+
+
+def compare_results(first_df: pd.DataFrame, second_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function will compare the results of two runs, protein by protein
+
+    Proteins are aligned on their canonical keys (see accession.py) with a hash index: the row of every protein in each run
+    is looked up once, and all differences are then calculated on whole arrays
+
+    A protein "appeared" if it is quantified (average intensity above 0) only in the second run,
+    "disappeared" if it is quantified only in the first run, and is "shared" otherwise
+    Proteins are ranked by status (appeared and disappeared first), then by the size of the change of their
+    log2 dried/liquid ratio, then by the size of the change of their variation
+
+    :param first_df: The results of the first run
+    :param second_df: The results of the second run
+    :return: A dataframe with one row per protein, containing the metrics of both runs and their differences
+    """
+    first_df = _unique_index(first_df)
+    second_df = _unique_index(second_df)
+
+    protein_keys = first_df.index.union(second_df.index, sort=False)
+    first_rows = first_df.index.get_indexer(protein_keys)
+    second_rows = second_df.index.get_indexer(protein_keys)
+    in_first = first_rows >= 0
+    in_second = second_rows >= 0
+
+    def aligned(data_frame: pd.DataFrame, rows: np.ndarray, column: str) -> np.ndarray:
+        values = data_frame[column].to_numpy(dtype=np.float64)
+        return np.where(rows >= 0, values[np.maximum(rows, 0)] if len(values) else 0, np.nan)
+
+    def aligned_names(column: str) -> np.ndarray:
+        first_names = first_df[column].astype(str).to_numpy()
+        second_names = second_df[column].astype(str).to_numpy()
+        return np.where(
+            in_first,
+            first_names[np.maximum(first_rows, 0)] if len(first_names) else "",
+            second_names[np.maximum(second_rows, 0)] if len(second_names) else "",
+        )
+
+    diff_df = pd.DataFrame(
+        {
+            "protein_id": aligned_names("protein_id"),
+            "canonical_id": protein_keys,
+            "gene_name": aligned_names("gene_name"),
+            "protein_name": aligned_names("protein_name"),
+        }
+    )
+
+    for metric in DIFF_METRICS:
+        first_values = aligned(first_df, first_rows, metric)
+        second_values = aligned(second_df, second_rows, metric)
+        diff_df[f"{metric}_first"] = first_values
+        diff_df[f"{metric}_second"] = second_values
+        diff_df[f"{metric}_change"] = second_values - first_values
+
+    quantified_first = in_first & (aligned(first_df, first_rows, "average_intensity") > 0)
+    quantified_second = in_second & (aligned(second_df, second_rows, "average_intensity") > 0)
+    diff_df["status"] = np.select(
+        [quantified_second & ~quantified_first, quantified_first & ~quantified_second],
+        ["appeared", "disappeared"],
+        default="shared",
+    )
+    diff_df.loc[~quantified_first & ~quantified_second, "status"] = "not quantified"
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        diff_df["log2_ratio_change"] = np.log2(
+            diff_df["dried_liquid_ratio_second"] / diff_df["dried_liquid_ratio_first"]
+        )
+    diff_df["log2_ratio_change"] = diff_df["log2_ratio_change"].replace(
+        [np.inf, -np.inf], np.nan
+    )
+    variation_change = np.fmax(
+        diff_df["dried_variation_change"].abs(), diff_df["liquid_variation_change"].abs()
+    )
+
+    status_order = diff_df["status"].map(
+        {"appeared": 0, "disappeared": 0, "shared": 1, "not quantified": 2}
+    )
+    order = np.lexsort(
+        (
+            -variation_change.fillna(0).to_numpy(),
+            -diff_df["log2_ratio_change"].abs().fillna(0).to_numpy(),
+            status_order.to_numpy(),
+        )
+    )
+    diff_df = schema.apply_compact_schema(diff_df.iloc[order].reset_index(drop=True))
+    diff_df.insert(0, "rank", np.arange(1, len(diff_df) + 1, dtype=np.int32))
+
+    return diff_df
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    This function will parse the diff command line arguments
+
+    :return: The parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Compare two runs: find proteins that appeared, disappeared, or changed in dried/liquid ratio or %CV"
+    )
+    parser.add_argument(
+        "first",
+        help="The first run: a proteinGroups.txt, peptides.txt, or evidence.txt file, or a saved data frame "
+        f"({', '.join(FRAME_SUFFIXES)})",
+    )
+    parser.add_argument("second", help="The second run, in the same formats as the first")
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        metavar="diff.tsv",
+        help="The ranked table to write. A plot with the same name and an '.html' extension is also written",
+    )
+    parser.add_argument(
+        "--first-name", default=None, help="The name of the first run in the plot (default: its directory)"
+    )
+    parser.add_argument(
+        "--second-name", default=None, help="The name of the second run in the plot (default: its directory)"
+    )
+
+    args = parser.parse_args()
+    if args.first_name is None:
+        args.first_name = pathlib.Path(args.first).parent.name or args.first
+    if args.second_name is None:
+        args.second_name = pathlib.Path(args.second).parent.name or args.second
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    start = time.perf_counter()
+    first_results = load_results(args.first)
+    second_results = load_results(args.second)
+    loaded = time.perf_counter()
+    run_diff = compare_results(first_results, second_results)
+    compared = time.perf_counter()
+
+    output_path = pathlib.Path(args.output)
+    run_diff.to_csv(output_path, sep="\t", index=False, float_format="%.4f")
+    plot_path = output_path.with_suffix(".html")
+    plotter.run_difference(run_diff, args).write_html(plot_path)
+
+    print(
+        f"Compared {len(first_results)} and {len(second_results)} proteins: "
+        f"loaded in {loaded - start:.2f} seconds, compared in {compared - loaded:.2f} seconds"
+    )
+    print(run_diff["status"].value_counts().to_string())
+    print(f"Wrote {output_path} and {plot_path}")
@@ -10,3 +10,8 @@ class PlotType(Enum):
     abundance_variation = "abundance_variation"
     abundance_intensity = "abundance_intensity"
     intensity_variation = "intensity_variation"
+    full_proteome_intensity = "full_proteome_intensity"
+    volcano = "volcano"
+    replicate_qc = "replicate_qc"
+    pca_scores = "pca_scores"
+    sample_clustering = "sample_clustering"
@@ -0,0 +1,737 @@
+import argparse
+import copy
+import csv
+import dataclasses
+import pathlib
+import tempfile
+import time
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import plotly.graph_objects as go
+
+import accession
+import excel_writer
+import file_operations
+import filter_values
+import pipeline
+import plotter
+import reference
+import schema
+import statistics
+
+# Numeric values are equal if |expected - actual| <= ABSOLUTE_TOLERANCE + RELATIVE_TOLERANCE * |expected|
+# Intensities and statistics are stored as float32 (about 7 significant digits), and statistics are rounded to 4 decimals
+RELATIVE_TOLERANCE = 1e-5
+ABSOLUTE_TOLERANCE = 1e-4
+
+# The reference truncates intensities to integers when it reads them
+INGEST_ABSOLUTE_TOLERANCE = 1
+
+# The relative tolerance of the results of each whole chain, from the reference and optimized ingest outputs
+# The optimized chain calculates standard deviations from float32 intensities, and the reference from intensities
+# truncated to integers. Both errors are relative to the intensities, so the standard deviation (and variation) of
+# proteins with close replicates differs by more than RELATIVE_TOLERANCE: 1e-4 allows replicates that differ by 0.1%
+CHAIN_RELATIVE_TOLERANCE = 1e-4
+
+# The code paths compared by check_input, in the order they are run
+PATHS: list[str] = ["ingest", "statistics", "clinical", "figures", "workbook"]
+
+# A path is a performance regression if its optimized implementation is slower than the reference (a speedup below
+# MIN_SPEEDUP) on an input of at least SPEED_CHECK_MIN_PROTEINS proteins. On smaller inputs both implementations take
+# a few milliseconds of mostly fixed costs, which vary more between runs than the implementations differ
+# The figures path is not checked, as both chains are plotted by the same functions
+MIN_SPEEDUP = 1.0
+SPEED_CHECK_MIN_PROTEINS = 1000
+SPEED_CHECKED_PATHS: list[str] = ["ingest", "statistics", "clinical", "workbook"]
+
+# The number of differences listed for each comparison, the rest are counted
+MAX_LISTED_MISMATCHES = 5
+
+# The statistics calculated by both implementations of calculate_statistics
+STATISTIC_COLUMNS: list[str] = [
+    "dried_average",
+    "liquid_average",
+    "average_intensity",
+    "dried_std_dev",
+    "liquid_std_dev",
+    "dried_variation",
+    "liquid_variation",
+    "dried_liquid_ratio",
+    "average_variation",
+]
+
+# The columns added by add_clinical_relevance
+CLINICAL_COLUMNS: list[str] = ["relevant", "expected_concentration", "clinical_id"]
+
+# The plots that existed when the reference implementations were written, and how to create each of them
+FIGURES = {
+    "intensity_variation": plotter.liquid_intensity_vs_dried_intensity,
+    "abundance_intensity": plotter.abundance_vs_intensity,
+    "abundance_variation": plotter.abundance_vs_variation,
+}
+
+# The method/experiment of each run written to the compared workbooks
+WORKBOOK_RUNS: list[tuple[str, str]] = [
+    ("Direct", "SDC"),
+    ("C18", "SDC"),
+    ("Direct", "Urea"),
+    ("C18", "Urea"),
+]
+
+
+@dataclasses.dataclass
+class EquivalenceResult:
+    """
+    The comparison of the reference and optimized implementations of one code path
+
+    :param path: The name of the code path, such as "statistics"
+    :param input_file: The input the implementations were run on
+    :param num_proteins: The number of proteins of the input
+    :param reference_seconds: The fastest time of the reference implementation
+    :param optimized_seconds: The fastest time of the optimized implementation
+    :param mismatches: Each difference between the outputs; empty if they are equivalent
+    """
+
+    path: str
+    input_file: str
+    num_proteins: int
+    reference_seconds: float
+    optimized_seconds: float
+    mismatches: list[str] = dataclasses.field(default_factory=list)
+
+    @property
+    def equivalent(self) -> bool:
+        return not self.mismatches
+
+    @property
+    def speedup(self) -> float:
+        return self.reference_seconds / max(self.optimized_seconds, 1e-9)
+
+    @property
+    def regressed(self) -> bool:
+        return (
+            self.path in SPEED_CHECKED_PATHS
+            and self.num_proteins >= SPEED_CHECK_MIN_PROTEINS
+            and self.speedup < MIN_SPEEDUP
+        )
+
+
+def _values_equal(
+    expected: np.ndarray,
+    actual: np.ndarray,
+    rtol: float = RELATIVE_TOLERANCE,
+    atol: float = ABSOLUTE_TOLERANCE,
+) -> np.ndarray:
+    """
+    This function will compare two arrays element by element, numerically if both are numbers, otherwise as text
+    Missing values (None, NaN, and empty strings) are equal to each other
+
+    :param expected: The values of the reference implementation
+    :param actual: The values of the optimized implementation
+    :param rtol: The relative tolerance of numbers
+    :param atol: The absolute tolerance of numbers
+    :return: A boolean array, True where the values are equal
+    """
+    expected = pd.Series(expected, dtype=object)
+    actual = pd.Series(actual, dtype=object)
+    expected_numbers = pd.to_numeric(expected, errors="coerce").to_numpy(dtype=np.float64)
+    actual_numbers = pd.to_numeric(actual, errors="coerce").to_numpy(dtype=np.float64)
+
+    def missing(values: pd.Series) -> np.ndarray:
+        return (values.isna() | (values.astype(str) == "")).to_numpy()
+
+    both_numbers = ~np.isnan(expected_numbers) & ~np.isnan(actual_numbers)
+    with np.errstate(invalid="ignore"):
+        numbers_equal = np.abs(expected_numbers - actual_numbers) <= (
+            atol + rtol * np.abs(expected_numbers)
+        )
+    text_equal = (expected.astype(str) == actual.astype(str)).to_numpy()
+
+    return np.where(
+        both_numbers,
+        numbers_equal,
+        text_equal | (missing(expected) & missing(actual)),
+    )
+
+
+def _mismatch_messages(label: str, equal: np.ndarray, expected, actual, locations) -> list[str]:
+    """
+    This function will describe the first MAX_LISTED_MISMATCHES differences of a comparison, and count the rest
+
+    :param label: What was compared, such as a column name
+    :param equal: The result of _values_equal
+    :param expected: The values of the reference implementation
+    :param actual: The values of the optimized implementation
+    :param locations: The location (row, or cell) of each value
+    :return: A list of messages
+    """
+    different = np.flatnonzero(~equal)
+    messages = [
+        f"{label} at {locations[i]}: expected {expected[i]!r}, got {actual[i]!r}"
+        for i in different[:MAX_LISTED_MISMATCHES]
+    ]
+    if len(different) > MAX_LISTED_MISMATCHES:
+        messages.append(f"{label}: {len(different) - MAX_LISTED_MISMATCHES} more differences")
+
+    return messages
+
+
+def compare_frames(
+    expected: pd.DataFrame,
+    actual: pd.DataFrame,
+    columns: list[str] | None = None,
+    rtol: float = RELATIVE_TOLERANCE,
+    atol: float = ABSOLUTE_TOLERANCE,
+) -> list[str]:
+    """
+    This function will compare two data frames row by row, with a tolerance for numbers
+
+    Data types are not compared, as the optimized implementations store values with compact data types
+
+    :param expected: The output of the reference implementation
+    :param actual: The output of the optimized implementation
+    :param columns: The columns to compare (default: every column of the expected frame)
+    :param rtol: The relative tolerance of numbers
+    :param atol: The absolute tolerance of numbers
+    :return: Each difference between the frames; empty if they are equivalent
+    """
+    if columns is None:
+        columns = list(expected.columns)
+    if len(expected) != len(actual):
+        return [f"expected {len(expected)} rows, got {len(actual)}"]
+
+    mismatches: list[str] = []
+    for column in columns:
+        if column not in actual.columns:
+            mismatches.append(f"column {column} is missing")
+            continue
+
+        expected_values = expected[column].to_numpy(dtype=object)
+        actual_values = actual[column].to_numpy(dtype=object)
+        equal = _values_equal(expected_values, actual_values, rtol=rtol, atol=atol)
+        mismatches += _mismatch_messages(
+            column, equal, expected_values, actual_values, [f"row {i}" for i in range(len(equal))]
+        )
+
+    return mismatches
+
+
+def compare_workbooks(
+    expected_file: pathlib.Path | str,
+    actual_file: pathlib.Path | str,
+    rtol: float = RELATIVE_TOLERANCE,
+    atol: float = ABSOLUTE_TOLERANCE,
+) -> list[str]:
+    """
+    This function will compare the contents of every cell of the sheets of the expected workbook
+    Formatting is not compared, and empty strings are equal to empty cells
+
+    :param expected_file: The workbook written by the reference implementation
+    :param actual_file: The workbook written by the optimized implementation
+    :param rtol: The relative tolerance of numbers
+    :param atol: The absolute tolerance of numbers
+    :return: Each difference between the workbooks; empty if they are equivalent
+    """
+    expected_workbook = openpyxl.load_workbook(expected_file, read_only=True)
+    actual_workbook = openpyxl.load_workbook(actual_file, read_only=True)
+
+    mismatches: list[str] = []
+    for sheet_name in expected_workbook.sheetnames:
+        if sheet_name not in actual_workbook.sheetnames:
+            mismatches.append(f"sheet {sheet_name} is missing")
+            continue
+
+        expected_rows = list(expected_workbook[sheet_name].iter_rows(values_only=True))
+        actual_rows = list(actual_workbook[sheet_name].iter_rows(values_only=True))
+        num_rows = max(len(expected_rows), len(actual_rows))
+        num_columns = max((len(row) for row in expected_rows + actual_rows), default=0)
+
+        def cells(rows: list[tuple]) -> np.ndarray:
+            values = np.full((num_rows, num_columns), None, dtype=object)
+            for i, row in enumerate(rows):
+                values[i, : len(row)] = row
+            return values.ravel()
+
+        expected_values = cells(expected_rows)
+        actual_values = cells(actual_rows)
+        equal = _values_equal(expected_values, actual_values, rtol=rtol, atol=atol)
+        locations = [
+            f"{openpyxl.utils.get_column_letter(column + 1)}{row + 1}"
+            for row in range(num_rows)
+            for column in range(num_columns)
+        ]
+        mismatches += _mismatch_messages(sheet_name, equal, expected_values, actual_values, locations)
+
+    expected_workbook.close()
+    actual_workbook.close()
+
+    return mismatches
+
+
+def compare_figures(
+    expected: go.Figure,
+    actual: go.Figure,
+    rtol: float = RELATIVE_TOLERANCE,
+    atol: float = ABSOLUTE_TOLERANCE,
+) -> list[str]:
+    """
+    This function will compare the data plotted by two figures: the type, name, coordinates, text, and marker sizes of each trace
+    Layout (titles, axes, colors) is not compared
+
+    :param expected: The figure created from the output of the reference implementation
+    :param actual: The figure created from the output of the optimized implementation
+    :param rtol: The relative tolerance of numbers
+    :param atol: The absolute tolerance of numbers
+    :return: Each difference between the figures; empty if they are equivalent
+    """
+    if len(expected.data) != len(actual.data):
+        return [f"expected {len(expected.data)} traces, got {len(actual.data)}"]
+
+    mismatches: list[str] = []
+    for i, (expected_trace, actual_trace) in enumerate(zip(expected.data, actual.data)):
+        label = f"trace {i} ({expected_trace.name or expected_trace.type})"
+        if (expected_trace.type, expected_trace.name) != (actual_trace.type, actual_trace.name):
+            mismatches.append(
+                f"{label}: expected a {expected_trace.type} trace named {expected_trace.name!r}, "
+                f"got a {actual_trace.type} trace named {actual_trace.name!r}"
+            )
+            continue
+
+        for attribute in ["x", "y", "text", "marker.size"]:
+            expected_values = expected_trace[attribute]
+            actual_values = actual_trace[attribute]
+            if expected_values is None and actual_values is None:
+                continue
+
+            expected_values = np.atleast_1d(np.asarray(expected_values, dtype=object)).ravel()
+            actual_values = np.atleast_1d(np.asarray(actual_values, dtype=object)).ravel()
+            if len(expected_values) != len(actual_values):
+                mismatches.append(
+                    f"{label} {attribute}: expected {len(expected_values)} values, got {len(actual_values)}"
+                )
+                continue
+
+            equal = _values_equal(expected_values, actual_values, rtol=rtol, atol=atol)
+            mismatches += _mismatch_messages(
+                f"{label} {attribute}",
+                equal,
+                expected_values,
+                actual_values,
+                [f"point {j}" for j in range(len(equal))],
+            )
+
+    return mismatches
+
+
+def _timed(function, *args, repeats: int = 1):
+    """
+    This function will call a function several times, each time with a new copy of its arguments,
+    as several implementations modify the data frame they are given
+
+    :param function: The function to call
+    :param args: The arguments of the function
+    :param repeats: The number of calls
+    :return: The output of the last call, and the fastest time of a call in seconds
+    """
+    fastest = np.inf
+    output = None
+    for _ in range(repeats):
+        arguments = copy.deepcopy(args)
+        start = time.perf_counter()
+        output = function(*arguments)
+        fastest = min(fastest, time.perf_counter() - start)
+
+    return output, fastest
+
+
+def _legacy_types(data_frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function will convert a frame to the data types the reference implementations were written for:
+    Python object strings and float64 numbers
+
+    :param data_frame: A data frame with compact data types
+    :return: The converted data frame
+    """
+    dtypes: dict = {}
+    for column, dtype in data_frame.dtypes.items():
+        if column in schema.STRING_COLUMNS:
+            dtypes[column] = object
+        elif dtype == schema.INTENSITY_DTYPE:
+            dtypes[column] = np.float64
+
+    return data_frame.astype(dtypes)
+
+
+def _canonical_types(data_frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function will convert a frame with _legacy_types, and replace its protein IDs by their canonical keys
+    The reference matches clinically relevant proteins on exact accessions, while the optimized implementation
+    matches canonical accessions, so the reference is given canonical keys to compare the matching itself
+    The protein IDs are kept in "source_protein_id"
+
+    :param data_frame: A data frame with compact data types and a "canonical_id" column
+    :return: The converted data frame
+    """
+    data_frame = _legacy_types(data_frame)
+    return data_frame.assign(
+        source_protein_id=data_frame["protein_id"], protein_id=data_frame["canonical_id"]
+    )
+
+
+def _sort_by_name(data_frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function will sort a frame by protein name, then protein ID, so frames with duplicate names are in the same order
+
+    :param data_frame: The data frame to sort
+    :return: The sorted data frame
+    """
+    order = np.lexsort(
+        (
+            data_frame["protein_id"].astype(str).to_numpy(),
+            data_frame["protein_name"].astype(str).to_numpy(),
+        )
+    )
+    return data_frame.iloc[order].reset_index(drop=True)
+
+
+def _write_workbook(writers, data_frame: pd.DataFrame, output_file: pathlib.Path) -> None:
+    """
+    This function will write the same results to a new workbook for every method/experiment of WORKBOOK_RUNS
+
+    :param writers: The ClinicallyRelevant and AllProteins classes of an implementation
+    :param data_frame: The filtered, clinically annotated data frame
+    :param output_file: The workbook to write
+    :return: None
+    """
+    output_file.unlink(missing_ok=True)
+    for method, experiment in WORKBOOK_RUNS:
+        args = argparse.Namespace(excel=str(output_file), method=method, experiment=experiment)
+        for writer in writers:
+            writer(data_frame=data_frame, args=args)
+
+
+def check_input(
+    input_file: pathlib.Path | str, repeats: int = 1, paths: list[str] | None = None
+) -> list[EquivalenceResult]:
+    """
+    This function will run the reference and optimized implementations of every code path on an input file
+
+    Each path is given the same input for both implementations, so a difference in one path does not hide the others:
+    - ingest: reading the input file. Flagged rows are not skipped, as the reference reads every row
+    - statistics: calculating statistics of the optimized ingest output. Only numbers are compared, as the reference
+      also resets the protein IDs and names of rows with an infinite dried/liquid ratio to 0
+    - clinical: annotating clinically relevant proteins of the optimized statistics output. The reference is given
+      canonical keys as protein IDs, see _canonical_types
+    - figures: the plots of the results of each whole chain (ingest, statistics, variation filter, clinical annotation),
+      compared with CHAIN_RELATIVE_TOLERANCE
+    - workbook: writing the optimized results to a new workbook, once for each method/experiment of WORKBOOK_RUNS
+
+    :param input_file: A proteinGroups.txt file with three dried and three liquid replicates
+    :param repeats: The number of times each implementation is run, the fastest time is reported
+    :param paths: The code paths to check, a subset of PATHS (default: every path)
+    :return: An EquivalenceResult for each path
+    """
+    input_file = pathlib.Path(input_file)
+    if paths is None:
+        paths = PATHS
+    results: list[EquivalenceResult] = []
+
+    # Ingest
+    reference_df, reference_seconds = _timed(
+        reference.create_intensity_dataframe, input_file, repeats=repeats
+    )
+    optimized_df, optimized_seconds = _timed(
+        file_operations.create_intensity_dataframe, input_file, [], repeats=repeats
+    )
+
+    def add_result(path: str, reference_seconds: float, optimized_seconds: float, mismatches: list[str]):
+        results.append(
+            EquivalenceResult(
+                path, str(input_file), len(reference_df), reference_seconds, optimized_seconds, mismatches
+            )
+        )
+
+    if "ingest" in paths:
+        add_result(
+            "ingest",
+            reference_seconds,
+            optimized_seconds,
+            compare_frames(reference_df, optimized_df, atol=INGEST_ABSOLUTE_TOLERANCE),
+        )
+
+    # Statistics
+    if "statistics" in paths or "clinical" in paths:
+        reference_statistics_df, reference_seconds = _timed(
+            reference.calculate_statistics, _legacy_types(optimized_df), repeats=repeats
+        )
+        optimized_statistics_df, optimized_seconds = _timed(
+            statistics.calculate_statistics, optimized_df, repeats=repeats
+        )
+    if "statistics" in paths:
+        add_result(
+            "statistics",
+            reference_seconds,
+            optimized_seconds,
+            compare_frames(
+                reference_statistics_df,
+                optimized_statistics_df,
+                columns=schema.replicate_columns(optimized_df) + STATISTIC_COLUMNS,
+            ),
+        )
+
+    # Clinical relevance
+    if "clinical" in paths:
+        reference_clinical_df, reference_seconds = _timed(
+            reference.add_clinical_relevance, _canonical_types(optimized_statistics_df), repeats=repeats
+        )
+        optimized_clinical_df, optimized_seconds = _timed(
+            filter_values.add_clinical_relevance, optimized_statistics_df, repeats=repeats
+        )
+        add_result(
+            "clinical",
+            reference_seconds,
+            optimized_seconds,
+            compare_frames(reference_clinical_df, optimized_clinical_df, columns=CLINICAL_COLUMNS),
+        )
+
+    if "figures" not in paths and "workbook" not in paths:
+        return results
+
+    # The results of each whole chain, each starting from the output of its own ingest
+    # The reference is given canonical keys as protein IDs, see _canonical_types
+    reference_results = reference.add_clinical_relevance(
+        reference.filter_variation(
+            reference.calculate_statistics(_canonical_types(accession.add_canonical_ids(reference_df.copy())))
+        )
+    )
+    reference_results = _sort_by_name(
+        reference_results.assign(protein_id=reference_results.pop("source_protein_id"))
+    )
+    optimized_results = _sort_by_name(
+        filter_values.filter_variation(
+            filter_values.add_clinical_relevance(
+                statistics.calculate_statistics(optimized_df.copy())
+            )
+        )
+    )
+
+    # Figures of the results of each whole chain
+    if "figures" in paths:
+        mismatches = compare_frames(
+            reference_results,
+            optimized_results,
+            columns=["protein_id", "protein_name"] + STATISTIC_COLUMNS + CLINICAL_COLUMNS,
+            rtol=CHAIN_RELATIVE_TOLERANCE,
+        )
+
+        # The reference stores expected concentrations as text, the plots are given the compact data types they use now
+        figure_results = schema.apply_compact_schema(
+            reference_results.astype({"expected_concentration": np.float32})
+        )
+        args = pipeline.PipelineConfig(
+            input=str(input_file), method="Direct", experiment="SDC", bootstrap=100
+        )
+        reference_seconds = optimized_seconds = 0
+        for name, create_figure in FIGURES.items():
+            reference_figure, seconds = _timed(create_figure, figure_results, args)
+            reference_seconds += seconds
+            optimized_figure, seconds = _timed(create_figure, optimized_results, args)
+            optimized_seconds += seconds
+            mismatches += [
+                f"{name}: {mismatch}"
+                for mismatch in compare_figures(
+                    reference_figure, optimized_figure, rtol=CHAIN_RELATIVE_TOLERANCE
+                )
+            ]
+        add_result("figures", reference_seconds, optimized_seconds, mismatches)
+
+    # Workbooks
+    if "workbook" in paths:
+        with tempfile.TemporaryDirectory() as directory:
+            reference_file = pathlib.Path(directory) / "reference.xlsx"
+            optimized_file = pathlib.Path(directory) / "optimized.xlsx"
+            _, reference_seconds = _timed(
+                _write_workbook,
+                [reference.ClinicallyRelevant, reference.AllProteins],
+                optimized_results,
+                reference_file,
+                repeats=repeats,
+            )
+            _, optimized_seconds = _timed(
+                _write_workbook,
+                [excel_writer.ClinicallyRelevant, excel_writer.AllProteins],
+                optimized_results,
+                optimized_file,
+                repeats=repeats,
+            )
+            add_result(
+                "workbook",
+                reference_seconds,
+                optimized_seconds,
+                compare_workbooks(reference_file, optimized_file),
+            )
+
+    return results
+
+
+def generate_protein_groups(
+    output_file: pathlib.Path | str, num_proteins: int, seed: int = 0
+) -> pathlib.Path:
+    """
+    This function will write a proteinGroups.txt file with random intensities, in the layout of MaxQuant results
+
+    The replicates are in the columns read by the reference implementation (52-57), and are named in the header
+    One in ten proteins is clinically relevant; some proteins have missing replicates, or are not quantified in
+    one condition (so their dried/liquid ratio is infinite), and some protein names are shared by several proteins
+
+    :param output_file: The file to write
+    :param num_proteins: The number of proteins
+    :param seed: The seed of the random values
+    :return: The path of the written file
+    """
+    output_file = pathlib.Path(output_file)
+    random_generator = np.random.default_rng(seed)
+    clinical_ids = filter_values.load_clinical_proteins().clinical_ids
+
+    header = [""] * 51
+    header[1], header[5], header[6] = "Majority protein IDs", "Protein names", "Gene names"
+    header += [f"LFQ intensity Dried_{i}" for i in range(1, 4)]
+    header += [f"LFQ intensity Liquid_{i}" for i in range(1, 4)]
+    header += ["Reverse", "Potential contaminant", "Only identified by site"]
+
+    abundance = 10 ** random_generator.uniform(5, 10, size=num_proteins)
+    intensities = np.round(abundance[:, None] * random_generator.normal(1, 0.1, size=(num_proteins, 6)))
+    intensities[random_generator.random(intensities.shape) < 0.1] = 0
+    intensities[random_generator.random(num_proteins) < 0.02, 3:] = 0
+
+    with open(output_file, "w", newline="") as o_stream:
+        writer = csv.writer(o_stream, delimiter="\t", lineterminator="\n")
+        writer.writerow(header)
+        for i in range(num_proteins):
+            if i % 10 == 0:
+                protein_id = f"{clinical_ids[(i // 10) % len(clinical_ids)]};Q{i:05d}"
+            else:
+                protein_id = f"P{i:05d};P{i:05d}-2"
+            # Some proteins share a name, as isoforms do in MaxQuant results
+            protein_name = f"Protein {i - i % 2 if i % 7 == 0 else i}"
+
+            row = [""] * 51
+            row[1], row[5], row[6] = protein_id, protein_name, f"GENE{i}"
+            row += [f"{value:.0f}" for value in intensities[i]]
+            row += ["", "", ""]
+            writer.writerow(row)
+
+    return output_file
+
+
+def check_equivalence(
+    input_files: list[pathlib.Path | str], repeats: int = 1, paths: list[str] | None = None
+) -> list[EquivalenceResult]:
+    """
+    This function will check the equivalence of every code path on each input file
+
+    :param input_files: proteinGroups.txt files, recorded or created by generate_protein_groups
+    :param repeats: The number of times each implementation is run, the fastest time is reported
+    :param paths: The code paths to check, a subset of PATHS (default: every path)
+    :return: An EquivalenceResult for each path of each input
+    """
+    return [
+        result for input_file in input_files for result in check_input(input_file, repeats, paths)
+    ]
+
+
+def assert_equivalent(results: list[EquivalenceResult]) -> None:
+    """
+    This function will raise an error listing every difference found by check_equivalence,
+    and every path that is slower than its reference, see MIN_SPEEDUP
+    It lets tests fail when an optimized implementation changes a result, or is no longer faster
+
+    :param results: The results of check_equivalence
+    :return: None
+    """
+    mismatches = [
+        f"{result.path} ({result.input_file}): {mismatch}"
+        for result in results
+        for mismatch in result.mismatches
+    ]
+    mismatches += [
+        f"{result.path} ({result.input_file}): {result.speedup:.2f}x the speed of the reference, "
+        f"expected at least {MIN_SPEEDUP:.2f}x"
+        for result in results
+        if result.regressed
+    ]
+    if mismatches:
+        raise AssertionError("\n".join(mismatches))
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    This function will parse the equivalence command line arguments
+
+    :return: The parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Check that the optimized implementations give the same results as the reference implementations, "
+        "and report the speedup of each code path"
+    )
+    parser.add_argument(
+        "--inputs",
+        nargs="*",
+        default=[],
+        metavar="proteinGroups.txt",
+        help="Recorded proteinGroups.txt files to check, with three dried and three liquid replicates in columns 52-57",
+    )
+    parser.add_argument(
+        "--generate",
+        type=int,
+        nargs="*",
+        default=[2000],
+        metavar="N",
+        help="Also check generated inputs with these numbers of proteins (default: 2000). "
+        "Give the flag without numbers to only check recorded inputs",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=3,
+        help="The number of times each implementation is run, the fastest time is reported (default: 3)",
+    )
+    parser.add_argument(
+        "--paths",
+        nargs="+",
+        choices=PATHS,
+        default=PATHS,
+        help="The code paths to check (default: every path)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="The seed of generated inputs (default: 0)")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    with tempfile.TemporaryDirectory() as generated_directory:
+        input_files = [pathlib.Path(input_file) for input_file in args.inputs]
+        for num_proteins in args.generate:
+            generated_file = pathlib.Path(generated_directory) / f"{num_proteins}" / "proteinGroups.txt"
+            generated_file.parent.mkdir()
+            input_files.append(generate_protein_groups(generated_file, num_proteins, seed=args.seed))
+
+        equivalence_results = check_equivalence(input_files, repeats=args.repeats, paths=args.paths)
+
+    print(f"{'path':<12}{'reference':>12}{'optimized':>12}{'speedup':>10}  result")
+    for result in equivalence_results:
+        print(
+            f"{result.path:<12}{1000 * result.reference_seconds:>10.1f}ms{1000 * result.optimized_seconds:>10.1f}ms"
+            f"{result.speedup:>9.1f}x  {'equivalent' if result.equivalent else 'DIFFERENT'}"
+            f"{'  SLOWER' if result.regressed else ''}  {result.input_file}"
+        )
+
+    try:
+        assert_equivalent(equivalence_results)
+    except AssertionError as error:
+        print(error)
+        exit(1)
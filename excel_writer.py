@@ -1,5 +1,6 @@
 import argparse
 import pathlib
+import re
 
 import openpyxl
 import pandas as pd
@@ -8,6 +9,194 @@ from openpyxl.styles.borders import Border, Side
 from openpyxl.workbook.workbook import Workbook
 from openpyxl.worksheet.worksheet import Worksheet
 
+import filter_values
+
+# The limits of an excel worksheet. Data that would exceed them is written to additional sheets (shards)
+MAX_ROWS = 1_048_576
+MAX_COLUMNS = 16_384
+
+# The statistics written for each method/experiment, in column order, and their subheadings
+METRIC_SUBHEADINGS: dict[str, str] = {
+    "dried_average": "Dried\nAverage",
+    "dried_variation": "Dried\n%CV",
+    "liquid_average": "Liquid\nAverage",
+    "liquid_variation": "Liquid\n%CV",
+    "dried_liquid_ratio": "D/L\nRatio",
+}
+
+# The method/experiments written when a workbook is created, so the layout does not depend on the order of runs
+DEFAULT_EXPERIMENTS: list[tuple[str, str]] = [
+    ("Direct", "SDC"),
+    ("C18", "SDC"),
+    ("Direct", "Urea"),
+    ("C18", "Urea"),
+]
+
+# The number of rows above the data, for headings and subheadings
+HEADING_ROWS = 2
+
+# Vertical borders between method/experiments are drawn down to this row
+BORDER_ROWS = 500
+
+
+def _cell_value(value: float) -> float:
+    """
+    This function will convert a (float32) data frame value to a float that can be written to a cell
+
+    Values are rounded, as float32 values converted to float would otherwise be written with extra digits
+
+    :param value: The data frame value
+    :return: A float rounded to 4 decimals
+    """
+    return round(float(value), 4)
+
+
+def experiment_heading(method: str, experiment: str) -> str:
+    """
+    This function will create the heading of a method/experiment, such as "SDC" (Direct) or "SDC-C18"
+
+    :param method: The Mass Spectrometry method
+    :param experiment: The experiment type
+    :return: The heading
+    """
+    if method.lower() == "direct":
+        return experiment
+    return f"{experiment}-{method}"
+
+
+def parse_heading(heading: str) -> tuple[str, str]:
+    """
+    This function will find the method and experiment of a heading created by experiment_heading
+
+    :param heading: The heading
+    :return: The method and experiment
+    """
+    experiment, _, method = heading.partition("-")
+    return method or "Direct", experiment
+
+
+def shard_name(base_name: str, column_shard: int, row_shard: int = 0) -> str:
+    """
+    This function will name a shard of a sheet
+
+    The first shard keeps the name of the sheet
+    Method/experiments that do not fit in the columns of a sheet are written to "<name> 2", "<name> 3", etc.
+    Rows that do not fit are continued in "<name> 1.2", "<name> 1.3", etc. (or "<name> 2.2" for the second column shard)
+
+    :param base_name: The name of the sheet
+    :param column_shard: The index of the column shard, starting at 0
+    :param row_shard: The index of the row shard, starting at 0
+    :return: The name of the worksheet
+    """
+    if row_shard > 0:
+        return f"{base_name} {column_shard + 1}.{row_shard + 1}"
+    if column_shard > 0:
+        return f"{base_name} {column_shard + 1}"
+    return base_name
+
+
+def parse_shard_name(base_name: str, sheet_name: str) -> tuple[int, int] | None:
+    """
+    This function will find the column and row shard of a worksheet, from its name
+
+    :param base_name: The name of the sheet
+    :param sheet_name: The name of the worksheet
+    :return: The column and row shard, or None if the worksheet is not a shard of the sheet
+    """
+    if sheet_name == base_name:
+        return 0, 0
+
+    match = re.fullmatch(rf"{re.escape(base_name)} (\d+)(?:\.(\d+))?", sheet_name)
+    if match is None:
+        return None
+    return int(match[1]) - 1, int(match[2] or 1) - 1
+
+
+class ColumnRegistry:
+    def __init__(self, first_column: int, max_columns: int):
+        """
+        The column of each (method, experiment, metric) in a sheet
+
+        Each method/experiment is a block of one column per metric, placed after the previous block
+        A block that would exceed max_columns starts the next column shard of the sheet
+
+        :param first_column: The first column of the first block (the columns before it hold protein names and IDs)
+        :param max_columns: The number of columns of a worksheet
+        """
+        self._first_column = first_column
+        self._max_columns = max_columns
+        self._blocks: dict[tuple[str, str], tuple[int, int]] = {}
+        self._columns: dict[tuple[str, str, str], tuple[int, int]] = {}
+        self._next_block: tuple[int, int] = (0, first_column)
+
+    @property
+    def first_column(self) -> int:
+        return self._first_column
+
+    @property
+    def column_shards(self) -> int:
+        return self._next_block[0] + 1
+
+    def column(self, method: str, experiment: str, metric: str) -> tuple[int, int]:
+        """
+        This function will find the column of a metric
+
+        :param method: The Mass Spectrometry method
+        :param experiment: The experiment type
+        :param metric: A key of METRIC_SUBHEADINGS
+        :return: The column shard and column
+        """
+        return self._columns[(method, experiment, metric)]
+
+    def blocks(self, column_shard: int | None = None) -> list[tuple[str, str, int, int]]:
+        """
+        This function will list the method/experiment blocks, in column order
+
+        :param column_shard: Only list the blocks of this column shard (default: every block)
+        :return: The method, experiment, column shard, and first column of each block
+        """
+        return [
+            (method, experiment, shard, start_column)
+            for (method, experiment), (shard, start_column) in self._blocks.items()
+            if column_shard is None or shard == column_shard
+        ]
+
+    def place(self, method: str, experiment: str, column_shard: int, start_column: int) -> None:
+        """
+        This function will add a method/experiment block at a known position, such as one read from an existing sheet
+
+        :param method: The Mass Spectrometry method
+        :param experiment: The experiment type
+        :param column_shard: The column shard of the block
+        :param start_column: The first column of the block
+        :return: None
+        """
+        self._blocks[(method, experiment)] = (column_shard, start_column)
+        for offset, metric in enumerate(METRIC_SUBHEADINGS):
+            self._columns[(method, experiment, metric)] = (column_shard, start_column + offset)
+
+        self._next_block = max(
+            self._next_block, (column_shard, start_column + len(METRIC_SUBHEADINGS))
+        )
+
+    def register(self, method: str, experiment: str) -> tuple[int, int, bool]:
+        """
+        This function will find the block of a method/experiment, adding it after the last block if it is new
+
+        :param method: The Mass Spectrometry method
+        :param experiment: The experiment type
+        :return: The column shard and first column of the block, and whether it was added
+        """
+        if (method, experiment) in self._blocks:
+            return *self._blocks[(method, experiment)], False
+
+        column_shard, start_column = self._next_block
+        if start_column + len(METRIC_SUBHEADINGS) - 1 > self._max_columns:
+            column_shard, start_column = column_shard + 1, self._first_column
+
+        self.place(method, experiment, column_shard, start_column)
+        return column_shard, start_column, True
+
 
 class _WorkbookEditor:
     def __init__(self, args: argparse.Namespace):
@@ -16,173 +205,234 @@ class _WorkbookEditor:
 
         self._clinical_sheetname = "Clinically Relevant Proteins"
         self._all_proteins_sheetname = "All Proteins"
-        self._headings = ["SDC", "SDC-C18", "Urea", "Urea-C18"]
-        self._subheadings = [
-            "Dried\nAverage",
-            "Dried\n%CV",
-            "Liquid\nAverage",
-            "Liquid\n%CV",
-            "D/L\nRatio",
-        ]
 
-        self._first_setup: bool = self._setup_workbook()
+        # The clinical sheet has a "Typical Plasma Conc" column before the first method/experiment
+        self._registries: dict[str, ColumnRegistry] = {
+            self._clinical_sheetname: ColumnRegistry(first_column=4, max_columns=MAX_COLUMNS),
+            self._all_proteins_sheetname: ColumnRegistry(first_column=3, max_columns=MAX_COLUMNS),
+        }
 
-        if self.first_setup:
-            self._workbook[self._all_proteins_sheetname].delete_cols(3)
-            self._remerge_cells()
+        self._first_setup: bool = self._setup_workbook()
 
     def _setup_workbook(self) -> bool:
         if pathlib.Path.exists(pathlib.Path(self._args.excel)):
             self._workbook = openpyxl.load_workbook(self._args.excel)
+            self._read_registries()
             return False
         else:
             self._workbook = openpyxl.Workbook()
 
             del self._workbook["Sheet"]
 
-            self._workbook.create_sheet(self.clinical_sheetname)
-            self._workbook.create_sheet(self.all_proteins_sheetname)
-
-            self._set_formatting()
-            self._write_headings()
+            for sheet_name in self._registries:
+                self.worksheet(sheet_name, column_shard=0)
+                for method, experiment in DEFAULT_EXPERIMENTS:
+                    self.register(sheet_name, method, experiment)
 
             return True
 
-    def _set_formatting(self) -> None:
+    def _read_registries(self) -> None:
         """
-        This function is responsible for any formatting required of the excel sheet
-        This includes setting alignments, freezing rows for headers, and setting borders
-        :return:
+        This function will read the position of each method/experiment from the headings of an existing workbook
+        Headings are merged over their block, so each heading is only written in the first column of its block
+
+        :return: None
         """
-        # Freeze top two rows for headers
-        self._workbook[self.clinical_sheetname].freeze_panes = "A3"
-        self._workbook[self._all_proteins_sheetname].freeze_panes = "A3"
-
-        # Set alignment
-        # Iterate through each worksheet
-        for sheet in self._workbook.worksheets:
-            for row in range(1, 3):
-                for col in range(1, 24):
-                    sheet.cell(row, col).alignment = Alignment(
-                        wrapText=True, horizontal="center", vertical="center"
-                    )
+        for sheet_name, registry in self._registries.items():
+            for worksheet in self._workbook.worksheets:
+                shard = parse_shard_name(sheet_name, worksheet.title)
+                if shard is None or shard[1] != 0:
+                    continue
+
+                for cell in next(worksheet.iter_rows(min_row=1, max_row=1)):
+                    if cell.column >= registry.first_column and cell.value is not None:
+                        method, experiment = parse_heading(str(cell.value))
+                        registry.place(method, experiment, shard[0], cell.column)
+
+    def worksheet(self, sheet_name: str, column_shard: int, row_shard: int = 0) -> Worksheet:
+        """
+        This function will return a shard of a sheet, creating it if it does not exist
 
-        medium_left_border = Border(left=Side(style="medium"))
-        medium_bottom_border = Border(bottom=Side(style="medium"))
+        New shards are given the headings, formatting, and (for the clinical sheet) the clinically relevant proteins
 
-        # Add vertical borders between each experiment (SDC, SDC-C18, etc.)
-        for row in range(3, 500):
-            for column in range(4, 25, 5):
-                # Set left borders for clinical worksheet
-                self._workbook[self._clinical_sheetname].cell(
-                    row=row, column=column
-                ).border = medium_left_border
-
-                # Set borders for all proteins worksheet
-                self._workbook[self._all_proteins_sheetname].cell(
-                    row=row, column=column
-                ).border = medium_left_border
-
-        # Add horizontal border below subheading
-        for column in range(1, 24):
-            self._workbook[self._clinical_sheetname].cell(
-                row=2, column=column
-            ).border = medium_bottom_border
-
-            self._workbook[self._all_proteins_sheetname].cell(
-                row=2, column=column
-            ).border = medium_bottom_border
-
-        # Set width for clinical worksheet column A and B
-        # From: https://stackoverflow.com/a/35790441
-        self._workbook[self._clinical_sheetname].column_dimensions["A"].width = 51
-        self._workbook[self._clinical_sheetname].column_dimensions["B"].width = 12
-
-        # Set width for all proteins worksheet column A and B
-        # Do not set column A to "max" value, as this could be very long
-        self._workbook[self._all_proteins_sheetname].column_dimensions["A"].width = 70
-        self._workbook[self._all_proteins_sheetname].column_dimensions["B"].width = 35
-
-    def _write_headings(self) -> None:
-        """
-        This function will write the heading values for each worksheet
-        It attempts to do this in the least amount of copy-paste code as possible
-        :return:
+        :param sheet_name: The name of the sheet
+        :param column_shard: The index of the column shard
+        :param row_shard: The index of the row shard
+        :return: The worksheet
         """
-        # Get worksheets to write data that is independent between the two
-        clinical_sheet: Worksheet = self._workbook[self.clinical_sheetname]
-        all_proteins_sheet: Worksheet = self._workbook[self.all_proteins_sheetname]
+        title = shard_name(sheet_name, column_shard, row_shard)
+        if title in self._workbook.sheetnames:
+            return self._workbook[title]
+
+        worksheet = self._workbook.create_sheet(title)
+        self._write_headings(worksheet, sheet_name)
+        for method, experiment, _, start_column in self._registries[sheet_name].blocks(
+            column_shard
+        ):
+            self._write_block_heading(worksheet, method, experiment, start_column)
 
-        # Set clinical worksheet headings
-        clinical_sheet["A1"] = "Clinically Relevant"
-        clinical_sheet["C1"] = "Typical\nPlasma\nConc"
-        clinical_sheet.merge_cells("C1:C2")
+        if sheet_name == self.clinical_sheetname:
+            self._write_clinical_name_id(worksheet)
 
-        # Set All Proteins sheet headings
-        all_proteins_sheet["A1"] = "Identified Proteins"
+        return worksheet
 
-        # Iterate through each sheet in the workbook
-        for sheet in self._workbook.worksheets:
+    def worksheets(self, sheet_name: str) -> list[tuple[int, int, Worksheet]]:
+        """
+        This function will list the existing shards of a sheet
 
-            # Write values that are consistent between the two sheets
-            sheet["A2"] = "Protein\nName"
-            sheet["B2"] = "Majority\nProtein\nID"
-            sheet.merge_cells("A1:B1")
+        :param sheet_name: The name of the sheet
+        :return: The column shard, row shard, and worksheet of each shard
+        """
+        shards = []
+        for worksheet in self._workbook.worksheets:
+            shard = parse_shard_name(sheet_name, worksheet.title)
+            if shard is not None:
+                shards.append((*shard, worksheet))
 
-            # Start writing the top-most headings
-            for i, col_num in enumerate(range(4, 24, 5)):
+        return shards
 
-                sheet.cell(row=1, column=col_num, value=self._headings[i])
-                sheet.merge_cells(
-                    start_row=1, end_row=1, start_column=col_num, end_column=col_num + 4
-                )
+    def register(self, sheet_name: str, method: str, experiment: str) -> tuple[int, int]:
+        """
+        This function will find the columns of a method/experiment in a sheet
 
-                # Write subheadings (dried average, dried %CV, liquid average, etc.)
-                for sub_col_num in range(0, 5):
-                    sheet.cell(
-                        row=2,
-                        column=col_num + sub_col_num,
-                        value=self._subheadings[sub_col_num],
-                    )
+        A new method/experiment is added after the last one, and its heading is written to every row shard
+        When the columns of a sheet are full, it is added to a new column shard
 
-    def _remerge_cells(self):
+        :param sheet_name: The name of the sheet
+        :param method: The Mass Spectrometry method
+        :param experiment: The experiment type
+        :return: The column shard and first column of the method/experiment
         """
-        This function will re-merge cells after deleting a column
+        column_shard, start_column, added = self._registries[sheet_name].register(
+            method, experiment
+        )
+
+        if added:
+            shards = [
+                worksheet
+                for shard, _, worksheet in self.worksheets(sheet_name)
+                if shard == column_shard
+            ]
+            # A new column shard is created with every heading of its blocks
+            if not shards:
+                self.worksheet(sheet_name, column_shard)
+            for worksheet in shards:
+                self._write_block_heading(worksheet, method, experiment, start_column)
 
-        From: https://stackoverflow.com/questions/58412906
+        return column_shard, start_column
 
+    def _write_headings(self, worksheet: Worksheet, sheet_name: str) -> None:
+        """
+        This function will write the protein name and ID headings of a worksheet, and the formatting they need
+        It attempts to do this in the least amount of copy-paste code as possible
+
+        :param worksheet: The worksheet
+        :param sheet_name: The name of the sheet the worksheet is a shard of
         :return: None
         """
-        delete_index = 3
-        for merged_cells in self._workbook[self.all_proteins_sheetname].merged_cells:
-            if delete_index < merged_cells.min_col:
-                merged_cells.shift(col_shift=-1)
-            elif delete_index <= merged_cells.max_col:
-                merged_cells.shrink(right=1)
+        if sheet_name == self.clinical_sheetname:
+            worksheet["A1"] = "Clinically Relevant"
+            worksheet["C1"] = "Typical\nPlasma\nConc"
+            worksheet.merge_cells("C1:C2")
+
+            # Set width for clinical worksheet column A and B
+            # From: https://stackoverflow.com/a/35790441
+            worksheet.column_dimensions["A"].width = 51
+            worksheet.column_dimensions["B"].width = 12
+        else:
+            worksheet["A1"] = "Identified Proteins"
+
+            # Do not set column A to "max" value, as this could be very long
+            worksheet.column_dimensions["A"].width = 70
+            worksheet.column_dimensions["B"].width = 35
+
+        worksheet["A2"] = "Protein\nName"
+        worksheet["B2"] = "Majority\nProtein\nID"
+        worksheet.merge_cells("A1:B1")
 
-    def get_column_write_start(self, sheet_title: str) -> int:
+        # Freeze top two rows for headers
+        worksheet.freeze_panes = "A3"
+
+        self._format_columns(worksheet, 1, self._registries[sheet_name].first_column - 1)
+
+    def _write_block_heading(
+        self, worksheet: Worksheet, method: str, experiment: str, start_column: int
+    ) -> None:
         """
-        This function is responsible for determining which column should be written to when adding data to the excel file
-        :param sheet_title:
-        :return:
+        This function will write the heading and subheadings of a method/experiment block
+
+        :param worksheet: The worksheet
+        :param method: The Mass Spectrometry method
+        :param experiment: The experiment type
+        :param start_column: The first column of the block
+        :return: None
         """
+        end_column = start_column + len(METRIC_SUBHEADINGS) - 1
 
-        # Determine if we are running Direct or C18 data
-        if str(self._args.method).lower() == "direct":
-            start_col = 4
-        else:
-            start_col = 9
+        worksheet.cell(row=1, column=start_column, value=experiment_heading(method, experiment))
+        worksheet.merge_cells(
+            start_row=1, end_row=1, start_column=start_column, end_column=end_column
+        )
+
+        # Write subheadings (dried average, dried %CV, liquid average, etc.)
+        for offset, subheading in enumerate(METRIC_SUBHEADINGS.values()):
+            worksheet.cell(row=2, column=start_column + offset, value=subheading)
 
-        # If this is a urea experiment, we need to go up by 10 columns
-        if str(self._args.experiment).lower() == "urea":
-            start_col += 10
+        self._format_columns(worksheet, start_column, end_column)
 
-        # If we are NOT doing first setup, and we ARE on the All Proteins sheet, decrease by one
-        # This is because the third column of ALl Proteins is deleted
-        if not self.first_setup and sheet_title == self.all_proteins_sheetname:
-            start_col -= 1
+        # Add vertical borders between each experiment (SDC, SDC-C18, etc.), and after the last one
+        medium_left_border = Border(left=Side(style="medium"))
+        for row in range(HEADING_ROWS + 1, BORDER_ROWS):
+            worksheet.cell(row=row, column=start_column).border = medium_left_border
+            worksheet.cell(row=row, column=end_column + 1).border = medium_left_border
 
-        return start_col
+    @staticmethod
+    def _format_columns(worksheet: Worksheet, start_column: int, end_column: int) -> None:
+        """
+        This function will align the headings of columns, and add a border below them
+
+        :param worksheet: The worksheet
+        :param start_column: The first column
+        :param end_column: The last column
+        :return: None
+        """
+        medium_bottom_border = Border(bottom=Side(style="medium"))
+        for column in range(start_column, end_column + 1):
+            for row in range(1, HEADING_ROWS + 1):
+                worksheet.cell(row, column).alignment = Alignment(
+                    wrapText=True, horizontal="center", vertical="center"
+                )
+            worksheet.cell(row=HEADING_ROWS, column=column).border = medium_bottom_border
+
+    @staticmethod
+    def _write_clinical_name_id(worksheet: Worksheet) -> None:
+        """
+        This function will write ONLY the clinicaly name and ID contained in the clinically_relevant.tsv file to columns 1 and 2 in the excel file
+
+        :param worksheet: The clinical worksheet
+        :return: None
+        """
+        clinical_df: pd.DataFrame = pd.read_csv(filter_values.CLINICAL_FILE, sep="\t")
+        clinical_df.sort_values(
+            "protein_name",
+            ignore_index=True,
+            inplace=True,
+            # Sort by lowercase. From: https://stackoverflow.com/a/63141564
+            key=lambda col: col.str.lower(),
+        )
+
+        for i, (name, protein_id, concentration) in enumerate(
+            zip(
+                clinical_df["protein_name"],
+                clinical_df["protein_id"],
+                clinical_df["expected_concentration [log10(pg/ml)]"],
+            )
+        ):
+            worksheet.cell(row=i + 3, column=1, value=name)
+            worksheet.cell(row=i + 3, column=2, value=protein_id)
+
+            if int(concentration) != -1:
+                worksheet.cell(row=i + 3, column=3, value=concentration)
 
     @property
     def workbook(self) -> Workbook:
@@ -200,13 +450,8 @@ class _WorkbookEditor:
     def first_setup(self) -> bool:
         return self._first_setup
 
-    @property
-    def headings(self) -> list[str]:
-        return self._headings
-
-    @property
-    def excel_subheadings(self) -> list[str]:
-        return self._subheadings
+    def registry(self, sheet_name: str) -> ColumnRegistry:
+        return self._registries[sheet_name]
 
 
 class ClinicallyRelevant:
@@ -214,93 +459,50 @@ class ClinicallyRelevant:
         self._args = args
         self._editor = _WorkbookEditor(args)
         self._workbook: Workbook = self._editor.workbook
-        self._sheet: Worksheet = self._workbook[self._editor.clinical_sheetname]
         self._dataframe: pd.DataFrame = data_frame[data_frame["relevant"]].reset_index(
             drop=True
         )
 
-        if self._editor.first_setup:
-            self._write_clinical_name_id()
+        column_shard, _ = self._editor.register(
+            self._editor.clinical_sheetname, self._args.method, self._args.experiment
+        )
+        self._sheet: Worksheet = self._editor.worksheet(
+            self._editor.clinical_sheetname, column_shard
+        )
 
         self._write_clinical_data()
         self._workbook.save(self._args.excel)
 
-    def _write_clinical_name_id(self):
-        """
-        This function will write ONLY the clinicaly name and ID contained in the clinically_relevant.tsv file to columns 1 and 2 in the excel file
-        :return:
-        """
-        clinical_df: pd.DataFrame = pd.read_csv("clinically_relevant.tsv", sep="\t")
-        clinical_df.sort_values(
-            "protein_name",
-            ignore_index=True,
-            inplace=True,
-            # Sort by lowercase. From: https://stackoverflow.com/a/63141564
-            key=lambda col: col.str.lower(),
-        )
-
-        for i, (name, protein_id, concentration) in enumerate(
-            zip(
-                clinical_df["protein_name"],
-                clinical_df["protein_id"],
-                clinical_df["expected_concentration [log10(pg/ml)]"],
-            )
-        ):
-            self._sheet.cell(row=i + 3, column=1, value=name)
-            self._sheet.cell(row=i + 3, column=2, value=protein_id)
-
-            if int(concentration) != -1:
-                self._sheet.cell(row=i + 3, column=3, value=concentration)
-
     def _write_clinical_data(self):
         """
         This function will match clinically relevant MaxQuant data lines located in the Clinically Relevant Proteins file
+        The row of each clinically relevant protein ID is looked up once, instead of searching the sheet for every protein
         :return: None
         """
+        registry = self._editor.registry(self._editor.clinical_sheetname)
 
-        start_col = self._editor.get_column_write_start(self._sheet.title)
-
-        for i, (
-            clinical_id,
-            dried_average,
-            dried_variation,
-            liquid_average,
-            liquid_variation,
-            ratio,
-        ) in enumerate(
-            zip(
-                self._dataframe["clinical_id"],
-                self._dataframe["dried_average"],
-                self._dataframe["dried_variation"],
-                self._dataframe["liquid_average"],
-                self._dataframe["liquid_variation"],
-                self._dataframe["dried_liquid_ratio"],
-            )
+        # The first row of each ID is used
+        rows: dict[str, int] = {}
+        for row_contents in self._sheet.iter_rows(
+            min_row=HEADING_ROWS + 1, min_col=2, max_col=2
         ):
-            for j, row_contents in enumerate(
-                self._sheet.iter_rows(min_row=3, min_col=2, max_col=2)
-            ):
-                row_index = j + 3
-                excel_id: str = row_contents[0].value
-
-                if clinical_id == excel_id:
-                    self._sheet.cell(
-                        row=row_index, column=start_col, value=dried_average
-                    )
+            rows.setdefault(row_contents[0].value, row_contents[0].row)
 
-                    self._sheet.cell(
-                        row=row_index, column=start_col + 1, value=dried_variation
-                    )
-                    self._sheet.cell(
-                        row=row_index, column=start_col + 2, value=liquid_average
-                    )
-                    self._sheet.cell(
-                        row=row_index, column=start_col + 3, value=liquid_variation
-                    )
+        columns = [
+            registry.column(self._args.method, self._args.experiment, metric)[1]
+            for metric in METRIC_SUBHEADINGS
+        ]
 
-                    self._sheet.cell(row=row_index, column=start_col + 4, value=ratio)
+        for clinical_id, *values in zip(
+            self._dataframe["clinical_id"],
+            *[self._dataframe[metric] for metric in METRIC_SUBHEADINGS],
+        ):
+            row_index = rows.get(clinical_id)
+            if row_index is None:
+                continue
 
-                    break
+            for column, value in zip(columns, values):
+                self._sheet.cell(row=row_index, column=column, value=_cell_value(value))
 
 
 class AllProteins:
@@ -308,229 +510,111 @@ class AllProteins:
         self._args = args
         self._editor = _WorkbookEditor(args)
         self._workbook: Workbook = self._editor.workbook
-
-        self._sheet: Worksheet = self._workbook[self._editor.all_proteins_sheetname]
+        self._sheetname = self._editor.all_proteins_sheetname
+        self._registry = self._editor.registry(self._sheetname)
 
         self._dataframe: pd.DataFrame = data_frame[
             data_frame["relevant"] == False
         ].reset_index(drop=True)
 
-        # Generate dataframes
-        self._ingested_df: pd.DataFrame = self._ingest_protein_data()
-        self._incoming_frame: pd.DataFrame = self._format_incoming_frame()
-        self._merged_frame: pd.DataFrame = pd.concat(
-            [self._ingested_df, self._incoming_frame]
-        )
+        self._editor.register(self._sheetname, self._args.method, self._args.experiment)
 
-        # Sort using protein name, then index
-        # From: https://pandas.pydata.org/docs/reference/api/pandas.DataFrame.sort_values.html
-        self._sorted_df: pd.DataFrame = self._merged_frame.sort_values(
-            ["protein_name", "index"]
-        ).reset_index(drop=True)
+        # Each protein name is one row, holding its protein ID and a value for any (method, experiment, metric)
+        self._proteins: dict[str, dict] = self._ingest_protein_data()
+        self._add_incoming_data()
 
         self._write_data()
         self._workbook.save(self._args.excel)
 
-    def _ingest_protein_data(self) -> pd.DataFrame:
+    def _ingest_protein_data(self) -> dict[str, dict]:
         """
-        This function will be responsible for returning a dataframe containing the information from the current excel file
-        :return:
+        This function will be responsible for reading the proteins already written to every shard of the sheet
+        :return: A dictionary of protein name: {"protein_id": ID, (method, experiment, metric): value}
         """
+        proteins: dict[str, dict] = {}
 
-        ingested_data: dict[str, list] = {
-            "protein_name": [],
-            "protein_id": [],
-            "method": [],
-            "experiment": [],
-            "value": [],
-            "index": [],
-        }
-
-        # Get protein data
-        for i, row in enumerate(
-            self._sheet.iter_rows(min_row=3, min_col=1, max_col=22)
-        ):
-
-            # Indexes are required to be able to ensure the data frame can be sorted
-            # This is used in case there are two "protein_name" values that clash
-            # Index will be used to ensure dried/liquid averages, etc. will map to the correct location
-            ingested_data["index"].extend([0, 1, 2, 3, 4] * 4)
-
-            for j, cell in enumerate(row):
-                # We don't want to actually iterate through the protein names & IDs, we just want the information contained in the cells
+        for column_shard, _, worksheet in self._editor.worksheets(self._sheetname):
+            # The index in each row of the value of every (method, experiment, metric) in this shard
+            columns: dict[int, tuple[str, str, str]] = {}
+            for method, experiment, _, _ in self._registry.blocks(column_shard):
+                for metric in METRIC_SUBHEADINGS:
+                    _, column = self._registry.column(method, experiment, metric)
+                    columns[column - 1] = (method, experiment, metric)
 
-                if j >= 2:
-                    ingested_data["protein_name"].append(row[0].value)
-                    ingested_data["protein_id"].append(row[1].value)
-                    try:
-                        ingested_data["value"].append(float(cell.value))
-                    except TypeError:
-                        ingested_data["value"].append(0.0)
+            for row in worksheet.iter_rows(min_row=HEADING_ROWS + 1, values_only=True):
+                # Rows without a protein name are not written
+                if not row or row[0] is None:
+                    continue
 
-                # Direct SDC values
-                if 2 <= j <= 6:
-                    ingested_data["method"].append("Direct")
-                    ingested_data["experiment"].append("SDC")
+                protein = proteins.setdefault(row[0], {"protein_id": row[1]})
+                for index, key in columns.items():
+                    if index < len(row) and isinstance(row[index], (int, float)) and row[index] != 0:
+                        protein[key] = row[index]
 
-                # C18 SDC values
-                elif 7 <= j <= 11:
-                    ingested_data["method"].append("C18")
-                    ingested_data["experiment"].append("SDC")
+        return proteins
 
-                # Direct Urea values
-                elif 12 <= j <= 16:
-                    ingested_data["method"].append("Direct")
-                    ingested_data["experiment"].append("Urea")
-
-                # C18 Urea values
-                elif 17 <= j <= 21:
-                    ingested_data["method"].append("C18")
-                    ingested_data["experiment"].append("Urea")
-
-        ingested_df: pd.DataFrame = pd.DataFrame.from_dict(ingested_data)
-
-        # Create a multi-index from the dataframe
-        # From: https://pandas.pydata.org/pandas-docs/stable/user_guide/advanced.html
-        # From:https://towardsdatascience.com/how-to-use-multiindex-in-pandas-to-level-up-your-analysis-aeac7f451fce
-        # ingested_df.set_index(["protein_name, "protein_id", "method", "experiment"], inplace=True)
-
-        return ingested_df
-
-    def _format_incoming_frame(self) -> pd.DataFrame:
+    def _add_incoming_data(self) -> None:
         """
-        This function is responsible for creating a multi-index dataframe from the incoming data frame
-        This will make it easier to merge the values from excel and the new, incoming information
-        :return:
+        This function is responsible for adding the incoming data frame to the proteins read from the workbook
+        The values of this method/experiment replace any previous values
+        :return: None
         """
         required_data: pd.DataFrame = self._dataframe[
             (self._dataframe["relevant"] == False)
             & (self._dataframe["protein_name"] != "")
         ]
-        required_data = required_data[
-            [
-                "protein_name",
-                "protein_id",
-                "dried_average",
-                "dried_variation",
-                "liquid_average",
-                "liquid_variation",
-                "dried_liquid_ratio",
-            ]
-        ]
-        data_matches: dict[str, list] = {
-            "protein_name": [],
-            "protein_id": [],
-            "method": [],
-            "experiment": [],
-            "value": [],
-            "index": [],
-        }
 
-        for i, (
-            name,
-            protein_id,
-            dried_average,
-            dried_variation,
-            liquid_average,
-            liquid_variation,
-            ratio,
-        ) in enumerate(
-            zip(
-                required_data["protein_name"],
-                required_data["protein_id"],
-                required_data["dried_average"],
-                required_data["dried_variation"],
-                required_data["liquid_average"],
-                required_data["liquid_variation"],
-                required_data["dried_liquid_ratio"],
-            )
+        for name, protein_id, *values in zip(
+            required_data["protein_name"],
+            required_data["protein_id"],
+            *[required_data[metric] for metric in METRIC_SUBHEADINGS],
         ):
+            protein = self._proteins.setdefault(name, {})
+            protein["protein_id"] = protein_id
 
-            data_matches["protein_name"].extend([name] * 5)
-            data_matches["protein_id"].extend([protein_id] * 5)
-            data_matches["method"].extend([self._args.method] * 5)
-            data_matches["experiment"].extend([self._args.experiment] * 5)
-            data_matches["value"].extend(
-                [
-                    int(dried_average),
-                    float(dried_variation),
-                    int(liquid_average),
-                    float(liquid_variation),
-                    float(ratio),
-                ]
-            )
-
-            # Index values are required to ensure the "value" column can be sorted properly
-            data_matches["index"].extend([0, 1, 2, 3, 4])
+            for metric, value in zip(METRIC_SUBHEADINGS, values):
+                key = (self._args.method, self._args.experiment, metric)
+                # Averages are written as whole numbers
+                value = int(value) if metric.endswith("_average") else _cell_value(value)
 
-        incoming_df: pd.DataFrame = pd.DataFrame.from_dict(data_matches)
-        # incoming_df.set_index(["protein_name, "protein_id", "method", "experiment"], inplace=True)
-        return incoming_df
+                # Don't want to write 0.00 values, leave the cell empty instead
+                if value == 0:
+                    protein.pop(key, None)
+                else:
+                    protein[key] = value
 
     def _write_data(self):
         """
-        This function is responsible for taking the merged data frame and writing data to the appropriate location
+        This function is responsible for writing every protein, sorted by name, to the appropriate location
+        Every cell of every method/experiment is written, so values of proteins that moved to another row are not left behind
+        Rows that do not fit in a sheet are continued in the next row shard
         :return:
         """
+        rows_per_sheet = MAX_ROWS - HEADING_ROWS
+        columns = [
+            (key, *self._registry.column(*key))
+            for method, experiment, _, _ in self._registry.blocks()
+            for key in [(method, experiment, metric) for metric in METRIC_SUBHEADINGS]
+        ]
 
-        row_index = 3
-        for i, (
-            protein_name,
-            protein_id,
-            method,
-            experiment,
-            value,
-            index,
-        ) in enumerate(
-            zip(
-                self._sorted_df["protein_name"],
-                self._sorted_df["protein_id"],
-                self._sorted_df["method"],
-                self._sorted_df["experiment"],
-                self._sorted_df["value"],
-                self._sorted_df["index"],
-            )
-        ):
+        sorted_names = sorted(self._proteins)
 
-            # Skip unknown protein names
-            if protein_name is None:
-                continue
+        for row_shard in range((len(sorted_names) - 1) // rows_per_sheet + 1):
+            worksheets = [
+                self._editor.worksheet(self._sheetname, column_shard, row_shard)
+                for column_shard in range(self._registry.column_shards)
+            ]
+            protein_names = sorted_names[
+                row_shard * rows_per_sheet : (row_shard + 1) * rows_per_sheet
+            ]
 
-            # Only get first protein ID if protein_id is not none
-            if protein_id is not None:
-                max_protein_id = protein_id.split(";")[0]
-                additional_ids = protein_id.split(";")[1:]
-            else:
-                max_protein_id = protein_id
-                additional_ids = ""
-
-            # Default to SDC column for direct and c18
-            if method.lower() == "direct":
-                column_index = 3
-            else:
-                column_index = 8
-
-            # Only need to modify initial column index if we are writing to urea locations
-            if experiment.lower() == "urea":
-                column_index += 10
-
-            # Modify dried/liquid average, etc based on index value
-            column_index += index
-
-            # Don't want to write 0.00 values, write empty string instead
-            if value == 0:
-                value = ""
-
-            self._sheet.cell(row=row_index, column=1, value=protein_name)
-            self._sheet.cell(row=row_index, column=2, value=protein_id)
-            self._sheet.cell(row=row_index, column=column_index, value=value)
-
-            # Write to next row if current protein name differs from next protein name
-            try:
-                next_name = self._sorted_df.loc[i + 1, "protein_name"]
-                if protein_name != next_name:
-                    row_index += 1
-
-            # next_name will error-out on the last value, must account for this
-            except KeyError:
-                pass
+            for row_index, protein_name in enumerate(protein_names, start=HEADING_ROWS + 1):
+                protein = self._proteins[protein_name]
+                for worksheet in worksheets:
+                    worksheet.cell(row=row_index, column=1, value=protein_name)
+                    worksheet.cell(row=row_index, column=2, value=protein["protein_id"])
+
+                for key, column_shard, column in columns:
+                    worksheets[column_shard].cell(
+                        row=row_index, column=column, value=protein.get(key)
+                    )
@@ -1,9 +1,30 @@
 import argparse
+import bz2
+import contextlib
+import csv
+import functools
+import gzip
+import hashlib
+import io
+import itertools
+import lzma
 import pathlib
+import re
+import time
+from typing import BinaryIO, Iterator
 
+import numpy as np
+import pandas as pd
 import plotly
 
+import accession
 import enums
+import schema
+
+# The Mass Spectrometry methods and experiment types of a run, by lower case name,
+# with the capitalization used for titles, the excel file, and the run history
+METHODS: dict[str, str] = {"direct": "Direct", "c18": "C18"}
+EXPERIMENTS: dict[str, str] = {"sdc": "SDC", "urea": "Urea"}
 
 
 def get_experiment_title(args: argparse.Namespace) -> str:
@@ -54,23 +75,426 @@ def get_output_file_name(args: argparse.Namespace) -> str:
     return file_name
 
 
+def plot_path(
+    plot_type: enums.PlotType, args: argparse.Namespace, extension: str = "html"
+) -> pathlib.Path:
+    """
+    This function will determine where a plot is written, next to the input file
+
+    :param plot_type: The "name" of the plot type (i.e., abundance vs variation, LFQ variation, etc.)
+    :param args: The arguments retrieved from the command line using arg_parse
+    :param extension: The file extension, "html" or an image format
+    :return: The path of the plot file
+    """
+    file_name = f"{plot_type.value}_{get_output_file_name(args)}.{extension}"
+
+    # Place the plot next to the input file
+    return pathlib.Path(args.input).parent.joinpath(file_name)
+
+
 def write_plot(
     plot: plotly.graph_objects.Figure,
     plot_type: enums.PlotType,
     args: argparse.Namespace,
-):
+) -> pathlib.Path:
     """
     This function will simply handle writing the plotly graph to an output file
 
     :param plot: The plotly graph
     :param plot_type: The "name" of the plot type (i.e., abundance vs variation, LFQ variation, etc.)
     :param args: The arguments retrieved from the command line using arg_parse
-    :return: None
+    :return: The path of the html file
     """
-    file_name = f"{plot_type.value}_{get_output_file_name(args)}.html"
-
-    # Place the html plot next to the input file
-    output_path = pathlib.Path(args.input).parent
-    output_file_path = output_path.joinpath(file_name)
+    output_file_path = plot_path(plot_type, args)
 
     plot.write_html(output_file_path)
+
+    return output_file_path
+
+
+def write_variation_summary(
+    summary: pd.DataFrame, args: argparse.Namespace
+) -> pathlib.Path:
+    """
+    This function will write the protein counts of a variation threshold sweep to a tab-separated file
+
+    :param summary: The summary created by filter_values.variation_summary
+    :param args: The arguments retrieved from the command line using arg_parse
+    :return: The path of the tsv file
+    """
+    file_name = f"variation_sweep_{get_output_file_name(args)}.tsv"
+
+    # Place the summary next to the input file, with the plots
+    output_file_path = pathlib.Path(args.input).parent.joinpath(file_name)
+    summary.to_csv(output_file_path, sep="\t", index=False, float_format="%.2f")
+
+    return output_file_path
+
+
+def file_digest(input_file: pathlib.Path | str) -> str:
+    """
+    This function will calculate the sha256 hash of a file's contents, reading it in chunks
+
+    :param input_file: The file to hash
+    :return: The hexadecimal hash
+    """
+    digest = hashlib.sha256()
+    with open(input_file, "rb") as i_stream:
+        for chunk in iter(lambda: i_stream.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+# Compressed results files are decompressed while they are read, by the opener of their suffix
+# zstandard is an optional dependency, it is only imported when a ".zst" file is read
+COMPRESSION_SUFFIXES: dict[str, str] = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".zst": "zstd",
+}
+
+
+def input_compression(input_file: pathlib.Path | str) -> str | None:
+    """
+    This function will determine the compression of a results file from its suffix
+
+    :param input_file: The results file
+    :return: "gzip", "bz2", "xz", "zstd", or None if the file is not compressed
+    """
+    return COMPRESSION_SUFFIXES.get(pathlib.Path(input_file).suffix.lower())
+
+
+@contextlib.contextmanager
+def open_input(input_file: pathlib.Path | str) -> Iterator[BinaryIO]:
+    """
+    This function will open a results file as a binary stream, without writing a decompressed copy to disk
+
+    Compressed files are decompressed as the stream is read, so only one buffer of decompressed data is in memory
+    Uncompressed files are read through a buffered stream; memory-mapping them was no faster, as csv parsing dominates
+
+    The position of the stream (stream.tell()) is the number of decompressed bytes read
+
+    :param input_file: The results file
+    :return: A binary stream, closed when the context exits
+    """
+    compression = input_compression(input_file)
+
+    if compression == "gzip":
+        stream = gzip.open(input_file, "rb")
+    elif compression == "bz2":
+        stream = bz2.open(input_file, "rb")
+    elif compression == "xz":
+        stream = lzma.open(input_file, "rb")
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError(
+                f"Reading '{input_file}' requires the zstandard package. Install it with 'pip install zstandard'"
+            )
+        # The decompression reader does not read lines, so it is buffered
+        stream = io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(open(input_file, "rb"), closefd=True)
+        )
+    else:
+        stream = open(input_file, "rb")
+
+    with stream:
+        yield stream
+
+
+def read_statistics(
+    input_file: pathlib.Path | str, decompressed_bytes: int, seconds: float
+) -> dict[str, float | str | None]:
+    """
+    This function will summarize how fast a results file was read
+
+    :param input_file: The results file
+    :param decompressed_bytes: The number of (decompressed) bytes read
+    :param seconds: The time taken to read the file
+    :return: A dictionary of the bytes read, bytes on disk, compression, seconds, and throughput in MB/s
+    """
+    return {
+        "bytes": decompressed_bytes,
+        "file_bytes": pathlib.Path(input_file).stat().st_size,
+        "compression": input_compression(input_file),
+        "seconds": seconds,
+        "megabytes_per_second": decompressed_bytes / 1024**2 / max(seconds, 1e-9),
+    }
+
+
+# MaxQuant marks rows that should not be quantified with a "+" in these columns
+# Older MaxQuant versions name the contaminant column "Contaminant"
+ROW_FLAG_COLUMNS: dict[str, list[str]] = {
+    "reverse": ["Reverse"],
+    "potential_contaminant": ["Potential contaminant", "Contaminant"],
+    "only_identified_by_site": ["Only identified by site"],
+}
+
+# Rows flagged for any of these reasons are excluded by default
+DEFAULT_EXCLUDED_ROWS: list[str] = list(ROW_FLAG_COLUMNS)
+
+
+def flag_column_indices(header: list[str], exclude: list[str]) -> dict[str, int]:
+    """
+    This function will find the column of each exclusion reason in the proteinGroups.txt header
+
+    :param header: The header of the input file
+    :param exclude: The exclusion reasons, keys of ROW_FLAG_COLUMNS
+    :return: A dictionary of reason: column index. Reasons without a column in the header are left out
+    """
+    flag_columns: dict[str, int] = {}
+    for reason in exclude:
+        if reason not in ROW_FLAG_COLUMNS:
+            raise ValueError(
+                f"Unknown row exclusion '{reason}', expected one of {', '.join(ROW_FLAG_COLUMNS)}"
+            )
+
+        for column_name in ROW_FLAG_COLUMNS[reason]:
+            if column_name in header:
+                flag_columns[reason] = header.index(column_name)
+                break
+
+    return flag_columns
+
+
+# Replicate intensity columns are found by searching the header for "LFQ intensity <sample>" columns
+# whose sample name contains a condition, such as "LFQ intensity Dried_1"
+INTENSITY_COLUMN_PATTERN = re.compile(
+    rf"^LFQ intensity .*({'|'.join(schema.CONDITIONS)})", flags=re.IGNORECASE
+)
+
+# The columns used when the header does not name the samples of each condition
+DEFAULT_INTENSITY_COLUMNS: dict[str, list[int]] = {
+    "dried": [51, 52, 53],
+    "liquid": [54, 55, 56],
+}
+
+
+def find_intensity_columns(header: list[str]) -> dict[str, list[int]]:
+    """
+    This function will find the replicate intensity columns of each condition in the proteinGroups.txt header
+
+    Replicates are numbered in the order they appear in the header
+    If no sample of a condition is named in the header, the columns of DEFAULT_INTENSITY_COLUMNS are used
+
+    :param header: The header of the input file
+    :return: A dictionary of condition: column indices
+    """
+    intensity_columns: dict[str, list[int]] = {
+        condition: [] for condition in schema.CONDITIONS
+    }
+    for i, column_name in enumerate(header):
+        match = INTENSITY_COLUMN_PATTERN.match(column_name)
+        if match:
+            intensity_columns[match[1].lower()].append(i)
+
+    if not all(intensity_columns.values()):
+        return DEFAULT_INTENSITY_COLUMNS
+
+    return intensity_columns
+
+
+# The columns of the protein ID, protein name, and gene name in proteinGroups.txt
+NAME_COLUMNS: dict[str, int] = {"protein_id": 1, "gene_name": 6, "protein_name": 5}
+
+
+def _read_rows_arrow(
+    i_stream: BinaryIO,
+    header: list[str],
+    flag_columns: dict[str, int],
+    intensity_columns: dict[str, list[int]],
+) -> tuple[pd.DataFrame, dict[str, np.ndarray], dict[str, int]]:
+    """
+    This function will read the rows of a proteinGroups.txt stream with the multithreaded arrow reader
+
+    Every column is read as text. Flagged rows are removed from the text before intensities are converted to numbers,
+    and the names of the remaining rows are kept as arrow strings, the compact string type of schema.py
+
+    :param i_stream: The binary stream, positioned after the header
+    :param header: The header of the file
+    :param flag_columns: The column of each exclusion reason, see flag_column_indices
+    :param intensity_columns: The replicate columns of each condition, see find_intensity_columns
+    :return: The names of the kept rows, their (proteins x replicates) intensities for each condition,
+             and the number of rows flagged for each reason
+    """
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.csv
+
+    names = [f"column_{column}" for column in range(len(header))]
+    columns = sorted(
+        {*NAME_COLUMNS.values(), *flag_columns.values(), *itertools.chain(*intensity_columns.values())}
+    )
+    if i_stream.peek(1):
+        table = pyarrow.csv.read_csv(
+            i_stream,
+            read_options=pyarrow.csv.ReadOptions(column_names=names),
+            parse_options=pyarrow.csv.ParseOptions(delimiter="\t"),
+            convert_options=pyarrow.csv.ConvertOptions(
+                include_columns=[names[column] for column in columns],
+                column_types={names[column]: pyarrow.string() for column in columns},
+                strings_can_be_null=False,
+            ),
+        )
+    else:
+        # The arrow reader does not accept a file without rows
+        table = pyarrow.table({names[column]: pyarrow.array([], type=pyarrow.string()) for column in columns})
+
+    flagged = {
+        reason: pyarrow.compute.equal(table.column(names[column]), "+")
+        for reason, column in flag_columns.items()
+    }
+    flagged_rows = {reason: pyarrow.compute.sum(mask).as_py() or 0 for reason, mask in flagged.items()}
+    if flagged:
+        table = table.filter(pyarrow.compute.invert(functools.reduce(pyarrow.compute.or_, flagged.values())))
+
+    name_frame = pd.DataFrame(
+        {
+            name: pd.arrays.ArrowStringArray(table.column(names[column]))
+            for name, column in NAME_COLUMNS.items()
+        }
+    )
+
+    def intensities(column: int) -> np.ndarray:
+        values = table.column(names[column])
+        values = pyarrow.compute.if_else(pyarrow.compute.equal(values, ""), "0", values)
+        return pyarrow.compute.cast(values, pyarrow.float32()).to_numpy()
+
+    blocks = {
+        condition: np.column_stack([intensities(column) for column in columns]).reshape(-1, len(columns))
+        for condition, columns in intensity_columns.items()
+    }
+
+    return name_frame, blocks, flagged_rows
+
+
+def _read_rows_pandas(
+    i_stream: BinaryIO,
+    header: list[str],
+    flag_columns: dict[str, int],
+    intensity_columns: dict[str, list[int]],
+) -> tuple[pd.DataFrame, dict[str, np.ndarray], dict[str, int]]:
+    """
+    This function will read the rows of a proteinGroups.txt stream with the C parser of pandas
+    It is used when pyarrow is not installed, and returns the same values as _read_rows_arrow
+
+    :param i_stream: The binary stream, positioned after the header
+    :param header: The header of the file
+    :param flag_columns: The column of each exclusion reason, see flag_column_indices
+    :param intensity_columns: The replicate columns of each condition, see find_intensity_columns
+    :return: The names of the kept rows, their (proteins x replicates) intensities for each condition,
+             and the number of rows flagged for each reason
+    """
+    rows = pd.read_csv(
+        i_stream,
+        sep="\t",
+        header=None,
+        names=list(range(len(header))),
+        usecols=sorted(
+            {*NAME_COLUMNS.values(), *flag_columns.values(), *itertools.chain(*intensity_columns.values())}
+        ),
+        dtype=str,
+        na_filter=False,
+        encoding="utf-8",
+        engine="c",
+    )
+
+    flagged = {reason: rows[column].to_numpy() == "+" for reason, column in flag_columns.items()}
+    flagged_rows = {reason: int(mask.sum()) for reason, mask in flagged.items()}
+    if flagged:
+        rows = rows[~np.logical_or.reduce(list(flagged.values()))]
+
+    name_frame = pd.DataFrame(
+        {name: rows[column].to_numpy() for name, column in NAME_COLUMNS.items()}
+    )
+
+    blocks = {}
+    for condition, columns in intensity_columns.items():
+        values = rows[columns].to_numpy()
+        values[values == ""] = "0"
+        blocks[condition] = values.astype(schema.INTENSITY_DTYPE)
+
+    return name_frame, blocks, flagged_rows
+
+
+def create_intensity_dataframe(
+    input_file: pathlib.Path | str, exclude: list[str] | None = None
+) -> pd.DataFrame:
+    """
+    This function will gather a series of data from the input file
+    These data will be:
+        1) The identified gene name
+        2) The identified protein name
+        3) All dried intensity values, "dried_1" to "dried_N"
+        4) All liquid intensity values, "liquid_1" to "liquid_N"
+
+    Replicate columns are found by their header name, see find_intensity_columns
+    The canonical key of each protein is added as "canonical_id", so proteins are matched and joined without parsing
+    their accessions again, see accession.py
+
+    It will return these items as a pandas dataframe, using the compact data types from schema.py
+
+    Only the name, flag, and replicate columns are parsed, as text, by the arrow reader (or the pandas reader if
+    pyarrow is not installed), see _read_rows_arrow. Rows flagged as reverse (decoy), potential contaminant, or only identified by site are
+    removed from that text before intensities are converted to numbers, so their values are never part of the dataframe
+    The number of rows skipped for each reason is stored in data_frame.attrs["excluded_rows"]
+    A row flagged for several reasons is counted for each of them
+    Empty intensity cells are read as 0, the value MaxQuant writes for a replicate without intensity
+
+    The file can be compressed (see COMPRESSION_SUFFIXES), it is decompressed as it is read
+    How fast the file was read is stored in data_frame.attrs["read_statistics"], see read_statistics
+
+    :param input_file: The MaxQuant proteinGroups.txt results file
+    :param exclude: The reasons to skip rows for, keys of ROW_FLAG_COLUMNS (default: DEFAULT_EXCLUDED_ROWS)
+    :return: A pandas dataframe
+    """
+    if exclude is None:
+        exclude = DEFAULT_EXCLUDED_ROWS
+
+    start = time.perf_counter()
+    with open_input(input_file) as i_stream:
+        # The header is used to find the flag and replicate columns
+        header = next(csv.reader([i_stream.readline().decode("utf-8")], delimiter="\t"))
+        flag_columns = flag_column_indices(header, exclude)
+        intensity_columns = find_intensity_columns(header)
+
+        try:
+            name_frame, blocks, flagged_rows = _read_rows_arrow(
+                i_stream, header, flag_columns, intensity_columns
+            )
+        except ImportError:
+            name_frame, blocks, flagged_rows = _read_rows_pandas(
+                i_stream, header, flag_columns, intensity_columns
+            )
+
+        # The whole file has been read, so the position of the binary stream is its (decompressed) size
+        decompressed_bytes = i_stream.tell()
+
+    excluded_rows: dict[str, int] = {reason: 0 for reason in exclude}
+    excluded_rows.update(flagged_rows)
+
+    # Store strings and intensities using compact data types, as the frame is copied by several stages
+    # The frame is created once from columns that already have these types, as converting the columns of a frame
+    # takes longer than reading a small file
+    names = {
+        "protein_id": name_frame["protein_id"],
+        "canonical_id": accession.canonical_ids(name_frame["protein_id"]),
+        "gene_name": name_frame["gene_name"],
+        "protein_name": name_frame["protein_name"],
+    }
+    columns = {name: values.astype(schema.string_dtype(values)).array for name, values in names.items()}
+
+    # Each condition is read as one (proteins x replicates) block, whatever the number of replicates
+    for condition, block in blocks.items():
+        for replicate in range(block.shape[1]):
+            columns[f"{condition}_{replicate + 1}"] = block[:, replicate]
+    data_frame = schema.apply_compact_schema(pd.DataFrame(columns))
+    data_frame.attrs["excluded_rows"] = excluded_rows
+    data_frame.attrs["read_statistics"] = read_statistics(
+        input_file, decompressed_bytes, time.perf_counter() - start
+    )
+
+    return data_frame
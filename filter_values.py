@@ -1,9 +1,18 @@
 import csv
+import dataclasses
+import functools
 import pathlib
 
 import numpy as np
 import pandas as pd
 
+import accession
+import schema
+
+
+# The clinically relevant proteins are stored next to this file, so they are found from any working directory
+CLINICAL_FILE = pathlib.Path(__file__).parent / "clinically_relevant.tsv"
+
 
 class _GatherProteinData:
     def __init__(self):
@@ -12,7 +21,7 @@ class _GatherProteinData:
         self._expected_concentration: list[str] = []
 
         # Gather clinically relevant proteins and protein IDS
-        with open("clinically_relevant.tsv", "r") as i_stream:
+        with open(CLINICAL_FILE, "r") as i_stream:
             reader = csv.reader(i_stream, delimiter="\t")
             next(reader)
 
@@ -21,6 +30,9 @@ class _GatherProteinData:
                 self._clinical_protein_ids.append(line[1])
                 self._expected_concentration.append(line[2])
 
+        # Index the canonical accessions once, so proteins are matched without parsing these IDs again
+        self._index = accession.AccessionIndex(self._clinical_protein_ids)
+
     @property
     def clinical_names(self) -> list[str]:
         return self._clinical_protein_names
@@ -33,33 +45,139 @@ class _GatherProteinData:
     def expected_concentrations(self) -> list[str]:
         return self._expected_concentration
 
+    @property
+    def index(self) -> accession.AccessionIndex:
+        return self._index
+
+
+@functools.lru_cache(maxsize=1)
+def load_clinical_proteins() -> _GatherProteinData:
+    """
+    This function will read the clinically relevant proteins once, and reuse them for every following call
+    This keeps the catalog warm for long-running processes that analyze many files
+
+    :return: A _GatherProteinData containing the clinically relevant proteins
+    """
+    return _GatherProteinData()
+
+
+@dataclasses.dataclass(frozen=True)
+class VariationPredicate:
+    """
+    A rule accepting proteins whose variation is greater than 0 and at most max_variation
+
+    :param max_variation: The maximum %CV to accept
+    :param rule: "or" accepts proteins with dried OR liquid variation in range, "and" requires both
+    """
+
+    max_variation: float = 20
+    rule: str = "or"
+
+    def __post_init__(self):
+        if self.rule not in ["or", "and"]:
+            raise ValueError(f"Unknown variation rule '{self.rule}', expected 'or' or 'and'")
+
+    @property
+    def name(self) -> str:
+        return f"%CV <= {self.max_variation:g} (dried {self.rule} liquid)"
+
 
-def filter_variation(data_frame: pd.DataFrame, max_variation: int = 20) -> pd.DataFrame:
+def evaluate_predicates(
+    data_frame: pd.DataFrame, predicates: list[VariationPredicate]
+) -> np.ndarray:
+    """
+    This function will evaluate every variation predicate in a single pass over the variation columns
+
+    Thresholds are broadcast against the variation values, so a (proteins x predicates) mask is built at once
+    instead of filtering the data frame once for each predicate
+
+    :param data_frame: The dataframe containing "dried_variation" and "liquid_variation"
+    :param predicates: The predicates to evaluate
+    :return: A boolean array with one row per protein and one column per predicate
+    """
+    thresholds = np.array([predicate.max_variation for predicate in predicates])
+    require_both = np.array([predicate.rule == "and" for predicate in predicates])
+
+    dried = data_frame["dried_variation"].to_numpy()[:, np.newaxis]
+    liquid = data_frame["liquid_variation"].to_numpy()[:, np.newaxis]
+
+    # NaN values in the dataframe have been set to 0, so they must be excluded
+    dried_accepted = (0 < dried) & (dried <= thresholds)
+    liquid_accepted = (0 < liquid) & (liquid <= thresholds)
+
+    return np.where(
+        require_both,
+        dried_accepted & liquid_accepted,
+        dried_accepted | liquid_accepted,
+    )
+
+
+def variation_indices(
+    data_frame: pd.DataFrame, predicates: list[VariationPredicate]
+) -> dict[VariationPredicate, np.ndarray]:
+    """
+    This function will find the rows accepted by each predicate
+
+    Only row positions are returned, so no copy of the dataframe is made for each predicate
+    Use data_frame.iloc[indices] to retrieve the rows of a single predicate
+
+    :param data_frame: The dataframe to filter from
+    :param predicates: The predicates to evaluate
+    :return: A dictionary of predicate: row positions accepted by the predicate
+    """
+    masks = evaluate_predicates(data_frame, predicates)
+    return {
+        predicate: np.flatnonzero(masks[:, i]) for i, predicate in enumerate(predicates)
+    }
+
+
+def variation_summary(
+    data_frame: pd.DataFrame, predicates: list[VariationPredicate]
+) -> pd.DataFrame:
+    """
+    This function will count the proteins accepted by each predicate, for QC reports
+
+    :param data_frame: The dataframe to filter from. If it contains a "relevant" column, clinically relevant proteins are also counted
+    :param predicates: The predicates to evaluate
+    :return: A dataframe with one row per predicate
+    """
+    masks = evaluate_predicates(data_frame, predicates)
+    summary = pd.DataFrame(
+        {
+            "max_variation": [predicate.max_variation for predicate in predicates],
+            "rule": [predicate.rule for predicate in predicates],
+            "proteins": masks.sum(axis=0),
+            "percent_proteins": 100 * masks.mean(axis=0) if len(masks) else 0.0,
+        }
+    )
+
+    if "relevant" in data_frame.columns:
+        relevant = data_frame["relevant"].to_numpy(dtype=bool)
+        summary["relevant_proteins"] = masks[relevant].sum(axis=0)
+
+    return summary
+
+
+def filter_variation(
+    data_frame: pd.DataFrame, max_variation: float = 20, rule: str = "or"
+) -> pd.DataFrame:
     """
     This function will filter variation values
 
     Any variantion values LESS THAN max_variation will be accepted
     We must also filter GREATER THAN 0 because NaN values in the dataframe have been set to 0
 
-    We are currently accepting liquid OR dried variation less than max_variation
+    By default, we are accepting liquid OR dried variation less than max_variation
 
     :param data_frame: The dataframe to filter from
     :param max_variation: The maximum variation value to accept
+    :param rule: "or" accepts dried OR liquid variation less than max_variation, "and" requires both
     :return: A pandas dataframe containing the filtered values
     """
-    data_frame = data_frame[
-        (
-            (0 < data_frame["dried_variation"])
-            & (data_frame["dried_variation"] <= max_variation)
-        )
-        | (
-            (0 < data_frame["liquid_variation"])
-            & (data_frame["liquid_variation"] <= max_variation)
-        )
-    ]
-    data_frame.reset_index(drop=True, inplace=True)
+    predicate = VariationPredicate(max_variation=max_variation, rule=rule)
+    indices = variation_indices(data_frame, [predicate])[predicate]
 
-    return data_frame
+    return data_frame.iloc[indices].reset_index(drop=True)
 
 
 def substring_id_match(max_quant_ids: str, clinical_ids: str) -> bool:
@@ -67,21 +185,19 @@ def substring_id_match(max_quant_ids: str, clinical_ids: str) -> bool:
     This function is responsible for matching protein ID sets from one row of results
 
     For example:
-    - max_quant_ids: A123;B234
+    - max_quant_ids: A123-2;B234
     - clinical_ids: F789;G234;A123
 
     This function will find the "A123" match between both lists, and return true
+    Accessions are compared by their canonical form, so isoforms, contaminants, and versions match, see accession.py
+    To match many proteins, use an accession.AccessionIndex instead
 
     :param max_quant_ids: A semi-colon (;) separated list of protein IDs from max quant
     :param clinical_ids: A semi-colon (;) separated list of clinically relevant protein IDs
     :return: Boolean
     """
-    for max_quant_id in max_quant_ids.split(";"):
-        for clinical_id in clinical_ids.split(";"):
-
-            if clinical_id == max_quant_id:
-                return True
-    return False
+    index = accession.AccessionIndex([clinical_ids])
+    return index.match(accession.canonical_key(max_quant_ids)) >= 0
 
 
 def substring_name_match(max_quant_name: str, clinical_name: str) -> bool:
@@ -106,45 +222,33 @@ def add_clinical_relevance(data_frame: pd.DataFrame) -> pd.DataFrame:
 
     Default values:
     - relevant: False
-    - expected_concentration: -1
+    - expected_concentration: NaN
+    - clinical_id: ""
+
+    Proteins are matched by their canonical keys (the "canonical_id" column added when the input is read)
+    through the index of the clinically relevant proteins, so each distinct key is looked up once
+    As before, a protein is matched to the first clinically relevant protein sharing one of its accessions
 
     :param data_frame: The incoming data frame
     :return: pd.DataFrame()
     """
-    data_frame.assign(
-        relevant=np.nan, expected_concentration=np.nan, clinical_id=np.nan
-    )
-
     # Gather a list of clinically relevant proteins
-    gather_proteins = _GatherProteinData()
-    clinical_ids = gather_proteins.clinical_ids
-    clinical_names = gather_proteins.clinical_names
-    expected_concentrations = gather_proteins.expected_concentrations
-
-    for i, (max_quant_id, max_quant_name) in enumerate(
-        zip(data_frame["protein_id"], data_frame["protein_name"])
-    ):
-
-        for j, (clinical_id, clinical_name, expected_conc) in enumerate(
-            zip(clinical_ids, clinical_names, expected_concentrations)
-        ):
-
-            if substring_id_match(max_quant_id, clinical_id) or substring_name_match(
-                max_quant_id, clinical_id
-            ):
-                data_frame.loc[i, "relevant"] = True
-                data_frame.loc[i, "expected_concentration"] = expected_conc
-                data_frame.loc[i, "clinical_id"] = clinical_id
-
-                break
-
-    # Must replace NaN values otherwise pandas throws a ValueError when trying to filter
-    data_frame["relevant"].replace(
-        to_replace=np.nan,
-        value=False,
-        inplace=True,
+    gather_proteins = load_clinical_proteins()
+    clinical_ids = np.array(gather_proteins.clinical_ids, dtype=object)
+    expected_concentrations = np.array(gather_proteins.expected_concentrations, dtype=np.float32)
+
+    entries = gather_proteins.index.match_all(accession.protein_keys(data_frame))
+    relevant = entries >= 0
+    matched_entries = np.maximum(entries, 0)
+
+    data_frame = data_frame.assign(
+        relevant=relevant,
+        expected_concentration=np.where(
+            relevant, expected_concentrations[matched_entries], np.nan
+        ).astype(np.float32),
+        clinical_id=np.where(relevant, clinical_ids[matched_entries], ""),
     )
-    data_frame["clinical_id"].replace(to_replace=np.nan, value="", inplace=True)
+    data_frame = schema.apply_compact_schema(data_frame)
 
     return data_frame
 
@@ -160,8 +264,8 @@ def set_abundance_values():
 
 
 if __name__ == "__main__":
-    import main
+    import file_operations
 
     input_file = pathlib.Path("./data/c18/sdc/proteinGroups.txt")
-    data_frame: pd.DataFrame = main.create_intensity_dataframe(input_file)
+    data_frame: pd.DataFrame = file_operations.create_intensity_dataframe(input_file)
     add_clinical_relevance(data_frame)
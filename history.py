@@ -0,0 +1,334 @@
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import re
+import time
+
+import pandas as pd
+
+import accession
+import file_operations
+import schema
+import table_export
+
+# The history is a directory of Parquet files, partitioned by method, experiment, and month of the run:
+#   <history>/method=Direct/experiment=SDC/month=2026-10/<run id>.parquet
+# Each run is a new file, so appending a run only writes that run, and never reads or rewrites the history
+PARTITION_COLUMNS: list[str] = ["method", "experiment", "month"]
+
+# The columns describing the run, repeated for each of its proteins (Parquet dictionary-encodes them, so they are small)
+RUN_COLUMNS: dict[str, str] = {
+    "run_id": "string",
+    "run_time": "timestamp",
+    "input": "string",
+}
+
+# The columns describing each protein
+# lead_accession is the first accession of the canonical key, used to label a protein with a single accession
+# Proteins are selected on any accession of their canonical key, see read_trends
+PROTEIN_COLUMNS: list[str] = ["protein_id", "canonical_id", "lead_accession", "gene_name", "protein_name"]
+
+# The per-protein statistics stored for each run, and their types
+STATISTIC_COLUMNS: dict[str, str] = {
+    "dried_average": "float32",
+    "liquid_average": "float32",
+    "average_intensity": "float32",
+    "dried_variation": "float32",
+    "liquid_variation": "float32",
+    "average_variation": "float32",
+    "dried_liquid_ratio": "float32",
+    "log2_fold_change": "float32",
+    "q_value": "float64",
+    "relevant": "bool",
+}
+
+# The statistics a trend report can plot
+TREND_METRICS: list[str] = [
+    "dried_variation",
+    "liquid_variation",
+    "average_variation",
+    "dried_liquid_ratio",
+    "average_intensity",
+]
+
+
+def history_schema():
+    """
+    This function will create the arrow schema of the files of the history
+
+    Partition columns are stored in the directory names, not in the files
+
+    :return: A pyarrow schema
+    """
+    pyarrow = table_export._import_pyarrow()
+    types = {
+        "string": pyarrow.string(),
+        "timestamp": pyarrow.timestamp("us", tz="UTC"),
+        "float32": pyarrow.float32(),
+        "float64": pyarrow.float64(),
+        "bool": pyarrow.bool_(),
+    }
+
+    fields = [pyarrow.field(column, types[dtype]) for column, dtype in RUN_COLUMNS.items()]
+    fields += [pyarrow.field(column, pyarrow.string()) for column in PROTEIN_COLUMNS]
+    fields += [pyarrow.field(column, types[dtype]) for column, dtype in STATISTIC_COLUMNS.items()]
+
+    return pyarrow.schema(
+        fields,
+        metadata={table_export.METADATA_KEY: json.dumps({"schema_version": table_export.SCHEMA_VERSION})},
+    )
+
+
+def _dataset(history_directory: pathlib.Path | str):
+    """
+    This function will open every file of the history as one dataset, without reading any data
+
+    :param history_directory: The directory of the history
+    :return: A pyarrow.dataset.Dataset
+    """
+    if not pathlib.Path(history_directory).is_dir():
+        raise ValueError(f"No run history found in '{history_directory}'")
+    pyarrow = table_export._import_pyarrow()
+    import pyarrow.dataset
+
+    partition_schema = pyarrow.schema(
+        [pyarrow.field(column, pyarrow.string()) for column in PARTITION_COLUMNS]
+    )
+    file_schema = history_schema()
+
+    return pyarrow.dataset.dataset(
+        history_directory,
+        schema=pyarrow.schema(list(file_schema) + list(partition_schema), metadata=file_schema.metadata),
+        format="parquet",
+        partitioning=pyarrow.dataset.partitioning(partition_schema, flavor="hive"),
+        # Files being written are hidden until they are complete, see append_run
+        ignore_prefixes=[".", "_"],
+    )
+
+
+def append_run(
+    data_frame: pd.DataFrame,
+    history_directory: pathlib.Path | str,
+    args: argparse.Namespace,
+    run_time: datetime.datetime | None = None,
+) -> pathlib.Path:
+    """
+    This function will append the per-protein statistics of a run to the history
+
+    The run is written to a new file in the partition of its method, experiment, and month, so appending takes
+    the same time however many runs the history holds
+    The file is written under a hidden name and renamed once complete, so readers never see a partial run
+
+    :param data_frame: The clinically annotated dataframe of the run, with every quantified protein
+    :param history_directory: The directory of the history, created if needed
+    :param args: The arguments retrieved from the command line using arg_parse, containing input, method, and experiment
+    :param run_time: The time of the run (default: now)
+    :return: The path of the written file
+    """
+    pyarrow = table_export._import_pyarrow()
+    import pyarrow.parquet
+
+    if run_time is None:
+        run_time = datetime.datetime.now(datetime.timezone.utc)
+    run_time = pd.Timestamp(run_time)
+    run_time = run_time.tz_localize("UTC") if run_time.tzinfo is None else run_time.tz_convert("UTC")
+
+    # The same input appended at the same time is the same run
+    run_id = f"{run_time:%Y%m%dT%H%M%S%f}_{file_operations.file_digest(args.input)[:12]}"
+    partition = pathlib.Path(history_directory).joinpath(
+        f"method={args.method}", f"experiment={args.experiment}", f"month={run_time:%Y-%m}"
+    )
+    partition.mkdir(parents=True, exist_ok=True)
+
+    keys = accession.protein_keys(data_frame)
+    columns = {
+        "run_id": pyarrow.repeat(run_id, len(data_frame)),
+        "run_time": pyarrow.repeat(
+            pyarrow.scalar(run_time.to_pydatetime(), type=pyarrow.timestamp("us", tz="UTC")),
+            len(data_frame),
+        ),
+        "input": pyarrow.repeat(pathlib.Path(args.input).name, len(data_frame)),
+        "protein_id": data_frame["protein_id"].astype(str).to_numpy(dtype=object),
+        "canonical_id": keys.to_numpy(dtype=object),
+        "lead_accession": keys.str.split(";", n=1).str[0].to_numpy(dtype=object),
+        "gene_name": data_frame["gene_name"].astype(str).to_numpy(dtype=object),
+        "protein_name": data_frame["protein_name"].astype(str).to_numpy(dtype=object),
+    }
+
+    arrow_schema = history_schema()
+    arrays = []
+    for field in arrow_schema:
+        if field.name in columns:
+            arrays.append(pyarrow.array(columns[field.name], type=field.type))
+        elif field.name not in data_frame.columns:
+            arrays.append(pyarrow.nulls(len(data_frame), type=field.type))
+        else:
+            arrays.append(
+                pyarrow.array(
+                    data_frame[field.name].to_numpy(dtype=field.type.to_pandas_dtype()),
+                    type=field.type,
+                )
+            )
+    table = pyarrow.Table.from_arrays(arrays, schema=arrow_schema)
+
+    output_path = partition / f"{run_id}.parquet"
+    temporary_path = partition / f".{run_id}.parquet.tmp"
+    pyarrow.parquet.write_table(table, temporary_path, compression="zstd")
+    os.replace(temporary_path, output_path)
+
+    return output_path
+
+
+def read_trends(
+    history_directory: pathlib.Path | str,
+    proteins: list[str] | None = None,
+    metrics: list[str] | None = None,
+    method: str | None = None,
+    experiment: str | None = None,
+    since: datetime.date | None = None,
+) -> pd.DataFrame:
+    """
+    This function will read the statistics of proteins over every run of the history
+
+    Only the requested columns are read, and the filters are pushed down to the scan:
+    partitions of other methods, experiments, or earlier months are skipped without being opened,
+    and rows of other proteins are dropped while each file is decoded
+
+    :param history_directory: The directory of the history
+    :param proteins: The accessions of the proteins, matched on any accession of their canonical key
+                     (default: every clinically relevant protein)
+    :param metrics: The statistics to read, from STATISTIC_COLUMNS (default: dried and liquid %CV)
+    :param method: Only read runs of this method
+    :param experiment: Only read runs of this experiment
+    :param since: Only read runs from this date
+    :return: A dataframe with one row per protein per run, sorted by run time
+    """
+    table_export._import_pyarrow()
+    import pyarrow.compute
+    import pyarrow.dataset
+
+    if metrics is None:
+        metrics = ["dried_variation", "liquid_variation"]
+    for metric in metrics:
+        if metric not in STATISTIC_COLUMNS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {', '.join(STATISTIC_COLUMNS)}")
+
+    field = pyarrow.dataset.field
+    if proteins:
+        # A protein group matches when any of the semi-colon separated accessions of its canonical key is requested
+        accessions = sorted({accession.canonical_accession(protein) for protein in proteins})
+        row_filter = pyarrow.compute.match_substring_regex(
+            field("canonical_id"),
+            pattern=f"(?:^|;)(?:{'|'.join(re.escape(key) for key in accessions)})(?:;|$)",
+        )
+    else:
+        row_filter = field("relevant")
+    if method is not None:
+        row_filter &= field("method") == method
+    if experiment is not None:
+        row_filter &= field("experiment") == experiment
+    if since is not None:
+        since = pd.Timestamp(since)
+        since = since.tz_localize("UTC") if since.tzinfo is None else since.tz_convert("UTC")
+        # The month partition skips whole directories, the run time filters the first month
+        row_filter &= (field("month") >= f"{since:%Y-%m}") & (field("run_time") >= since.to_pydatetime())
+
+    columns = [
+        "run_id",
+        "run_time",
+        "method",
+        "experiment",
+        "canonical_id",
+        "lead_accession",
+        "gene_name",
+        *metrics,
+    ]
+    trend_df = _dataset(history_directory).to_table(columns=columns, filter=row_filter).to_pandas()
+    trend_df = trend_df.sort_values(["run_time", "canonical_id"], kind="stable").reset_index(drop=True)
+
+    return schema.apply_compact_schema(trend_df)
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    This function will parse the trend report command line arguments
+
+    :return: The parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Plot the %CV (or another statistic) of proteins over every run appended to a run history with --history"
+    )
+    parser.add_argument("history", help="The run history directory given to main.py with --history")
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        metavar="trends.tsv",
+        help="The table of values to write. A plot with the same name and an '.html' extension is also written",
+    )
+    parser.add_argument(
+        "-p",
+        "--proteins",
+        nargs="+",
+        default=None,
+        metavar="ACCESSION",
+        help="The proteins to follow, by accession (default: every clinically relevant protein)",
+    )
+    parser.add_argument(
+        "--metric",
+        choices=TREND_METRICS,
+        default="average_variation",
+        help="The statistic to plot (default: average_variation)",
+    )
+    # The same names PipelineConfig stores the runs under
+    parser.add_argument(
+        "--method",
+        choices=list(file_operations.METHODS.values()),
+        default=None,
+        help="Only include runs of this method",
+    )
+    parser.add_argument(
+        "--experiment",
+        choices=list(file_operations.EXPERIMENTS.values()),
+        default=None,
+        help="Only include runs of this experiment",
+    )
+    parser.add_argument(
+        "--since",
+        type=datetime.date.fromisoformat,
+        default=None,
+        metavar="YYYY-MM-DD",
+        help="Only include runs from this date",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    import plotter
+
+    args = parse_arguments()
+
+    start = time.perf_counter()
+    trend_df = read_trends(
+        args.history,
+        proteins=args.proteins,
+        metrics=[args.metric],
+        method=args.method,
+        experiment=args.experiment,
+        since=args.since,
+    )
+    scanned = time.perf_counter()
+
+    output_path = pathlib.Path(args.output)
+    trend_df.to_csv(output_path, sep="\t", index=False, float_format="%.4f")
+    plot_path = output_path.with_suffix(".html")
+    plotter.protein_trends(trend_df, args).write_html(plot_path)
+
+    print(
+        f"Read {len(trend_df)} values of {trend_df['canonical_id'].nunique()} proteins over "
+        f"{trend_df['run_id'].nunique()} runs in {scanned - start:.2f} seconds"
+    )
+    print(f"Wrote {output_path} and {plot_path}")
@@ -0,0 +1,174 @@
+import atexit
+import concurrent.futures
+import pathlib
+import queue
+import threading
+import time
+
+import plotly
+import plotly.graph_objects as go
+
+# The static image formats figures can be exported to
+IMAGE_FORMATS = ["png", "svg", "pdf", "jpeg", "webp"]
+
+# kaleido bundles an older plotly.js, which can not render figures created by newer versions of plotly
+# The plotly.js bundled with the installed plotly package is used instead
+PLOTLY_JS = pathlib.Path(plotly.__file__).parent / "package_data" / "plotly.min.js"
+
+
+class ImageExporter:
+    def __init__(self, scale: float = 1):
+        """
+        Export figures to static images using one long-lived kaleido renderer process
+
+        Starting the renderer takes about a second, much longer than rendering a figure,
+        so it is started once and every figure is sent to it through a queue
+        Figures are rendered on a background thread, so the analysis continues while images are written
+
+        kaleido is an optional dependency, it is only imported when an exporter is created
+
+        :param scale: A multiplier of the image size, for example 2 for high resolution slides
+        """
+        try:
+            from kaleido.scopes.plotly import PlotlyScope
+        except ImportError:
+            raise ValueError(
+                "Exporting images requires the kaleido package. Install it with 'pip install kaleido==0.2.1'"
+            )
+
+        self._scope = PlotlyScope(plotlyjs=str(PLOTLY_JS), mathjax=False)
+        self._scale = scale
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._export_images, daemon=True)
+        self._thread.start()
+
+    def submit(
+        self, plot: go.Figure, output_path: pathlib.Path, image_format: str
+    ) -> concurrent.futures.Future:
+        """
+        This function will add a figure to the export queue
+
+        The figure is converted to a dictionary immediately, so it can be changed after it is submitted
+
+        :param plot: The plotly figure
+        :param output_path: The image file to write
+        :param image_format: The image format, one of IMAGE_FORMATS
+        :return: A future, resolved with the output path once the image is written
+        """
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(
+                f"Unknown image format '{image_format}', expected one of {', '.join(IMAGE_FORMATS)}"
+            )
+
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        self._queue.put((plot.to_dict(), pathlib.Path(output_path), image_format, future))
+        return future
+
+    def _export_images(self) -> None:
+        """
+        This function will render queued figures until the exporter is closed
+        It runs on the background thread, the only thread that uses the renderer
+
+        :return: None
+        """
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            figure, output_path, image_format, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                image = self._scope.transform(
+                    figure, format=image_format, scale=self._scale
+                )
+                output_path.write_bytes(image)
+                future.set_result(output_path)
+            except Exception as error:
+                future.set_exception(error)
+
+    def close(self) -> None:
+        """
+        This function will wait for queued figures to be exported, and stop the renderer process
+
+        :return: None
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        # kaleido has no public way to stop the renderer: the scope stops it when deleted, but its standard error
+        # thread keeps a reference to the scope until the process exits. _shutdown_kaleido is what the scope calls
+        # when deleted, so kaleido is pinned exactly in requirements-optional.txt
+        self._scope._shutdown_kaleido()
+
+
+_shared_exporter: ImageExporter | None = None
+_shared_lock = threading.Lock()
+
+
+def shared_exporter() -> ImageExporter:
+    """
+    This function will return the exporter of this process, creating it the first time it is used
+
+    Every run of a batch in the same process (the watcher workers, the service, or repeated pipeline.run calls)
+    uses the same renderer, so it is only started once per process
+    It is closed when the process exits
+
+    :return: An ImageExporter
+    """
+    global _shared_exporter
+
+    with _shared_lock:
+        if _shared_exporter is None:
+            _shared_exporter = ImageExporter()
+            atexit.register(_shared_exporter.close)
+
+    return _shared_exporter
+
+
+if __name__ == "__main__":
+    import numpy as np
+
+    # Benchmark the latency of each figure, with a persistent renderer and with a new renderer for each figure
+    num_figures = 20
+    random_generator = np.random.default_rng(0)
+    figures = [
+        go.Figure(
+            go.Scatter(
+                x=random_generator.normal(size=2000),
+                y=random_generator.normal(size=2000),
+                mode="markers",
+            )
+        )
+        for _ in range(num_figures)
+    ]
+    output_directory = pathlib.Path("./image_export_benchmark")
+    output_directory.mkdir(exist_ok=True)
+
+    # The renderer process is started by the first figure
+    exporter = ImageExporter()
+    start = time.perf_counter()
+    exporter.submit(figures[0], output_directory / "persistent_0.png", "png").result()
+    started = time.perf_counter()
+    futures = [
+        exporter.submit(figure, output_directory / f"persistent_{i}.png", "png")
+        for i, figure in enumerate(figures[1:], start=1)
+    ]
+    concurrent.futures.wait(futures)
+    exported = time.perf_counter()
+    exporter.close()
+    print(
+        f"Persistent renderer: first figure (including startup) {1000 * (started - start):.0f} ms, "
+        f"then {1000 * (exported - started) / (num_figures - 1):.0f} ms per figure"
+    )
+
+    num_fresh_figures = 3
+    start = time.perf_counter()
+    for i, figure in enumerate(figures[:num_fresh_figures]):
+        exporter = ImageExporter()
+        exporter.submit(figure, output_directory / f"fresh_{i}.png", "png").result()
+        exporter.close()
+    print(
+        f"New renderer for each figure: {1000 * (time.perf_counter() - start) / num_fresh_figures:.0f} ms per figure"
+    )
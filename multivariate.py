@@ -0,0 +1,330 @@
+import argparse
+import dataclasses
+import pathlib
+import time
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from scipy.cluster import hierarchy
+from scipy.spatial import distance
+
+import excel_writer
+import quality_control
+import schema
+
+# Proteins quantified in fewer than this fraction of samples are not used for principal components
+MIN_QUANTIFIED = 0.5
+
+# Linkage methods that can be used with a precomputed (correlation) distance
+LINKAGE_METHODS = ["average", "complete", "single", "weighted"]
+
+# The workbook sheet, and the subheadings of the averages, read by workbook_intensities
+WORKBOOK_SHEET = "All Proteins"
+WORKBOOK_AVERAGES: dict[str, str] = {"Dried\nAverage": "dried", "Liquid\nAverage": "liquid"}
+
+
+@dataclasses.dataclass
+class MultivariateResult:
+    """
+    Principal components and hierarchical clustering of samples
+
+    :param samples: The sample columns, in order
+    :param groups: The group of each sample, used to color plots (the condition of replicates, or the workbook heading)
+    :param scores: A (samples x components) array of principal component scores
+    :param explained_variance: The fraction of the variance explained by each component
+    :param correlation: The Pearson correlation of log2 intensities between each pair of samples,
+        using proteins quantified in both samples
+    :param linkage: The scipy linkage matrix of the samples, clustered with 1 - correlation as the distance
+    :param order: The order of the samples in the dendrogram
+    :param proteins: The number of proteins used for principal components
+    """
+
+    samples: list[str]
+    groups: list[str]
+    scores: np.ndarray
+    explained_variance: np.ndarray
+    correlation: np.ndarray
+    linkage: np.ndarray
+    order: np.ndarray
+    proteins: int
+
+    def summary(self) -> pd.DataFrame:
+        """
+        This function will create a table of the principal component scores of each sample
+
+        :return: A dataframe with one row per sample, in dendrogram order
+        """
+        summary_df = pd.DataFrame(
+            {
+                "sample": self.samples,
+                "group": self.groups,
+                **{
+                    f"PC{i + 1}": self.scores[:, i]
+                    for i in range(self.scores.shape[1])
+                },
+            }
+        )
+        return summary_df.iloc[self.order].reset_index(drop=True)
+
+
+def sample_groups(columns: list[str]) -> list[str]:
+    """
+    This function will find the group of each sample from its column name, the text before the last "_"
+    Replicates ("dried_1") are grouped by condition, and workbook columns ("SDC-C18_dried") by heading
+
+    :param columns: The sample columns
+    :return: The group of each column
+    """
+    return [column.rsplit("_", 1)[0] for column in columns]
+
+
+def log_intensity_matrix(data_frame: pd.DataFrame, columns: list[str]) -> np.ndarray:
+    """
+    This function will create the (proteins x samples) log2 intensity matrix
+    Intensities of 0 were not quantified, and are NaN
+
+    :param data_frame: The intensity dataframe
+    :param columns: The sample columns
+    :return: A float64 array
+    """
+    intensities = data_frame[columns].to_numpy(dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(intensities > 0, np.log2(intensities), np.nan)
+
+
+def principal_components(
+    log_intensities: np.ndarray,
+    num_components: int = 2,
+    min_quantified: float = MIN_QUANTIFIED,
+) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    This function will calculate the principal component scores of each sample
+
+    Proteins quantified in fewer than min_quantified of the samples are removed
+    Each remaining protein is centred on its mean, and missing values are set to that mean (0 after centring),
+    so they do not move samples along any component
+    The thin SVD of the (samples x proteins) matrix is truncated to num_components;
+    its cost grows with proteins x samples², so it stays fast as long as samples are fewer than proteins
+
+    :param log_intensities: A (proteins x samples) array of log2 intensities, missing values are NaN
+    :param num_components: The number of components to keep
+    :param min_quantified: The minimum fraction of samples a protein is quantified in
+    :return: The (samples x components) scores, the fraction of variance explained by each component,
+        and the number of proteins used
+    """
+    num_samples = log_intensities.shape[1]
+    if num_samples < 2:
+        return np.zeros((num_samples, num_components)), np.zeros(num_components), 0
+
+    quantified = ~np.isnan(log_intensities)
+    values = log_intensities[quantified.mean(axis=1) >= min_quantified]
+    if len(values) == 0:
+        return np.zeros((num_samples, num_components)), np.zeros(num_components), 0
+
+    protein_means = np.nanmean(values, axis=1, keepdims=True)
+    centred = np.nan_to_num(values - protein_means, nan=0).T
+
+    left_vectors, singular_values, _ = np.linalg.svd(centred, full_matrices=False)
+    variance = singular_values**2
+    explained_variance = variance / variance.sum() if variance.sum() > 0 else variance
+
+    # Components beyond the rank of the matrix are 0
+    scores = np.zeros((num_samples, num_components))
+    explained = np.zeros(num_components)
+    kept_components = min(num_components, len(singular_values))
+    scores[:, :kept_components] = (
+        left_vectors[:, :kept_components] * singular_values[:kept_components]
+    )
+    explained[:kept_components] = explained_variance[:kept_components]
+
+    return scores, explained, len(values)
+
+
+def cluster_samples(
+    correlation: np.ndarray, method: str = "average"
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    This function will hierarchically cluster samples, using 1 - correlation as the distance between them
+
+    The distance matrix is converted to its condensed form (the upper triangle), which is what scipy links
+    Pairs of samples without shared proteins have no correlation, and are treated as uncorrelated
+
+    :param correlation: A (samples x samples) correlation matrix
+    :param method: The linkage method, one of LINKAGE_METHODS
+    :return: The scipy linkage matrix, and the order of the samples in the dendrogram
+    """
+    if method not in LINKAGE_METHODS:
+        raise ValueError(f"Unknown linkage method '{method}', expected one of {', '.join(LINKAGE_METHODS)}")
+    if len(correlation) < 2:
+        return np.empty((0, 4)), np.arange(len(correlation))
+
+    distances = np.clip(1 - np.nan_to_num(correlation, nan=0), 0, 2)
+    np.fill_diagonal(distances, 0)
+    condensed = distance.squareform(distances, checks=False)
+
+    linkage = hierarchy.linkage(condensed, method=method)
+    return linkage, hierarchy.leaves_list(linkage)
+
+
+def multivariate_analysis(
+    data_frame: pd.DataFrame,
+    columns: list[str] | None = None,
+    num_components: int = 2,
+    min_quantified: float = MIN_QUANTIFIED,
+    method: str = "average",
+) -> MultivariateResult:
+    """
+    This function will calculate principal components and hierarchical clustering of the samples of a dataframe
+
+    :param data_frame: The intensity dataframe
+    :param columns: The sample columns (default: every column matching schema.REPLICATE_PATTERN)
+    :param num_components: The number of principal components to calculate
+    :param min_quantified: The minimum fraction of samples a protein is quantified in to be used for principal components
+    :param method: The linkage method, one of LINKAGE_METHODS
+    :return: A MultivariateResult
+    """
+    if columns is None:
+        columns = schema.replicate_columns(data_frame)
+
+    log_intensities = log_intensity_matrix(data_frame, columns)
+    scores, explained_variance, proteins = principal_components(
+        log_intensities, num_components=num_components, min_quantified=min_quantified
+    )
+    correlation = quality_control.pairwise_correlation(
+        log_intensities, ~np.isnan(log_intensities)
+    )
+    linkage, order = cluster_samples(correlation, method=method)
+
+    return MultivariateResult(
+        samples=list(columns),
+        groups=sample_groups(columns),
+        scores=scores,
+        explained_variance=explained_variance,
+        correlation=correlation,
+        linkage=linkage,
+        order=order,
+        proteins=proteins,
+    )
+
+
+def workbook_intensities(excel_file: pathlib.Path | str) -> pd.DataFrame:
+    """
+    This function will read the dried and liquid averages of every method/experiment written to the excel workbook
+
+    Each heading of the "All Proteins" sheet (SDC, SDC-C18, Urea, Urea-C18) gives two samples,
+    named "<heading>_dried" and "<heading>_liquid"
+    Every shard of the sheet is read, so headings and proteins that did not fit in the first sheet are included
+    Headings that no run has been written to yet are not returned
+
+    :param excel_file: The excel file written by excel_writer
+    :return: A dataframe with a protein_id column and one column per sample
+    """
+    workbook = openpyxl.load_workbook(excel_file, read_only=True)
+
+    # The row of each protein, and its value of each sample
+    protein_rows: dict[str, int] = {}
+    samples: dict[str, dict[int, float]] = {}
+    for worksheet in workbook.worksheets:
+        if excel_writer.parse_shard_name(WORKBOOK_SHEET, worksheet.title) is None:
+            continue
+
+        rows = worksheet.iter_rows(values_only=True)
+        headings = next(rows, ())
+        subheadings = next(rows, ())
+
+        # Headings are merged over their subheadings, so each heading is only written in its first column
+        sample_columns: dict[int, str] = {}
+        heading = None
+        for column, (cell, subheading) in enumerate(zip(headings, subheadings)):
+            heading = cell if cell is not None else heading
+            if heading is not None and subheading in WORKBOOK_AVERAGES:
+                sample_columns[column] = f"{heading}_{WORKBOOK_AVERAGES[subheading]}"
+
+        for row in rows:
+            if len(row) < 2 or row[1] is None:
+                continue
+            protein_row = protein_rows.setdefault(str(row[1]), len(protein_rows))
+            for column, sample in sample_columns.items():
+                value = row[column] if column < len(row) else None
+                if isinstance(value, (int, float)) and value > 0:
+                    samples.setdefault(sample, {})[protein_row] = value
+    workbook.close()
+
+    intensities_df = pd.DataFrame({"protein_id": list(protein_rows)})
+    for sample, values in samples.items():
+        sample_values = np.zeros(len(protein_rows), dtype=np.float64)
+        sample_values[list(values)] = list(values.values())
+        intensities_df[sample] = sample_values
+
+    return intensities_df
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    This function will parse the multivariate command line arguments
+
+    :return: The parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Principal components and hierarchical clustering of the method/experiment results in the excel workbook"
+    )
+    inputs_group = parser.add_mutually_exclusive_group(required=True)
+    inputs_group.add_argument(
+        "-x", "--excel", help="The excel file that results of each method/experiment were written to"
+    )
+    inputs_group.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Time the analysis of 10,000 random proteins x 100 samples instead",
+    )
+    parser.add_argument(
+        "--linkage",
+        choices=LINKAGE_METHODS,
+        default="average",
+        help="The hierarchical clustering linkage method (default: average)",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    import plotter
+
+    args = parse_arguments()
+
+    if args.benchmark:
+        num_proteins = 10_000
+        num_samples = 100
+        random_generator = np.random.default_rng(0)
+        values = 2 ** (
+            random_generator.uniform(15, 30, size=(num_proteins, 1))
+            + random_generator.normal(0, 0.5, size=(num_proteins, num_samples))
+        )
+        values[random_generator.random(values.shape) < 0.3] = 0
+        intensities_df = schema.replicate_frame(
+            {"dried": values[:, : num_samples // 2], "liquid": values[:, num_samples // 2 :]}
+        )
+    else:
+        intensities_df = workbook_intensities(args.excel)
+    # The samples are not from a single method/experiment, so plots have the generic "Experiment" title
+    args.method, args.experiment = None, None
+    sample_columns = [column for column in intensities_df.columns if column != "protein_id"]
+
+    start = time.perf_counter()
+    result = multivariate_analysis(intensities_df, columns=sample_columns, method=args.linkage)
+    analyzed = time.perf_counter()
+    figures = [plotter.pca_scores(result, args), plotter.sample_clustering(result, args)]
+    plotted = time.perf_counter()
+
+    print(
+        f"{len(intensities_df)} proteins x {len(sample_columns)} samples: analyzed in {analyzed - start:.2f} seconds, "
+        f"plotted in {plotted - analyzed:.2f} seconds"
+    )
+    print(result.summary().to_string(index=False))
+
+    if not args.benchmark:
+        for figure, name in zip(figures, ["pca_scores", "sample_clustering"]):
+            output_path = pathlib.Path(args.excel).with_name(f"{name}_workbook.html")
+            figure.write_html(output_path)
+            print(f"Wrote {output_path}")
@@ -0,0 +1,203 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import schema
+
+NORMALIZATION_METHODS = ["none", "median", "quantile"]
+IMPUTATION_METHODS = ["none", "min_prob", "down_shift"]
+
+
+def median_normalize(log_intensities: np.ndarray) -> np.ndarray:
+    """
+    This function will shift each replicate so its median log intensity is the median of all replicates
+
+    :param log_intensities: A (proteins x replicates) array of log2 intensities, missing values are NaN
+    :return: The normalized array
+    """
+    replicate_medians = np.nanmedian(log_intensities, axis=0, keepdims=True)
+    return log_intensities - replicate_medians + np.nanmedian(replicate_medians)
+
+
+def quantile_normalize(log_intensities: np.ndarray) -> np.ndarray:
+    """
+    This function will give every replicate the same distribution of log intensities
+
+    The reference distribution is the mean of the quantiles of every replicate
+    Missing values are left missing; the quantile of each value is calculated from the values present in its replicate,
+    so replicates with different numbers of missing values can be normalized
+
+    :param log_intensities: A (proteins x replicates) array of log2 intensities, missing values are NaN
+    :return: The normalized array
+    """
+    num_proteins = log_intensities.shape[0]
+    present = ~np.isnan(log_intensities)
+    counts = present.sum(axis=0, keepdims=True)
+
+    # Rank of each value within its replicate. NaN values are sorted last, so they do not change the ranks of values
+    ranks = np.empty_like(log_intensities)
+    order = np.argsort(log_intensities, axis=0)
+    np.put_along_axis(
+        ranks, order, np.arange(num_proteins, dtype=float)[:, np.newaxis], axis=0
+    )
+    positions = ranks / np.maximum(counts - 1, 1)
+
+    # The sorted values of each replicate, interpolated onto a common grid of quantiles
+    grid = np.linspace(0, 1, max(int(counts.max()), 2))
+    sorted_values = np.take_along_axis(log_intensities, order, axis=0)
+    replicate_quantiles = [
+        np.interp(grid, np.linspace(0, 1, count), sorted_values[:count, i])
+        for i, count in enumerate(counts[0])
+        if count > 0
+    ]
+    reference = np.mean(replicate_quantiles, axis=0)
+
+    normalized = np.interp(positions.ravel(), grid, reference).reshape(log_intensities.shape)
+    return np.where(present, normalized, np.nan)
+
+
+def impute_min_prob(
+    log_intensities: np.ndarray,
+    random_generator: np.random.Generator,
+    quantile: float = 0.01,
+    scale: float = 1.0,
+) -> np.ndarray:
+    """
+    This function will replace missing values with random values near the detection limit (MinProb)
+
+    Values of each replicate are drawn from a normal distribution centred on its low quantile,
+    with the median standard deviation of proteins as the width
+
+    :param log_intensities: A (proteins x replicates) array of log2 intensities, missing values are NaN
+    :param random_generator: The random number generator
+    :param quantile: The quantile of each replicate used as the centre of the distribution
+    :param scale: A multiplier of the width of the distribution
+    :return: The imputed array
+    """
+    missing = np.isnan(log_intensities)
+    centres = np.nanquantile(log_intensities, quantile, axis=0, keepdims=True)
+
+    # Proteins with less than 2 values have no standard deviation, and are ignored
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        width = scale * np.nanmedian(np.nanstd(log_intensities, axis=1, ddof=1))
+
+    draws = random_generator.normal(size=log_intensities.shape) * width + centres
+    return np.where(missing, draws, log_intensities)
+
+
+def impute_down_shift(
+    log_intensities: np.ndarray,
+    random_generator: np.random.Generator,
+    shift: float = 1.8,
+    width: float = 0.3,
+) -> np.ndarray:
+    """
+    This function will replace missing values with random values from a down-shifted normal distribution
+
+    For each replicate, values are drawn from a normal distribution whose mean is shift standard deviations below
+    the replicate mean, and whose standard deviation is width times the replicate standard deviation
+
+    :param log_intensities: A (proteins x replicates) array of log2 intensities, missing values are NaN
+    :param random_generator: The random number generator
+    :param shift: The down-shift, in standard deviations of the replicate
+    :param width: The width of the distribution, as a fraction of the standard deviation of the replicate
+    :return: The imputed array
+    """
+    missing = np.isnan(log_intensities)
+    means = np.nanmean(log_intensities, axis=0, keepdims=True)
+    standard_deviations = np.nanstd(log_intensities, axis=0, ddof=1, keepdims=True)
+
+    draws = random_generator.normal(size=log_intensities.shape) * (
+        width * standard_deviations
+    ) + (means - shift * standard_deviations)
+    return np.where(missing, draws, log_intensities)
+
+
+def normalize_intensities(
+    data_frame: pd.DataFrame,
+    normalization: str = "none",
+    imputation: str = "none",
+    seed: int | None = 0,
+) -> pd.DataFrame:
+    """
+    This function will normalize the replicate intensities, and impute missing (zero) intensities
+
+    Every replicate of every condition is normalized together, as one (proteins x replicates) log2 matrix
+    Normalization is done before imputation, so imputed values are drawn from the normalized distributions
+    Proteins that are missing in every replicate are not imputed, and are kept as 0
+
+    :param data_frame: The intensity dataframe
+    :param normalization: "none", "median", or "quantile"
+    :param imputation: "none", "min_prob", or "down_shift"
+    :param seed: The seed of the random number generator used for imputation
+    :return: The dataframe with normalized and imputed replicate intensities
+    """
+    if normalization not in NORMALIZATION_METHODS:
+        raise ValueError(
+            f"Unknown normalization '{normalization}', expected one of {', '.join(NORMALIZATION_METHODS)}"
+        )
+    if imputation not in IMPUTATION_METHODS:
+        raise ValueError(
+            f"Unknown imputation '{imputation}', expected one of {', '.join(IMPUTATION_METHODS)}"
+        )
+    if normalization == "none" and imputation == "none":
+        return data_frame
+
+    columns = schema.replicate_columns(data_frame)
+    intensities = data_frame[columns].to_numpy(dtype=np.float64)
+
+    # Intensities of 0 were not quantified
+    with np.errstate(divide="ignore"):
+        log_intensities = np.where(intensities > 0, np.log2(intensities), np.nan)
+
+    if normalization == "median":
+        log_intensities = median_normalize(log_intensities)
+    elif normalization == "quantile":
+        log_intensities = quantile_normalize(log_intensities)
+
+    if imputation != "none":
+        quantified_proteins = ~np.isnan(log_intensities).all(axis=1, keepdims=True)
+        random_generator = np.random.default_rng(seed)
+        if imputation == "min_prob":
+            imputed = impute_min_prob(log_intensities, random_generator)
+        else:
+            imputed = impute_down_shift(log_intensities, random_generator)
+        log_intensities = np.where(quantified_proteins, imputed, np.nan)
+
+    data_frame = data_frame.copy()
+    data_frame[columns] = np.nan_to_num(np.exp2(log_intensities), nan=0).astype(
+        schema.INTENSITY_DTYPE
+    )
+
+    return data_frame
+
+
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+
+    num_proteins = 100_000
+    random_generator = np.random.default_rng(0)
+    replicates = random_generator.lognormal(mean=20, sigma=2, size=(num_proteins, 6))
+    replicates[random_generator.random(replicates.shape) < 0.2] = 0
+    benchmark_df = schema.replicate_frame(
+        {"dried": replicates[:, :3], "liquid": replicates[:, 3:]}
+    ).astype(schema.INTENSITY_DTYPE)
+
+    for normalization_method in NORMALIZATION_METHODS:
+        for imputation_method in IMPUTATION_METHODS:
+            tracemalloc.start()
+            start = time.perf_counter()
+            normalize_intensities(
+                benchmark_df, normalization=normalization_method, imputation=imputation_method
+            )
+            seconds = time.perf_counter() - start
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(
+                f"{normalization_method:>8} / {imputation_method:<10}: {num_proteins} proteins in {seconds:.3f} seconds, "
+                f"peak memory {peak_bytes / 1024**2:.1f} MB"
+            )
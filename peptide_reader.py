@@ -0,0 +1,407 @@
+import pathlib
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+import accession
+import file_operations
+import schema
+
+# The MaxQuant results files that can be analyzed, and the level they are quantified at
+INPUT_FILE_NAMES: dict[str, str] = {
+    "proteinGroups.txt": "protein_groups",
+    "peptides.txt": "peptides",
+    "evidence.txt": "evidence",
+}
+
+# Peptide intensities are summed for each protein group, the groups of proteinGroups.txt listed in this column
+# Peptides shared by several groups are summed for the group of their razor protein, as MaxQuant quantifies groups
+# from razor and unique peptides
+PROTEIN_GROUP_COLUMN = "Protein group IDs"
+
+# The razor protein of each peptide. Without a proteinGroups.txt in the same directory, peptide intensities are
+# summed for this protein instead, so each protein ID is a single accession rather than the accessions of a group
+PROTEIN_COLUMN = "Leading razor protein"
+
+# Samples are assigned to a condition by searching their name for these patterns
+CONDITION_PATTERNS: dict[str, str] = {
+    condition: condition for condition in schema.CONDITIONS
+}
+
+
+def input_level(input_file: pathlib.Path | str) -> str:
+    """
+    This function will determine which MaxQuant results file is being analyzed, from its name
+    Compressed files, such as "proteinGroups.txt.gz", have the level of the file they contain
+
+    :param input_file: The MaxQuant results file
+    :return: "protein_groups", "peptides", or "evidence"
+    """
+    name = pathlib.Path(input_file).name
+    if file_operations.input_compression(input_file) is not None:
+        name = pathlib.Path(name).stem
+
+    for file_name, level in INPUT_FILE_NAMES.items():
+        if file_name in name:
+            return level
+
+    raise ValueError(
+        f"Unknown input file '{input_file}', expected one of {', '.join(INPUT_FILE_NAMES)}"
+    )
+
+
+def _find_column(header: list[str], *names: str) -> str | None:
+    """
+    This function will find the first of several possible column names in a header, ignoring capitalization
+    MaxQuant is not consistent, for example peptides.txt has "Protein names" and evidence.txt has "Protein Names"
+
+    :param header: The header of the input file
+    :param names: The possible names of the column
+    :return: The name of the column in the header, or None if it is not found
+    """
+    lower_header = {column.lower(): column for column in header}
+    for name in names:
+        if name.lower() in lower_header:
+            return lower_header[name.lower()]
+    return None
+
+
+def _replicate_names(samples: list[str]) -> dict[str, str]:
+    """
+    This function will assign each sample to a replicate column, such as "dried_1"
+
+    Samples of each condition are numbered in natural sort order of their name, so "Dried_2" is before "Dried_10"
+    Any number of samples is allowed for each condition
+
+    :param samples: The sample (experiment) names
+    :return: A dictionary of sample: replicate column
+    """
+    replicate_names: dict[str, str] = {}
+    for condition, pattern in CONDITION_PATTERNS.items():
+        condition_samples = sorted(
+            (sample for sample in samples if re.search(pattern, sample, flags=re.IGNORECASE)),
+            key=lambda sample: [
+                int(part) if part.isdigit() else part.lower()
+                for part in re.split(r"(\d+)", sample)
+            ],
+        )
+        if not condition_samples:
+            raise ValueError(f"No {condition} samples were found in {sorted(samples)}")
+
+        for i, sample in enumerate(condition_samples, start=1):
+            replicate_names[sample] = f"{condition}_{i}"
+
+    return replicate_names
+
+
+def protein_groups_file(input_file: pathlib.Path | str) -> pathlib.Path | None:
+    """
+    This function will find the proteinGroups.txt file written by MaxQuant next to a peptides.txt or evidence.txt file
+    The file can be compressed, see file_operations.COMPRESSION_SUFFIXES
+
+    :param input_file: The peptides.txt or evidence.txt file
+    :return: The proteinGroups.txt file, or None if there is none
+    """
+    directory = pathlib.Path(input_file).parent
+    for suffix in ["", *file_operations.COMPRESSION_SUFFIXES]:
+        protein_groups = directory / f"proteinGroups.txt{suffix}"
+        if protein_groups.exists():
+            return protein_groups
+
+    return None
+
+
+def read_protein_groups(protein_groups: pathlib.Path | str) -> pd.DataFrame:
+    """
+    This function will read the identity of each protein group of a proteinGroups.txt file
+
+    The protein ID and names are read from the same columns as file_operations.create_intensity_dataframe,
+    so proteins quantified from peptides have the same keys as proteins read from proteinGroups.txt
+
+    :param protein_groups: The proteinGroups.txt file
+    :return: A dataframe indexed by group ID, with the "protein_id", "gene_name", and "protein_name" of each group,
+             and "accessions", the set of every accession of the group
+    """
+    with file_operations.open_input(protein_groups) as i_stream:
+        header = pd.read_csv(i_stream, sep="\t", nrows=0).columns.tolist()
+    id_column = _find_column(header, "id")
+    if id_column is None:
+        raise ValueError(f"The column 'id' was not found in {protein_groups}")
+    accession_column = _find_column(header, "Protein IDs") or header[file_operations.NAME_COLUMNS["protein_id"]]
+
+    columns = {
+        "group_id": header.index(id_column),
+        "accessions": header.index(accession_column),
+        **file_operations.NAME_COLUMNS,
+    }
+    with file_operations.open_input(protein_groups) as i_stream:
+        groups = pd.read_csv(
+            i_stream,
+            sep="\t",
+            header=None,
+            skiprows=1,
+            usecols=sorted(set(columns.values())),
+            dtype=str,
+            keep_default_na=False,
+        )
+    groups = pd.DataFrame({name: groups[column] for name, column in columns.items()})
+    groups["accessions"] = [set(accessions.split(";")) for accessions in groups["accessions"]]
+
+    return groups.set_index("group_id")
+
+
+def _group_proteins(group_ids: pd.Series, razor_proteins: pd.Series, groups: pd.DataFrame) -> pd.Series:
+    """
+    This function will find the protein group each peptide is summed for
+
+    A peptide of a single group is summed for that group. A peptide shared by several groups is summed for the first
+    group that contains its razor protein
+
+    :param group_ids: The semi-colon separated protein group IDs of each peptide
+    :param razor_proteins: The razor protein of each peptide
+    :param groups: The protein groups, created by read_protein_groups
+    :return: The protein ID of the group of each peptide; missing if the group is not in proteinGroups.txt
+    """
+    assigned = group_ids.where(~group_ids.str.contains(";", regex=False))
+    for row in np.flatnonzero(assigned.isna().to_numpy() & (group_ids != "").to_numpy()):
+        candidates = group_ids.iat[row].split(";")
+        assigned.iat[row] = next(
+            (
+                group_id
+                for group_id in candidates
+                if group_id in groups.index and razor_proteins.iat[row] in groups.at[group_id, "accessions"]
+            ),
+            candidates[0],
+        )
+
+    return assigned.map(groups["protein_id"])
+
+
+class _ProteinAccumulator:
+    def __init__(self):
+        """
+        Sum intensities for each protein across chunks of a file
+
+        Each chunk is reduced to one row per protein before it is added, so memory is bounded by the number of proteins,
+        not the number of peptides
+        """
+        self._intensities: pd.DataFrame | None = None
+        self._names: pd.DataFrame | None = None
+
+    def add(self, intensities: pd.DataFrame, names: pd.DataFrame) -> None:
+        """
+        This function will add the summed intensities of one chunk
+
+        :param intensities: The intensities of the chunk, indexed by protein
+        :param names: The gene and protein name of each protein in the chunk, indexed by protein
+        :return: None
+        """
+        if self._intensities is None:
+            self._intensities = intensities
+            self._names = names
+        else:
+            self._intensities = self._intensities.add(intensities, fill_value=0)
+            # The first name seen for each protein is kept
+            self._names = self._names.combine_first(names)
+
+    def result(self, replicate_names: dict[str, str]) -> pd.DataFrame:
+        """
+        This function will create the intensity dataframe from the summed intensities
+
+        :param replicate_names: A dictionary of sample: replicate column, created by _replicate_names
+        :return: A dataframe with the schema of file_operations.create_intensity_dataframe
+        """
+        replicate_columns = schema.replicate_columns(
+            pd.DataFrame(columns=list(replicate_names.values()))
+        )
+        if self._intensities is None:
+            return pd.DataFrame(
+                columns=[
+                    "protein_id",
+                    "canonical_id",
+                    "gene_name",
+                    "protein_name",
+                    *replicate_columns,
+                ]
+            )
+
+        intensities = self._intensities.rename(columns=replicate_names)
+        intensities = intensities.reindex(columns=replicate_columns, fill_value=0)
+        intensities = intensities.join(self._names).fillna(
+            {"gene_name": "", "protein_name": ""}
+        )
+        intensities = intensities.rename_axis("protein_id").reset_index()
+
+        intensities = intensities[["protein_id", "gene_name", "protein_name", *replicate_columns]]
+
+        return accession.add_canonical_ids(intensities)
+
+
+def _excluded_mask(
+    chunk: pd.DataFrame, flag_columns: dict[str, str], excluded_rows: dict[str, int]
+) -> np.ndarray:
+    """
+    This function will find the rows of a chunk flagged for any excluded reason, and count them
+
+    :param chunk: The chunk of the input file
+    :param flag_columns: A dictionary of reason: flag column in the chunk
+    :param excluded_rows: The number of rows excluded for each reason, updated in place
+    :return: A boolean array, True for rows to exclude
+    """
+    excluded = np.zeros(len(chunk), dtype=bool)
+    for reason, column in flag_columns.items():
+        flagged = (chunk[column] == "+").to_numpy()
+        excluded_rows[reason] += int(flagged.sum())
+        excluded |= flagged
+
+    return excluded
+
+
+def create_peptide_intensity_dataframe(
+    input_file: pathlib.Path | str,
+    exclude: list[str] | None = None,
+    chunk_size: int = 100_000,
+) -> pd.DataFrame:
+    """
+    This function will sum the peptide intensities of a peptides.txt or evidence.txt file for each protein
+
+    The file is read in chunks of chunk_size rows, and only the required columns are parsed
+    Compressed files are decompressed as they are read, see file_operations.open_input
+    Peptides are summed for the protein group in the "Protein group IDs" column, identified by the proteinGroups.txt
+    file in the same directory, so proteins have the same protein IDs as when proteinGroups.txt is analyzed
+    Without proteinGroups.txt, peptides are summed for the protein in the "Leading razor protein" column
+    In peptides.txt each sample is an "Intensity <sample>" column ("LFQ intensity <sample>" is used if present)
+    In evidence.txt each row has an "Experiment" and an "Intensity"
+    Samples are assigned to dried and liquid replicates using CONDITION_PATTERNS
+
+    The result has the same columns as file_operations.create_intensity_dataframe,
+    so statistics, clinical relevance, and plots can be calculated from peptide intensities
+
+    :param input_file: The MaxQuant peptides.txt or evidence.txt results file
+    :param exclude: The reasons to skip rows for, keys of file_operations.ROW_FLAG_COLUMNS (default: DEFAULT_EXCLUDED_ROWS)
+    :param chunk_size: The number of rows read at once
+    :return: A pandas dataframe
+    """
+    if exclude is None:
+        exclude = file_operations.DEFAULT_EXCLUDED_ROWS
+    level = input_level(input_file)
+
+    with file_operations.open_input(input_file) as i_stream:
+        header = pd.read_csv(i_stream, sep="\t", nrows=0).columns.tolist()
+    protein_column = _find_column(header, PROTEIN_COLUMN)
+    if protein_column is None:
+        raise ValueError(f"The column '{PROTEIN_COLUMN}' was not found in {input_file}")
+
+    # Peptides are summed for protein groups if the groups are known, otherwise for their razor protein
+    group_column = _find_column(header, PROTEIN_GROUP_COLUMN)
+    groups = None
+    if group_column is not None and protein_groups_file(input_file) is not None:
+        groups = read_protein_groups(protein_groups_file(input_file))
+        group_names = groups.drop_duplicates("protein_id").set_index("protein_id")
+
+    name_columns = {
+        "gene_name": _find_column(header, "Gene names"),
+        "protein_name": _find_column(header, "Protein names"),
+    }
+    flag_columns = {
+        reason: header[index]
+        for reason, index in file_operations.flag_column_indices(header, exclude).items()
+    }
+
+    if level == "evidence":
+        experiment_column = _find_column(header, "Experiment")
+        intensity_columns = [_find_column(header, "Intensity")]
+        if experiment_column is None or intensity_columns[0] is None:
+            raise ValueError(
+                f"The columns 'Experiment' and 'Intensity' were not found in {input_file}"
+            )
+    else:
+        experiment_column = None
+        prefix = "Intensity "
+        if any(column.startswith("LFQ intensity ") for column in header):
+            prefix = "LFQ intensity "
+        intensity_columns = [column for column in header if column.startswith(prefix)]
+
+    # Only the required columns are parsed, and flags and names are kept as strings
+    use_columns = [
+        protein_column,
+        *([group_column] if groups is not None else []),
+        *[column for column in name_columns.values() if column is not None],
+        *flag_columns.values(),
+        *intensity_columns,
+    ]
+    if experiment_column is not None:
+        use_columns.append(experiment_column)
+    dtypes = {column: str for column in use_columns if column not in intensity_columns}
+    dtypes.update({column: np.float64 for column in intensity_columns})
+
+    accumulator = _ProteinAccumulator()
+    excluded_rows: dict[str, int] = {reason: 0 for reason in exclude}
+    samples: set[str] = set()
+
+    start = time.perf_counter()
+    with file_operations.open_input(input_file) as i_stream:
+        for chunk in pd.read_csv(
+            i_stream,
+            sep="\t",
+            usecols=use_columns,
+            dtype=dtypes,
+            keep_default_na=False,
+            na_values={column: [""] for column in intensity_columns},
+            chunksize=chunk_size,
+        ):
+            chunk = chunk[~_excluded_mask(chunk, flag_columns, excluded_rows)]
+            if groups is not None:
+                proteins = _group_proteins(chunk[group_column], chunk[protein_column], groups)
+            else:
+                proteins = chunk[protein_column].where(chunk[protein_column] != "")
+            chunk = chunk.assign(protein_id=proteins)[proteins.notna()]
+
+            if experiment_column is not None:
+                # Evidence rows are summed for each protein and experiment, and experiments become columns
+                intensities = (
+                    chunk.groupby(["protein_id", experiment_column], sort=False)[
+                        intensity_columns[0]
+                    ]
+                    .sum()
+                    .unstack(fill_value=0)
+                )
+            else:
+                intensities = chunk.groupby("protein_id", sort=False)[intensity_columns].sum()
+                intensities.columns = [column[len(prefix) :] for column in intensities.columns]
+            samples.update(intensities.columns)
+
+            names = pd.DataFrame(index=intensities.index)
+            for name, column in name_columns.items():
+                if groups is not None:
+                    # Groups are named as in proteinGroups.txt
+                    names[name] = group_names[name]
+                elif column is not None:
+                    names[name] = chunk.groupby("protein_id", sort=False)[column].first()
+                else:
+                    names[name] = ""
+
+            accumulator.add(intensities, names)
+
+        decompressed_bytes = i_stream.tell()
+
+    if experiment_column is None:
+        samples = {column[len(prefix) :] for column in intensity_columns}
+
+    data_frame = schema.apply_compact_schema(accumulator.result(_replicate_names(list(samples))))
+    data_frame.attrs["excluded_rows"] = excluded_rows
+    data_frame.attrs["read_statistics"] = file_operations.read_statistics(
+        input_file, decompressed_bytes, time.perf_counter() - start
+    )
+
+    return data_frame
+
+
+if __name__ == "__main__":
+    input_file = pathlib.Path("./data/c18/sdc/peptides.txt")
+    start = time.perf_counter()
+    peptide_df = create_peptide_intensity_dataframe(input_file)
+    print(f"Read {len(peptide_df)} proteins in {time.perf_counter() - start:.2f} seconds")
+    print(peptide_df.head())
@@ -0,0 +1,585 @@
+import argparse
+import concurrent.futures
+import dataclasses
+import functools
+import pathlib
+import time
+
+import pandas as pd
+import plotly.graph_objects as go
+
+import checkpoint
+import excel_writer
+import file_operations
+import filter_values
+import history
+import image_export
+import multivariate
+import normalization
+import peptide_reader
+import plotter
+import quality_control
+import schema
+import statistics
+import table_export
+from enums import PlotType
+
+
+@dataclasses.dataclass
+class PipelineConfig:
+    """
+    The settings of a single analysis
+
+    It provides the same attributes as the arguments retrieved by arg_parse, so it can be passed wherever those are used
+
+    :param input: The MaxQuant proteinGroups.txt, peptides.txt, or evidence.txt results file
+    :param method: The Mass Spectrometry method, "Direct" or "C18"
+    :param experiment: The experiment type, "SDC" or "Urea"
+    :param excel: The excel file to write results to. If None, no excel file is written
+    :param write_plots: Write each plot to an html file next to the input file
+    :param image_formats: Also write each plot as an image in these formats, keys of image_export.IMAGE_FORMATS
+    :param table_formats: Write the filtered dataframe next to the input file in these formats, keys of table_export.TABLE_FORMATS
+    :param history: Append the statistics of every quantified protein to the run history in this directory, see history.py
+    :param verbose: Print progress messages
+    :param normalization: Normalize replicate intensities before statistics, "none", "median", or "quantile"
+    :param imputation: Impute missing intensities before statistics, "none", "min_prob", or "down_shift"
+    :param test: The statistical test used to compare dried and liquid intensities
+    :param regression: The method used to fit the Dried vs Liquid intensity trendline
+    :param weighted_regression: Weight each protein by the inverse of its %CV when fitting the trendline
+    :param log_regression: Fit the trendline to log10 intensities
+    :param bootstrap: The number of bootstrap resamples used for trendline confidence intervals
+    :param seed: The seed used for random resampling and imputation
+    :param max_variation: The maximum dried or liquid %CV of proteins kept by filter_values.filter_variation
+    :param exclude_rows: Skip input rows flagged for these reasons, keys of file_operations.ROW_FLAG_COLUMNS
+    :param variation_rule: "or" keeps proteins with dried OR liquid %CV below max_variation, "and" requires both
+    :param variation_sweep: Count the proteins kept at each of these %CV thresholds, using both rules
+    :param cache: Checkpoint the output of each stage, so unchanged stages are loaded instead of computed
+    :param cache_directory: The directory to store checkpoints in (default: ".checkpoints" next to the input file)
+    :param explain: Print which stages ran and which were loaded from a checkpoint
+    """
+
+    input: pathlib.Path | str
+    method: str
+    experiment: str
+    excel: pathlib.Path | str | None = None
+    write_plots: bool = True
+    image_formats: list[str] = dataclasses.field(default_factory=list)
+    table_formats: list[str] = dataclasses.field(default_factory=list)
+    history: pathlib.Path | str | None = None
+    verbose: bool = True
+    normalization: str = "none"
+    imputation: str = "none"
+    test: str = "welch"
+    regression: str = "ordinary"
+    weighted_regression: bool = False
+    log_regression: bool = False
+    bootstrap: int = 2000
+    seed: int | None = 0
+    exclude_rows: list[str] = dataclasses.field(
+        default_factory=lambda: list(file_operations.DEFAULT_EXCLUDED_ROWS)
+    )
+    max_variation: float = 20
+    variation_rule: str = "or"
+    variation_sweep: list[float] | None = None
+    cache: bool = True
+    cache_directory: pathlib.Path | str | None = None
+    explain: bool = False
+
+    def __post_init__(self):
+        """
+        Validate the settings, and set the method and experiment to the capitalization used for titles and the excel file
+        """
+        methods = file_operations.METHODS
+        experiments = file_operations.EXPERIMENTS
+
+        if str(self.method).lower() not in methods:
+            raise ValueError(
+                f"Unknown method '{self.method}', expected one of {', '.join(methods.values())}"
+            )
+        if str(self.experiment).lower() not in experiments:
+            raise ValueError(
+                f"Unknown experiment '{self.experiment}', expected one of {', '.join(experiments.values())}"
+            )
+        self.method = methods[str(self.method).lower()]
+        self.experiment = experiments[str(self.experiment).lower()]
+
+        if self.input != "":
+            peptide_reader.input_level(self.input)
+        for image_format in self.image_formats:
+            if image_format not in image_export.IMAGE_FORMATS:
+                raise ValueError(
+                    f"Unknown image format '{image_format}', expected one of {', '.join(image_export.IMAGE_FORMATS)}"
+                )
+        for table_format in self.table_formats:
+            if table_format not in table_export.TABLE_FORMATS:
+                raise ValueError(
+                    f"Unknown table format '{table_format}', expected one of {', '.join(table_export.TABLE_FORMATS)}"
+                )
+        if self.excel is not None and ".xlsx" not in str(self.excel):
+            raise ValueError(f"The excel file '{self.excel}' must have an extension '.xlsx'")
+        if self.normalization not in normalization.NORMALIZATION_METHODS:
+            raise ValueError(
+                f"Unknown normalization '{self.normalization}', expected one of {', '.join(normalization.NORMALIZATION_METHODS)}"
+            )
+        if self.imputation not in normalization.IMPUTATION_METHODS:
+            raise ValueError(
+                f"Unknown imputation '{self.imputation}', expected one of {', '.join(normalization.IMPUTATION_METHODS)}"
+            )
+        if self.test not in ["welch", "mann_whitney"]:
+            raise ValueError(f"Unknown test '{self.test}', expected 'welch' or 'mann_whitney'")
+        if self.regression not in ["ordinary", "huber", "theil_sen"]:
+            raise ValueError(
+                f"Unknown regression '{self.regression}', expected 'ordinary', 'huber', or 'theil_sen'"
+            )
+        if self.bootstrap < 1:
+            raise ValueError("The number of bootstrap resamples must be at least 1")
+        for reason in self.exclude_rows:
+            if reason not in file_operations.ROW_FLAG_COLUMNS:
+                raise ValueError(
+                    f"Unknown row exclusion '{reason}', expected one of {', '.join(file_operations.ROW_FLAG_COLUMNS)}"
+                )
+        if self.max_variation <= 0:
+            raise ValueError("The maximum variation must be greater than 0")
+        if self.variation_rule not in ["or", "and"]:
+            raise ValueError(
+                f"Unknown variation rule '{self.variation_rule}', expected 'or' or 'and'"
+            )
+        if self.variation_sweep is not None and min(self.variation_sweep, default=0) <= 0:
+            raise ValueError("Every variation threshold of the sweep must be greater than 0")
+
+    @classmethod
+    def from_namespace(cls, args: argparse.Namespace) -> "PipelineConfig":
+        """
+        This function will create a configuration from the arguments retrieved by arg_parse
+        Arguments that are not settings of the pipeline are ignored
+
+        :param args: The arguments retrieved from the command line
+        :return: A PipelineConfig
+        """
+        field_names = [field.name for field in dataclasses.fields(cls)]
+        return cls(
+            **{name: value for name, value in vars(args).items() if name in field_names}
+        )
+
+
+@dataclasses.dataclass
+class PipelineResult:
+    """
+    The results of a single analysis
+
+    :param data_frame: The filtered and sorted intensity dataframe, including statistics and clinical relevance
+    :param quantified_df: The intensity dataframe of every protein, before filtering by variation
+    :param figures: The plotly figure of each plot type
+    :param output_paths: The files written by the analysis
+    :param excluded_rows: The number of input rows skipped for each reason
+    :param replicate_qc: The quality control metrics of each replicate
+    :param multivariate_result: The principal components and hierarchical clustering of the replicates
+    :param variation_summary: The protein counts at each threshold of the variation sweep, if one was requested
+    :param stage_records: How the output of each stage was obtained, computed or loaded from a checkpoint
+    """
+
+    data_frame: pd.DataFrame
+    quantified_df: pd.DataFrame
+    figures: dict[PlotType, go.Figure]
+    output_paths: list[pathlib.Path] = dataclasses.field(default_factory=list)
+    excluded_rows: dict[str, int] = dataclasses.field(default_factory=dict)
+    replicate_qc: quality_control.ReplicateQC | None = None
+    multivariate_result: multivariate.MultivariateResult | None = None
+    variation_summary: pd.DataFrame | None = None
+    stage_records: list[checkpoint.StageRecord] = dataclasses.field(
+        default_factory=list
+    )
+
+
+def _log(config: PipelineConfig, message: str) -> None:
+    if config.verbose:
+        print(message)
+
+
+def read_intensities(
+    input_file: pathlib.Path | str, exclude: list[str] | None = None
+) -> pd.DataFrame:
+    """
+    This function will create the intensity dataframe of a proteinGroups.txt, peptides.txt, or evidence.txt file
+
+    :param input_file: The MaxQuant results file
+    :param exclude: The reasons to skip rows for, keys of file_operations.ROW_FLAG_COLUMNS (default: DEFAULT_EXCLUDED_ROWS)
+    :return: A pandas dataframe
+    """
+    # Peptide and evidence files are summed for each protein while they are read
+    if peptide_reader.input_level(input_file) == "protein_groups":
+        return file_operations.create_intensity_dataframe(
+            input_file=input_file, exclude=exclude
+        )
+    return peptide_reader.create_peptide_intensity_dataframe(
+        input_file=input_file, exclude=exclude
+    )
+
+
+def _create_intensity_dataframe(
+    input_file: pathlib.Path | str, exclude: list[str], verbose: bool
+) -> pd.DataFrame:
+    if verbose:
+        print("Creating required dataframe")
+    intensities_df = read_intensities(input_file, exclude=exclude)
+
+    if verbose:
+        read_statistics = intensities_df.attrs["read_statistics"]
+        compressed = ""
+        if read_statistics["compression"] is not None:
+            compressed = f", decompressed from {read_statistics['file_bytes'] / 1024**2:.1f} MB {read_statistics['compression']}"
+        print(
+            f"Read {read_statistics['bytes'] / 1024**2:.1f} MB in {read_statistics['seconds']:.2f} seconds "
+            f"({read_statistics['megabytes_per_second']:.1f} MB/s{compressed})"
+        )
+        for reason, count in intensities_df.attrs["excluded_rows"].items():
+            print(f"Excluded {count} {reason.replace('_', ' ')} rows")
+
+    compact_bytes, legacy_bytes = schema.memory_per_row(intensities_df)
+    if verbose:
+        print(
+            f"Memory per protein row: {compact_bytes:.0f} bytes ({legacy_bytes:.0f} bytes without compact data types)"
+        )
+
+    return intensities_df
+
+
+def _compact_stage(function, stage_name: str):
+    """
+    This function will wrap a stage function, checking that it has not converted columns to larger data types
+
+    :param function: The stage function, returning a dataframe
+    :param stage_name: The name of the stage, used in error messages
+    :return: The wrapped function
+    """
+
+    @functools.wraps(function)
+    def checked_function(*args, **kwargs) -> pd.DataFrame:
+        data_frame = function(*args, **kwargs)
+        schema.check_compact_schema(data_frame, stage=stage_name)
+        return data_frame
+
+    return checked_function
+
+
+def _plot_stage(function, plot_type: PlotType, config: PipelineConfig):
+    """
+    This function will create the function of a plot stage, logging the plot when it is created
+    Plots loaded from their checkpoint are not logged, as they are not created
+
+    :param function: The plotter function, called with the input of the stage and the settings as args
+    :param plot_type: The type of plot created by function
+    :param config: The settings of the analysis
+    :return: The stage function
+    """
+
+    @functools.wraps(function)
+    def plot_function(*args, **kwargs) -> go.Figure:
+        _log(config, f"Creating {plot_type.value.replace('_', ' ')} plot")
+        return function(*args, args=config, **kwargs)
+
+    return plot_function
+
+
+def _filter_and_sort(
+    data_frame: pd.DataFrame, max_variation: float, rule: str
+) -> pd.DataFrame:
+    intensities_df = filter_values.filter_variation(
+        data_frame, max_variation=max_variation, rule=rule
+    )
+
+    # Sort values based on protein name for easier viewing
+    intensities_df.sort_values("protein_name", ignore_index=True, inplace=True)
+    intensities_df.reset_index(drop=True, inplace=True)
+
+    return intensities_df
+
+
+def build_stages(config: PipelineConfig) -> list[checkpoint.Stage]:
+    """
+    This function will create the stages of the analysis
+
+    ingest -> normalize -> calculate_statistics -> differential_intensity -> add_clinical_relevance -> filter_variation
+    ingest -> replicate_qc
+    normalize -> multivariate
+    Each plot is a stage using either the clinically annotated frame (every protein) or the filtered frame
+
+    :param config: The settings of the analysis
+    :return: A list of stages
+    """
+    # Plots only depend on the settings that appear in them
+    title_parameters = {"method": config.method, "experiment": config.experiment}
+    regression_parameters = {
+        "regression": config.regression,
+        "weighted_regression": config.weighted_regression,
+        "log_regression": config.log_regression,
+        "bootstrap": config.bootstrap,
+        "seed": config.seed,
+    }
+
+    return [
+        checkpoint.Stage(
+            name="ingest",
+            function=functools.partial(
+                _create_intensity_dataframe,
+                config.input,
+                exclude=config.exclude_rows,
+                verbose=config.verbose,
+            ),
+            key_parameters={
+                "input": file_operations.file_digest(config.input),
+                "exclude": sorted(config.exclude_rows),
+            },
+        ),
+        checkpoint.Stage(
+            name="normalize",
+            function=_compact_stage(normalization.normalize_intensities, "normalize"),
+            inputs=["ingest"],
+            parameters={
+                "normalization": config.normalization,
+                "imputation": config.imputation,
+                # The seed only changes the result when values are imputed
+                "seed": config.seed if config.imputation != "none" else None,
+            },
+        ),
+        checkpoint.Stage(
+            name="calculate_statistics",
+            function=_compact_stage(statistics.calculate_statistics, "calculate_statistics"),
+            inputs=["normalize"],
+        ),
+        checkpoint.Stage(
+            name="differential_intensity",
+            function=_compact_stage(
+                statistics.differential_intensity, "differential_intensity"
+            ),
+            inputs=["calculate_statistics"],
+            parameters={"test": config.test},
+        ),
+        checkpoint.Stage(
+            name="add_clinical_relevance",
+            function=_compact_stage(
+                filter_values.add_clinical_relevance, "add_clinical_relevance"
+            ),
+            inputs=["differential_intensity"],
+            key_parameters={
+                "catalog": file_operations.file_digest(filter_values.CLINICAL_FILE)
+            },
+        ),
+        checkpoint.Stage(
+            name="filter_variation",
+            function=_compact_stage(_filter_and_sort, "filter_variation"),
+            inputs=["add_clinical_relevance"],
+            parameters={"max_variation": config.max_variation, "rule": config.variation_rule},
+        ),
+        checkpoint.Stage(
+            name="variation_sweep",
+            function=filter_values.variation_summary,
+            inputs=["add_clinical_relevance"],
+            parameters={
+                "predicates": [
+                    filter_values.VariationPredicate(max_variation=threshold, rule=rule)
+                    for threshold in sorted(config.variation_sweep or [])
+                    for rule in ["or", "and"]
+                ]
+            },
+        ),
+        checkpoint.Stage(
+            name="replicate_qc",
+            function=quality_control.replicate_qc,
+            inputs=["ingest"],
+        ),
+        checkpoint.Stage(
+            name=f"plot_{PlotType.replicate_qc.value}",
+            function=_plot_stage(plotter.replicate_qc, PlotType.replicate_qc, config),
+            inputs=["replicate_qc"],
+            key_parameters=title_parameters,
+        ),
+        checkpoint.Stage(
+            name="multivariate",
+            function=multivariate.multivariate_analysis,
+            inputs=["normalize"],
+        ),
+        checkpoint.Stage(
+            name=f"plot_{PlotType.pca_scores.value}",
+            function=_plot_stage(plotter.pca_scores, PlotType.pca_scores, config),
+            inputs=["multivariate"],
+            key_parameters=title_parameters,
+        ),
+        checkpoint.Stage(
+            name=f"plot_{PlotType.sample_clustering.value}",
+            function=_plot_stage(plotter.sample_clustering, PlotType.sample_clustering, config),
+            inputs=["multivariate"],
+            key_parameters=title_parameters,
+        ),
+        checkpoint.Stage(
+            name=f"plot_{PlotType.intensity_variation.value}",
+            function=_plot_stage(plotter.liquid_intensity_vs_dried_intensity, PlotType.intensity_variation, config),
+            inputs=["filter_variation"],
+            key_parameters={**title_parameters, **regression_parameters},
+        ),
+        checkpoint.Stage(
+            name=f"plot_{PlotType.abundance_intensity.value}",
+            function=_plot_stage(plotter.abundance_vs_intensity, PlotType.abundance_intensity, config),
+            inputs=["filter_variation"],
+            key_parameters=title_parameters,
+        ),
+        checkpoint.Stage(
+            name=f"plot_{PlotType.abundance_variation.value}",
+            function=_plot_stage(plotter.abundance_vs_variation, PlotType.abundance_variation, config),
+            inputs=["filter_variation"],
+            key_parameters=title_parameters,
+        ),
+        checkpoint.Stage(
+            name=f"plot_{PlotType.full_proteome_intensity.value}",
+            function=_plot_stage(plotter.full_proteome_intensity, PlotType.full_proteome_intensity, config),
+            inputs=["add_clinical_relevance"],
+            key_parameters=title_parameters,
+        ),
+        checkpoint.Stage(
+            name=f"plot_{PlotType.volcano.value}",
+            function=_plot_stage(plotter.volcano, PlotType.volcano, config),
+            inputs=["add_clinical_relevance"],
+            key_parameters=title_parameters,
+        ),
+    ]
+
+
+def analyze(config: PipelineConfig) -> PipelineResult:
+    """
+    This function will create the intensity dataframe, calculate statistics, and create plots
+
+    Each step is a stage that is checkpointed on disk, see build_stages
+    Only stages whose settings or inputs changed since a previous run are computed
+    Writing to the excel file is done separately by write_excel, as the workbook is shared between runs
+    Parquet and Arrow tables, and the run history, are written by the run itself, as each run has its own file
+
+    :param config: The settings of the analysis
+    :return: A PipelineResult
+    """
+    cache_directory = None
+    if config.cache:
+        cache_directory = config.cache_directory or (
+            pathlib.Path(config.input).parent / ".checkpoints"
+        )
+    runner = checkpoint.StageRunner(build_stages(config), cache_directory)
+
+    # Create plots, each plot stage logs the plot it creates
+    figures: dict[PlotType, go.Figure] = {
+        plot_type: runner.output(f"plot_{plot_type.value}")
+        for plot_type in [
+            PlotType.intensity_variation,
+            PlotType.abundance_intensity,
+            PlotType.abundance_variation,
+            PlotType.full_proteome_intensity,
+            PlotType.volcano,
+            PlotType.replicate_qc,
+            PlotType.pca_scores,
+            PlotType.sample_clustering,
+        ]
+    }
+
+    result = PipelineResult(
+        data_frame=runner.output("filter_variation"),
+        quantified_df=runner.output("add_clinical_relevance"),
+        figures=figures,
+        excluded_rows=runner.output("ingest").attrs["excluded_rows"],
+        replicate_qc=runner.output("replicate_qc"),
+        multivariate_result=runner.output("multivariate"),
+        stage_records=runner.records,
+    )
+
+    # Write plots to file
+    # Images are rendered in the background by the exporter of this process, while the analysis continues
+    image_futures: list[concurrent.futures.Future] = []
+    if config.write_plots:
+        _log(config, "Writing plots to file")
+        for plot_type, figure in figures.items():
+            result.output_paths.append(
+                file_operations.write_plot(plot=figure, plot_type=plot_type, args=config)
+            )
+        if config.image_formats:
+            exporter = image_export.shared_exporter()
+            export_start = time.perf_counter()
+            image_futures = [
+                exporter.submit(
+                    figure,
+                    file_operations.plot_path(plot_type, config, extension=image_format),
+                    image_format,
+                )
+                for plot_type, figure in figures.items()
+                for image_format in config.image_formats
+            ]
+
+    # Tables are written whether or not plots are, as they are the machine-readable results of the run
+    for table_format in config.table_formats:
+        _log(config, f"Writing results to {table_format}")
+        result.output_paths.append(
+            table_export.write_results(result.data_frame, config, table_format)
+        )
+    if config.history is not None:
+        _log(config, f"Appending run to the history in {config.history}")
+        result.output_paths.append(history.append_run(result.quantified_df, config.history, config))
+
+    if result.replicate_qc.outliers:
+        _log(config, f"Outlier replicates: {', '.join(result.replicate_qc.outliers)}")
+
+    if config.variation_sweep:
+        result.variation_summary = runner.output("variation_sweep")
+        _log(config, result.variation_summary.to_string(index=False))
+        if config.write_plots:
+            result.output_paths.append(
+                file_operations.write_variation_summary(result.variation_summary, config)
+            )
+
+    if image_futures:
+        result.output_paths.extend(future.result() for future in image_futures)
+        export_seconds = time.perf_counter() - export_start
+        _log(
+            config,
+            f"Exported {len(image_futures)} images in {export_seconds:.2f} seconds "
+            f"({1000 * export_seconds / len(image_futures):.0f} ms per image)",
+        )
+
+    if config.explain:
+        print(runner.explain())
+
+    return result
+
+
+def write_excel(data_frame: pd.DataFrame, config: PipelineConfig) -> pathlib.Path:
+    """
+    This function will write protein information to the excel file
+
+    :param data_frame: The filtered dataframe returned by analyze
+    :param config: The settings of the analysis
+    :return: The path of the excel file
+    """
+    _log(config, "Writing data to excel")
+    excel_writer.ClinicallyRelevant(data_frame=data_frame, args=config)
+    excel_writer.AllProteins(data_frame=data_frame, args=config)
+
+    return pathlib.Path(config.excel)
+
+
+def run(config: PipelineConfig) -> PipelineResult:
+    """
+    This function will run the full analysis of a proteinGroups.txt file
+
+    Modules and the clinically relevant proteins are loaded once per process,
+    so repeated calls do not pay the startup cost of the command line program
+
+    Example:
+        result = pipeline.run(
+            pipeline.PipelineConfig(input="./data/direct/urea/proteinGroups.txt", method="Direct", experiment="Urea")
+        )
+        result.figures[PlotType.volcano].show()
+
+    :param config: The settings of the analysis
+    :return: A PipelineResult
+    """
+    result = analyze(config)
+
+    if config.excel is not None:
+        result.output_paths.append(write_excel(result.data_frame, config))
+
+    return result
@@ -1,10 +1,15 @@
 import argparse
 
+import numpy as np
 import pandas as pd
 import plotly
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from scipy.cluster import hierarchy
 
 import file_operations
+import multivariate
+import quality_control
 import statistics
 
 
@@ -306,7 +311,13 @@ def liquid_intensity_vs_dried_intensity(
     )
 
     # Calculate information required to create a trendline trace
-    trendline = statistics.CalculateLinearRegression(plot_df)
+    trendline = statistics.CalculateLinearRegression(
+        plot_df,
+        method=args.regression,
+        weighted=args.weighted_regression,
+        log_scale=args.log_regression,
+    )
+    bootstrap = trendline.bootstrap(num_resamples=args.bootstrap, seed=args.seed)
 
     # Create the plot
     plot = go.Figure()
@@ -362,7 +373,7 @@ def liquid_intensity_vs_dried_intensity(
     # Exclude Albumin from this calculation because it is a very large outlier
     plot.add_trace(
         go.Scatter(
-            x=plot_df["liquid_average"].loc[plot_df["gene_name"] != "ALB"],
+            x=trendline.x_values,
             y=trendline.linear_fit,
             name="Linear Regression",
             mode="lines",
@@ -371,6 +382,20 @@ def liquid_intensity_vs_dried_intensity(
         )
     )
 
+    # Add confidence band of the trendline as a single closed shape
+    plot.add_trace(
+        go.Scatter(
+            x=list(bootstrap.band_x) + list(bootstrap.band_x[::-1]),
+            y=list(bootstrap.band_upper) + list(bootstrap.band_lower[::-1]),
+            name=f"{bootstrap.confidence:.0%} Confidence Band",
+            mode="lines",
+            fill="toself",
+            fillcolor="rgba(255, 0, 0, 0.15)",
+            line=dict(width=0),
+            hoverinfo="skip",
+        )
+    )
+
     # Set hover template for all traces in figure
     plot.update_traces(
         # Only select graphs that contain points, exclude trendline
@@ -399,7 +424,7 @@ def liquid_intensity_vs_dried_intensity(
     )
 
     # Add buttons to filter through each of the various intensities
-    # Dried, Liquid, Average, Trendline is order of True/False values
+    # Dried, Liquid, Average, Trendline, Confidence Band is order of True/False values
     plot.update_layout(
         updatemenus=[
             dict(
@@ -411,17 +436,17 @@ def liquid_intensity_vs_dried_intensity(
                         dict(
                             label="View Dried Variation",
                             method="update",
-                            args=[{"visible": [True, False, False, True]}],
+                            args=[{"visible": [True, False, False, True, True]}],
                         ),
                         dict(
                             label="View Liquid Variation",
                             method="update",
-                            args=[{"visible": [False, True, False, True]}],
+                            args=[{"visible": [False, True, False, True, True]}],
                         ),
                         dict(
                             label="View Average Variation",
                             method="update",
-                            args=[{"visible": [False, False, True, True]}],
+                            args=[{"visible": [False, False, True, True, True]}],
                         ),
                     ]
                 ),
@@ -435,10 +460,17 @@ def liquid_intensity_vs_dried_intensity(
     plot.update_yaxes(title_text="Dried Average Intensity")
 
     # Add linear regression equation as an annotation
+    if trendline.log_scale:
+        equation = f"log10(Dried Average) = {trendline.slope:.3f} * log10(Liquid Average) + {trendline.y_intercept:.3f}"
+    else:
+        equation = f"(Dried Average) = {trendline.slope:.3f} * (Liquid Average) + {trendline.y_intercept:.3e}"
+
     regression_equation = "<br>".join(
         [
-            f"(Dried Average) = {trendline.slope:.3f} * (Liquid Average) + {trendline.y_intercept:.3e}",
-            f"R² = {trendline.r_squared:.3f}",
+            equation,
+            f"{bootstrap.confidence:.0%} CI: slope [{bootstrap.slope_interval[0]:.3f}, {bootstrap.slope_interval[1]:.3f}], "
+            f"intercept [{bootstrap.y_intercept_interval[0]:.3e}, {bootstrap.y_intercept_interval[1]:.3e}]",
+            f"R² = {trendline.r_squared:.3f} ({bootstrap.confidence:.0%} CI: {bootstrap.r_squared_interval[0]:.3f}, {bootstrap.r_squared_interval[1]:.3f})",
             f"Unique proteins identified = {len(plot_df['gene_name'].values)}",
         ]
     )
@@ -453,3 +485,537 @@ def liquid_intensity_vs_dried_intensity(
     )
 
     return plot
+
+
+def full_proteome_intensity(
+    data_frame: pd.DataFrame,
+    args: argparse.Namespace,
+    max_markers: int = 5000,
+    bins: int = 150,
+) -> plotly.graph_objects.Figure:
+    """
+    This function is responsible for creating a Liquid vs Dried intensity plot for every quantified protein
+
+    Intensities are plotted on a log10 scale, as they span several orders of magnitude
+    If there are at most max_markers quantified proteins, each protein is drawn as an individual marker
+    Otherwise, the points are binned into a 2D histogram before being added to the figure, so the size of the html file depends on the number of bins, not on the number of proteins
+    Clinically relevant proteins are always drawn as individual markers on top of the proteome
+
+    :param data_frame: The dataframe containing intensities, averages, and clinical relevance
+    :param args: Command line arguments retrieved from arg_parse.py
+    :param max_markers: The maximum number of proteins to draw as individual markers
+    :param bins: The number of bins along each axis of the 2D histogram
+    :return: A plotly.graph_objects.Figure
+    """
+    # Proteins with a zero average cannot be placed on a log scale
+    quantified_df: pd.DataFrame = data_frame[
+        (data_frame["liquid_average"] > 0) & (data_frame["dried_average"] > 0)
+    ]
+    log_liquid: np.ndarray = np.log10(quantified_df["liquid_average"].to_numpy(float))
+    log_dried: np.ndarray = np.log10(quantified_df["dried_average"].to_numpy(float))
+
+    plot = go.Figure()
+    if len(quantified_df) <= max_markers:
+        plot.add_trace(
+            go.Scattergl(
+                x=log_liquid,
+                y=log_dried,
+                name="Quantified Proteins",
+                mode="markers",
+                marker=dict(size=4, color="lightslategray", opacity=0.6),
+                customdata=quantified_df[["gene_name"]],
+                hovertemplate="<br>".join(
+                    [
+                        "Gene Name: %{customdata[0]}",
+                        "log10(Dried Average): %{y:.2f}",
+                        "log10(Liquid Average): %{x:.2f}",
+                        "<extra></extra>",
+                    ]
+                ),
+            )
+        )
+    else:
+        counts, x_edges, y_edges = np.histogram2d(log_liquid, log_dried, bins=bins)
+
+        # Empty bins are set to NaN so they are not drawn
+        with np.errstate(divide="ignore"):
+            log_counts = np.log10(counts.T)
+        log_counts[np.isinf(log_counts)] = np.nan
+
+        plot.add_trace(
+            go.Heatmap(
+                x=(x_edges[:-1] + x_edges[1:]) / 2,
+                y=(y_edges[:-1] + y_edges[1:]) / 2,
+                z=np.round(log_counts, 3),
+                name="Quantified Proteins",
+                colorscale="Greys",
+                colorbar=dict(title="log10(Proteins)"),
+                hovertemplate="<br>".join(
+                    [
+                        "log10(Dried Average): %{y:.2f}",
+                        "log10(Liquid Average): %{x:.2f}",
+                        "log10(Proteins): %{z}",
+                        "<extra></extra>",
+                    ]
+                ),
+            )
+        )
+
+    # Overlay clinically relevant proteins
+    relevant_mask: np.ndarray = quantified_df["relevant"].to_numpy(bool)
+    clinical_df: pd.DataFrame = quantified_df[relevant_mask]
+    plot.add_trace(
+        go.Scatter(
+            x=log_liquid[relevant_mask],
+            y=log_dried[relevant_mask],
+            name="Clinically Relevant",
+            mode="markers",
+            marker=dict(size=7, color="red", line=dict(width=1, color="black")),
+            customdata=clinical_df[["gene_name"]],
+            hovertemplate="<br>".join(
+                [
+                    "Gene Name: %{customdata[0]}",
+                    "log10(Dried Average): %{y:.2f}",
+                    "log10(Liquid Average): %{x:.2f}",
+                    "<extra></extra>",
+                ]
+            ),
+        )
+    )
+
+    plot.update_layout(
+        title=f"{file_operations.get_experiment_title(args)} (All Quantified Proteins)"
+    )
+    plot.update_xaxes(title_text="log10(Liquid Average Intensity)")
+    plot.update_yaxes(title_text="log10(Dried Average Intensity)")
+
+    plot.add_annotation(
+        text=f"Quantified proteins = {len(quantified_df)}",
+        showarrow=False,
+        x=1,
+        y=0,
+        xref="paper",
+        yref="paper",
+        align="right",
+    )
+
+    return plot
+
+
+def volcano(
+    data_frame: pd.DataFrame,
+    args: argparse.Namespace,
+    max_q_value: float = 0.05,
+) -> plotly.graph_objects.Figure:
+    """
+    This function is responsible for creating a volcano plot of the dried vs liquid significance tests
+    The log2 dried/liquid fold change will be on the x-axis, and -log10(p-value) will be on the y-axis
+
+    :param data_frame: The dataframe containing the results of statistics.differential_intensity
+    :param args: Command line arguments retrieved from arg_parse.py
+    :param max_q_value: The maximum q-value (Benjamini-Hochberg) at which a protein is considered significant
+    :return: A plotly.graph_objects.Figure
+    """
+    # Only proteins that could be tested are plotted
+    plot_df: pd.DataFrame = data_frame[data_frame["p_value"].notna()]
+    plot_df = plot_df.assign(neg_log_p_value=-np.log10(plot_df["p_value"]))
+
+    significant = plot_df["q_value"] <= max_q_value
+    traces = [
+        ("Not Significant", plot_df[~significant & ~plot_df["relevant"]], "lightslategray"),
+        (f"q ≤ {max_q_value}", plot_df[significant & ~plot_df["relevant"]], "royalblue"),
+        ("Clinically Relevant", plot_df[plot_df["relevant"]], "red"),
+    ]
+
+    plot = go.Figure()
+    for name, trace_df, color in traces:
+        plot.add_trace(
+            go.Scattergl(
+                x=trace_df["log2_fold_change"],
+                y=trace_df["neg_log_p_value"],
+                name=name,
+                mode="markers",
+                marker=dict(size=5, color=color),
+                customdata=trace_df[["gene_name", "q_value"]],
+                hovertemplate="<br>".join(
+                    [
+                        "Gene Name: %{customdata[0]}",
+                        "log2(Dried / Liquid): %{x:.2f}",
+                        "-log10(p-value): %{y:.2f}",
+                        "q-value: %{customdata[1]:.3e}",
+                        "<extra></extra>",
+                    ]
+                ),
+            )
+        )
+
+    plot.update_layout(
+        title=f"{file_operations.get_experiment_title(args)} (Dried vs Liquid Significance)"
+    )
+    plot.update_xaxes(title_text="log2(Dried Average / Liquid Average)")
+    plot.update_yaxes(title_text="-log10(p-value)")
+
+    plot.add_annotation(
+        text=f"Significant proteins (q ≤ {max_q_value}) = {int(significant.sum())}",
+        showarrow=False,
+        x=1,
+        y=0,
+        xref="paper",
+        yref="paper",
+        align="right",
+    )
+
+    return plot
+
+
+def replicate_qc(
+    qc: quality_control.ReplicateQC, args: argparse.Namespace
+) -> plotly.graph_objects.Figure:
+    """
+    This function is responsible for creating the replicate quality control plot
+
+    The left panel is a heatmap of the log10 intensity correlation between each pair of replicates
+    The right panel shows the outlier score of each replicate, with its missing rate as hover information
+    Replicates with an absolute outlier score above quality_control.MAX_OUTLIER_SCORE are colored red
+
+    :param qc: The quality control metrics created by quality_control.replicate_qc
+    :param args: Command line arguments retrieved from arg_parse.py
+    :return: A plotly.graph_objects.Figure
+    """
+    plot = make_subplots(
+        rows=1,
+        cols=2,
+        column_widths=[0.75, 0.25],
+        shared_yaxes=True,
+        horizontal_spacing=0.02,
+        subplot_titles=["log10 Intensity Correlation", "Outlier Score"],
+    )
+
+    plot.add_trace(
+        go.Heatmap(
+            x=qc.replicates,
+            y=qc.replicates,
+            z=qc.correlation,
+            zmin=np.nanmin(qc.correlation, initial=1) if qc.correlation.size else 0,
+            zmax=1,
+            colorscale="Viridis",
+            colorbar=dict(title="Pearson r", x=-0.12),
+            hovertemplate="%{y} vs %{x}<br>r = %{z:.3f}<extra></extra>",
+        ),
+        row=1,
+        col=1,
+    )
+
+    outlier = np.abs(qc.outlier_score) > quality_control.MAX_OUTLIER_SCORE
+    plot.add_trace(
+        go.Bar(
+            x=qc.outlier_score,
+            y=qc.replicates,
+            orientation="h",
+            marker=dict(color=np.where(outlier, "red", "lightslategray")),
+            customdata=np.column_stack(
+                [100 * qc.missing_rate, qc.median_deviation, qc.median_correlation]
+            ),
+            hovertemplate="<br>".join(
+                [
+                    "Replicate: %{y}",
+                    "Outlier Score: %{x:.2f}",
+                    "Missing: %{customdata[0]:.1f}%",
+                    "Median log10 Deviation: %{customdata[1]:.3f}",
+                    "Median Correlation: %{customdata[2]:.3f}",
+                    "<extra></extra>",
+                ]
+            ),
+            showlegend=False,
+        ),
+        row=1,
+        col=2,
+    )
+    for score in [-quality_control.MAX_OUTLIER_SCORE, quality_control.MAX_OUTLIER_SCORE]:
+        plot.add_vline(x=score, line_dash="dash", line_color="red", row=1, col=2)
+
+    plot.update_layout(
+        title=f"{file_operations.get_experiment_title(args)} (Replicate Quality Control)"
+    )
+    plot.update_yaxes(autorange="reversed", row=1, col=1)
+
+    return plot
+
+
+def run_difference(
+    diff_df: pd.DataFrame, args: argparse.Namespace, max_labels: int = 20
+) -> plotly.graph_objects.Figure:
+    """
+    This function is responsible for creating the summary plot of the differences between two runs
+
+    The left panel compares the log2 dried/liquid ratio of shared proteins in both runs,
+    and labels the max_labels proteins with the largest change
+    The right panel shows the number of proteins that appeared, disappeared, or are shared
+
+    :param diff_df: The differences created by diff.compare_results
+    :param args: Command line arguments retrieved from diff.py, containing first_name and second_name
+    :param max_labels: The number of most changed proteins to label
+    :return: A plotly.graph_objects.Figure
+    """
+    plot = make_subplots(
+        rows=1,
+        cols=2,
+        column_widths=[0.7, 0.3],
+        subplot_titles=["log2(Dried / Liquid) of Shared Proteins", "Proteins"],
+    )
+
+    shared_df = diff_df[
+        (diff_df["status"] == "shared") & diff_df["log2_ratio_change"].notna()
+    ]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        first_ratio = np.log2(shared_df["dried_liquid_ratio_first"].to_numpy(dtype=float))
+        second_ratio = np.log2(shared_df["dried_liquid_ratio_second"].to_numpy(dtype=float))
+
+    plot.add_trace(
+        go.Scattergl(
+            x=first_ratio,
+            y=second_ratio,
+            mode="markers",
+            name="Shared",
+            marker=dict(
+                size=5,
+                color=np.abs(shared_df["log2_ratio_change"].to_numpy(dtype=float)),
+                colorscale="Viridis",
+                colorbar=dict(title="|log2 change|", x=0.66),
+            ),
+            customdata=shared_df[["gene_name", "log2_ratio_change"]],
+            hovertemplate="<br>".join(
+                [
+                    "Gene Name: %{customdata[0]}",
+                    f"{args.first_name}: %{{x:.2f}}",
+                    f"{args.second_name}: %{{y:.2f}}",
+                    "log2 Change: %{customdata[1]:.2f}",
+                    "<extra></extra>",
+                ]
+            ),
+            showlegend=False,
+        ),
+        row=1,
+        col=1,
+    )
+
+    # Shared proteins are ranked by the size of their change, so the first rows are the most changed
+    labelled_df = shared_df.head(max_labels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        plot.add_trace(
+            go.Scatter(
+                x=np.log2(labelled_df["dried_liquid_ratio_first"].to_numpy(dtype=float)),
+                y=np.log2(labelled_df["dried_liquid_ratio_second"].to_numpy(dtype=float)),
+                mode="text",
+                text=labelled_df["gene_name"],
+                textposition="top center",
+                hoverinfo="skip",
+                showlegend=False,
+            ),
+            row=1,
+            col=1,
+        )
+
+    if len(first_ratio):
+        finite = np.concatenate([first_ratio, second_ratio])
+        finite = finite[np.isfinite(finite)]
+        if len(finite):
+            plot.add_trace(
+                go.Scatter(
+                    x=[finite.min(), finite.max()],
+                    y=[finite.min(), finite.max()],
+                    mode="lines",
+                    line=dict(color="red", dash="dash"),
+                    hoverinfo="skip",
+                    showlegend=False,
+                ),
+                row=1,
+                col=1,
+            )
+
+    status_counts = diff_df["status"].value_counts()
+    statuses = ["appeared", "disappeared", "shared"]
+    plot.add_trace(
+        go.Bar(
+            x=[status.capitalize() for status in statuses],
+            y=[int(status_counts.get(status, 0)) for status in statuses],
+            marker=dict(color=["royalblue", "lightslategray", "seagreen"]),
+            showlegend=False,
+        ),
+        row=1,
+        col=2,
+    )
+
+    plot.update_layout(title=f"{args.first_name} vs {args.second_name}")
+    plot.update_xaxes(title_text=args.first_name, row=1, col=1)
+    plot.update_yaxes(title_text=args.second_name, row=1, col=1)
+
+    return plot
+
+
+def protein_trends(trend_df: pd.DataFrame, args: argparse.Namespace) -> plotly.graph_objects.Figure:
+    """
+    This function is responsible for creating the plot of a statistic of proteins over time, one line per protein
+
+    :param trend_df: The values read by history.read_trends
+    :param args: Command line arguments retrieved from history.py, containing metric, method, and experiment
+    :return: A plotly.graph_objects.Figure
+    """
+    metric_titles = {
+        "dried_variation": "Dried %CV",
+        "liquid_variation": "Liquid %CV",
+        "average_variation": "Average %CV",
+        "dried_liquid_ratio": "Dried / Liquid Ratio",
+        "average_intensity": "Average Intensity",
+    }
+    metric_title = metric_titles.get(args.metric, args.metric)
+
+    plot = go.Figure()
+    # Protein groups sharing a lead accession are separate lines, as their values are not comparable
+    for canonical_id, protein_df in trend_df.groupby("canonical_id", sort=True):
+        gene_name = protein_df["gene_name"].iloc[-1]
+        plot.add_trace(
+            go.Scattergl(
+                x=protein_df["run_time"],
+                y=protein_df[args.metric].to_numpy(dtype=float),
+                mode="lines+markers",
+                marker=dict(size=4),
+                name=f"{gene_name} ({canonical_id})" if gene_name else canonical_id,
+                customdata=protein_df[["run_id", "method", "experiment"]],
+                hovertemplate="<br>".join(
+                    [
+                        "Run: %{customdata[0]}",
+                        "Method: %{customdata[1]} %{customdata[2]}",
+                        f"{metric_title}: %{{y:.2f}}",
+                        "<extra></extra>",
+                    ]
+                ),
+            )
+        )
+
+    runs = " ".join(filter(None, [args.method, args.experiment]))
+    plot.update_layout(
+        title=f"{metric_title} over Time" + (f" ({runs})" if runs else ""),
+        xaxis_title="Run Time",
+        yaxis_title=metric_title,
+    )
+
+    return plot
+
+
+def pca_scores(
+    result: multivariate.MultivariateResult, args: argparse.Namespace
+) -> plotly.graph_objects.Figure:
+    """
+    This function is responsible for creating the principal component score plot of the samples
+
+    Each sample is a point, colored by its group (condition of replicates, or heading of workbook columns)
+    The axes show the fraction of variance explained by each component
+
+    :param result: The principal components created by multivariate.multivariate_analysis
+    :param args: Command line arguments retrieved from arg_parse.py
+    :return: A plotly.graph_objects.Figure
+    """
+    plot = go.Figure()
+
+    groups = np.array(result.groups)
+    for group in dict.fromkeys(result.groups):
+        in_group = groups == group
+        plot.add_trace(
+            go.Scatter(
+                x=result.scores[in_group, 0],
+                y=result.scores[in_group, 1],
+                mode="markers+text" if len(result.samples) <= 30 else "markers",
+                name=group,
+                text=np.array(result.samples)[in_group],
+                textposition="top center",
+                marker=dict(size=10),
+                hovertemplate="<br>".join(
+                    [
+                        "Sample: %{text}",
+                        "PC1: %{x:.2f}",
+                        "PC2: %{y:.2f}",
+                        "<extra></extra>",
+                    ]
+                ),
+            )
+        )
+
+    plot.update_layout(
+        title=f"{file_operations.get_experiment_title(args)} (Principal Components, {result.proteins} Proteins)",
+        xaxis_title=f"PC1 ({100 * result.explained_variance[0]:.1f}%)",
+        yaxis_title=f"PC2 ({100 * result.explained_variance[1]:.1f}%)",
+        legend_title="Group",
+    )
+
+    return plot
+
+
+def sample_clustering(
+    result: multivariate.MultivariateResult, args: argparse.Namespace
+) -> plotly.graph_objects.Figure:
+    """
+    This function is responsible for creating the clustered heatmap of sample correlations
+
+    The top panel is the dendrogram of the hierarchical clustering
+    The bottom panel is the log2 intensity correlation between each pair of samples, in dendrogram order
+
+    :param result: The hierarchical clustering created by multivariate.multivariate_analysis
+    :param args: Command line arguments retrieved from arg_parse.py
+    :return: A plotly.graph_objects.Figure
+    """
+    plot = make_subplots(
+        rows=2,
+        cols=1,
+        row_heights=[0.2, 0.8],
+        shared_xaxes=True,
+        vertical_spacing=0.01,
+    )
+
+    samples = [result.samples[i] for i in result.order]
+    if len(result.linkage):
+        # The dendrogram places leaf i at x = 10 * i + 5, which is mapped to the position of the heatmap column
+        dendrogram = hierarchy.dendrogram(result.linkage, no_plot=True)
+        for x_coordinates, y_coordinates in zip(dendrogram["icoord"], dendrogram["dcoord"]):
+            plot.add_trace(
+                go.Scatter(
+                    x=(np.array(x_coordinates) - 5) / 10,
+                    y=y_coordinates,
+                    mode="lines",
+                    line=dict(color="slategray", width=1),
+                    hoverinfo="skip",
+                    showlegend=False,
+                ),
+                row=1,
+                col=1,
+            )
+
+    ordered_correlation = result.correlation[np.ix_(result.order, result.order)]
+    plot.add_trace(
+        go.Heatmap(
+            x=np.arange(len(samples)),
+            y=samples,
+            z=ordered_correlation,
+            customdata=np.tile(np.array(samples, dtype=object), (len(samples), 1)),
+            zmin=np.nanmin(ordered_correlation, initial=1) if ordered_correlation.size else 0,
+            zmax=1,
+            colorscale="Viridis",
+            colorbar=dict(title="Pearson r", y=0.4, len=0.8),
+            hovertemplate="%{y} vs %{customdata}<br>r = %{z:.3f}<extra></extra>",
+        ),
+        row=2,
+        col=1,
+    )
+
+    plot.update_layout(
+        title=f"{file_operations.get_experiment_title(args)} (Sample Clustering)",
+        showlegend=False,
+    )
+    plot.update_xaxes(
+        tickvals=np.arange(len(samples)), ticktext=samples, row=2, col=1
+    )
+    plot.update_xaxes(showticklabels=False, row=1, col=1)
+    plot.update_yaxes(title_text="1 - r", row=1, col=1)
+    plot.update_yaxes(autorange="reversed", row=2, col=1)
+
+    return plot
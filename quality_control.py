@@ -0,0 +1,183 @@
+import dataclasses
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import schema
+
+# Replicates with an absolute outlier score above this value are reported as outliers
+MAX_OUTLIER_SCORE = 3.5
+
+# The smallest spread of median deviations (log10) used for outlier scores
+# Without it, replicates that agree almost perfectly would have very large scores for negligible differences
+MIN_DEVIATION_SPREAD = 0.05
+
+
+@dataclasses.dataclass
+class ReplicateQC:
+    """
+    Quality control metrics of each replicate
+
+    :param replicates: The replicate columns, in order
+    :param conditions: The condition of each replicate
+    :param correlation: The Pearson correlation of log10 intensities between each pair of replicates,
+        using proteins quantified in both replicates
+    :param missing_rate: The fraction of proteins not quantified (intensity of 0) in each replicate
+    :param median_deviation: The median log10 difference between each replicate and the median of its condition
+    :param median_correlation: The median correlation of each replicate with the other replicates of its condition
+    :param outlier_score: A robust z-score of median_deviation, calculated using the median absolute deviation
+    """
+
+    replicates: list[str]
+    conditions: list[str]
+    correlation: np.ndarray
+    missing_rate: np.ndarray
+    median_deviation: np.ndarray
+    median_correlation: np.ndarray
+    outlier_score: np.ndarray
+
+    @property
+    def outliers(self) -> list[str]:
+        return [
+            replicate
+            for replicate, score in zip(self.replicates, self.outlier_score)
+            if abs(score) > MAX_OUTLIER_SCORE
+        ]
+
+    def summary(self) -> pd.DataFrame:
+        """
+        This function will create a table of the metrics of each replicate
+
+        :return: A dataframe with one row per replicate
+        """
+        return pd.DataFrame(
+            {
+                "replicate": self.replicates,
+                "condition": self.conditions,
+                "missing_rate": self.missing_rate,
+                "median_deviation": self.median_deviation,
+                "median_correlation": self.median_correlation,
+                "outlier_score": self.outlier_score,
+                "outlier": np.abs(self.outlier_score) > MAX_OUTLIER_SCORE,
+            }
+        )
+
+
+def pairwise_correlation(values: np.ndarray, quantified: np.ndarray) -> np.ndarray:
+    """
+    This function will calculate the Pearson correlation between every pair of columns,
+    only using the rows where both columns are quantified
+
+    Every sum needed for the correlation is calculated for all pairs at once using matrix products with the mask,
+    so the cost grows with the number of rows times the number of column pairs, without a loop over pairs
+
+    :param values: A (rows x columns) array. Values where quantified is False are ignored
+    :param quantified: A boolean array of the same shape
+    :return: A (columns x columns) correlation matrix. Pairs with fewer than 2 shared rows are NaN
+    """
+    mask = quantified.astype(np.float64)
+    masked = np.where(quantified, values, 0).astype(np.float64)
+
+    # For columns i and j, over rows quantified in both:
+    # count[i, j] = n, sums[i, j] = sum(x_i), squares[i, j] = sum(x_i^2), products[i, j] = sum(x_i * x_j)
+    count = mask.T @ mask
+    sums = masked.T @ mask
+    squares = (masked**2).T @ mask
+    products = masked.T @ masked
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = count * products - sums * sums.T
+        variance = count * squares - sums**2
+        correlation = covariance / np.sqrt(variance * variance.T)
+
+    correlation[count < 2] = np.nan
+    return np.clip(correlation, -1, 1)
+
+
+def replicate_qc(data_frame: pd.DataFrame, columns: list[str] | None = None) -> ReplicateQC:
+    """
+    This function will calculate quality control metrics for each replicate, to find failed injections
+
+    Intensities of 0 are treated as not quantified
+    All metrics are calculated from the (proteins x replicates) log10 intensity matrix at once
+
+    :param data_frame: The intensity dataframe
+    :param columns: The replicate columns (default: every column matching schema.REPLICATE_PATTERN)
+    :return: A ReplicateQC
+    """
+    if columns is None:
+        columns = schema.replicate_columns(data_frame)
+    conditions = [schema.REPLICATE_PATTERN.match(column)["condition"] for column in columns]
+
+    intensities = data_frame[columns].to_numpy(dtype=np.float64)
+    quantified = intensities > 0
+    with np.errstate(divide="ignore"):
+        log_intensities = np.where(quantified, np.log10(intensities), np.nan)
+
+    correlation = pairwise_correlation(log_intensities, quantified)
+    missing_rate = 1 - quantified.mean(axis=0) if len(intensities) else np.zeros(len(columns))
+
+    median_deviation = np.full(len(columns), np.nan)
+    median_correlation = np.full(len(columns), np.nan)
+    for condition in dict.fromkeys(conditions):
+        condition_index = np.flatnonzero(np.array(conditions) == condition)
+        condition_values = log_intensities[:, condition_index]
+
+        # Deviation of each replicate from the median of its condition, for each protein
+        # Proteins not quantified in any replicate of the condition have a NaN median, and are ignored
+        with np.errstate(all="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            protein_medians = np.nanmedian(condition_values, axis=1, keepdims=True)
+            deviations = condition_values - protein_medians
+        if len(deviations):
+            median_deviation[condition_index] = np.nanmedian(deviations, axis=0)
+
+        condition_correlation = correlation[np.ix_(condition_index, condition_index)].copy()
+        np.fill_diagonal(condition_correlation, np.nan)
+        if len(condition_index) > 1:
+            median_correlation[condition_index] = np.nanmedian(condition_correlation, axis=1)
+
+    # Robust z-score, so a single failed replicate does not hide itself by inflating the spread
+    center = np.nanmedian(median_deviation)
+    spread = 1.4826 * np.nanmedian(np.abs(median_deviation - center))
+    outlier_score = (median_deviation - center) / max(spread, MIN_DEVIATION_SPREAD)
+
+    return ReplicateQC(
+        replicates=list(columns),
+        conditions=conditions,
+        correlation=correlation,
+        missing_rate=missing_rate,
+        median_deviation=median_deviation,
+        median_correlation=median_correlation,
+        outlier_score=outlier_score,
+    )
+
+
+if __name__ == "__main__":
+    import time
+
+    # Benchmark a large design with many replicates
+    num_proteins = 20_000
+    num_replicates = 200
+    random_generator = np.random.default_rng(0)
+    protein_abundance = random_generator.uniform(5, 10, size=(num_proteins, 1))
+    values = 10 ** (
+        protein_abundance + random_generator.normal(0, 0.1, size=(num_proteins, num_replicates))
+    )
+    values[random_generator.random(values.shape) < 0.2] = 0
+    # Simulate a failed injection
+    values[:, 3] /= 10
+
+    benchmark_df = pd.DataFrame(
+        values,
+        columns=[f"dried_{i}" for i in range(1, num_replicates // 2 + 1)]
+        + [f"liquid_{i}" for i in range(1, num_replicates // 2 + 1)],
+    )
+
+    start = time.perf_counter()
+    qc = replicate_qc(benchmark_df)
+    print(
+        f"Replicate QC of {num_proteins} proteins x {num_replicates} replicates: {time.perf_counter() - start:.2f} seconds"
+    )
+    print(f"Outlier replicates: {qc.outliers}")
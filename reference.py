@@ -0,0 +1,632 @@
+import argparse
+import csv
+import pathlib
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.styles import Alignment
+from openpyxl.styles.borders import Border, Side
+from openpyxl.workbook.workbook import Workbook
+from openpyxl.worksheet.worksheet import Worksheet
+
+import filter_values
+
+# The original, pure-Python implementations of the analysis
+# They are kept as they were (apart from where the clinically relevant proteins are read from),
+# so equivalence.py can check that faster implementations still produce the same results
+# They are not used by the analysis itself
+
+
+def create_intensity_dataframe(input_file: pathlib.Path | str) -> pd.DataFrame:
+    """
+    This function will gather a series of data from the input file
+    These data will be:
+        1) The identified gene name
+        2) The identified protein name
+        3) All dried intensity values
+        4) All liquid intensity values
+
+    It will return these items as a pandas dataframe
+
+    :param input_file: The MaxQuant proteinGroups.txt results file
+    :return: A pandas dataframe
+    """
+    intensities: dict = {
+        "protein_id": [],
+        "gene_name": [],
+        "protein_name": [],
+        "dried_1": [],
+        "dried_2": [],
+        "dried_3": [],
+        "liquid_1": [],
+        "liquid_2": [],
+        "liquid_3": [],
+    }
+
+    with open(input_file, "r") as i_stream:
+        reader = csv.reader(i_stream, delimiter="\t")
+
+        # Remove the header, as it is not required
+        next(reader)
+
+        for line in reader:
+            # Convert values to an integer, as the specifics of a float are not required
+            intensities["protein_id"].append(line[1])
+            intensities["gene_name"].append(line[6])
+            intensities["protein_name"].append(line[5])
+            intensities["dried_1"].append(int(float(line[51])))
+            intensities["dried_2"].append(int(float(line[52])))
+            intensities["dried_3"].append(int(float(line[53])))
+            intensities["liquid_1"].append(int(float(line[54])))
+            intensities["liquid_2"].append(int(float(line[55])))
+            intensities["liquid_3"].append(int(float(line[56])))
+
+    return pd.DataFrame(intensities)
+
+
+def calculate_statistics(intensities: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function will calculate various statistics required for graph creation
+
+    :param intensities: The pandas dataframe containing various intensity values for liquid/dried experiments
+    :return: A pandas dataframe with additional statistics
+    """
+    # Calculate averages
+    intensities["dried_average"] = round(
+        intensities[["dried_1", "dried_2", "dried_3"]].mean(axis=1), 4
+    )
+    intensities["liquid_average"] = round(
+        intensities[["liquid_1", "liquid_2", "liquid_3"]].mean(axis=1), 4
+    )
+    intensities["average_intensity"] = round(
+        intensities[["liquid_average", "dried_average"]].mean(axis=1), 4
+    )
+
+    # Calculate standard deviations
+    intensities["dried_std_dev"] = round(
+        intensities[["dried_1", "dried_2", "dried_3"]].std(axis=1), 4
+    )
+    intensities["liquid_std_dev"] = round(
+        intensities[["liquid_1", "liquid_2", "liquid_3"]].std(axis=1), 4
+    )
+
+    # Calculate coefficient of variation
+    intensities["dried_variation"] = round(
+        (intensities["dried_std_dev"] / intensities["dried_average"]) * 100, 4
+    )
+    intensities["liquid_variation"] = round(
+        intensities["liquid_std_dev"] / intensities["liquid_average"] * 100, 4
+    )
+
+    # Calculate ratio of dried:liquid
+    intensities["dried_liquid_ratio"] = round(
+        intensities["dried_average"] / intensities["liquid_average"], 4
+    )
+
+    # Calculate size of bubble for bubble graph
+    intensities["average_variation"] = round(
+        intensities[["dried_variation", "liquid_variation"]].mean(axis=1), 4
+    )
+
+    # Some averages are 0 (or inf), and dividing by 0 = NaN
+    # Fix this by resetting values to 0 and changing inf values to zero
+    intensities.fillna(0, inplace=True)
+    intensities[intensities["dried_liquid_ratio"] == np.inf] = 0
+    intensities.reset_index(drop=True, inplace=True)
+
+    return intensities
+
+
+def filter_variation(data_frame: pd.DataFrame, max_variation: int = 20) -> pd.DataFrame:
+    """
+    This function will filter variation values
+
+    Any variantion values LESS THAN max_variation will be accepted
+    We must also filter GREATER THAN 0 because NaN values in the dataframe have been set to 0
+
+    We are currently accepting liquid OR dried variation less than max_variation
+
+    :param data_frame: The dataframe to filter from
+    :param max_variation: The maximum variation value to accept
+    :return: A pandas dataframe containing the filtered values
+    """
+    data_frame = data_frame[
+        (
+            (0 < data_frame["dried_variation"])
+            & (data_frame["dried_variation"] <= max_variation)
+        )
+        | (
+            (0 < data_frame["liquid_variation"])
+            & (data_frame["liquid_variation"] <= max_variation)
+        )
+    ]
+    data_frame.reset_index(drop=True, inplace=True)
+
+    return data_frame
+
+
+def substring_id_match(max_quant_ids: str, clinical_ids: str) -> bool:
+    """
+    This function is responsible for matching protein ID sets from one row of results
+
+    :param max_quant_ids: A semi-colon (;) separated list of protein IDs from max quant
+    :param clinical_ids: A semi-colon (;) separated list of clinically relevant protein IDs
+    :return: Boolean
+    """
+    for max_quant_id in max_quant_ids.split(";"):
+        for clinical_id in clinical_ids.split(";"):
+
+            if clinical_id == max_quant_id:
+                return True
+    return False
+
+
+def add_clinical_relevance(data_frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function will add clinically relevant information to the data frame
+
+    It will add a column "relevant" and "expected_concentration"
+    These values will only be modified if the protein is clinically relevant
+
+    :param data_frame: The incoming data frame
+    :return: pd.DataFrame()
+    """
+    # Gather a list of clinically relevant proteins
+    gather_proteins = filter_values._GatherProteinData()
+    clinical_ids = gather_proteins.clinical_ids
+    expected_concentrations = gather_proteins.expected_concentrations
+
+    for i, max_quant_id in enumerate(data_frame["protein_id"]):
+
+        for j, (clinical_id, expected_conc) in enumerate(
+            zip(clinical_ids, expected_concentrations)
+        ):
+
+            if substring_id_match(max_quant_id, clinical_id):
+                data_frame.loc[i, "relevant"] = True
+                data_frame.loc[i, "expected_concentration"] = expected_conc
+                data_frame.loc[i, "clinical_id"] = clinical_id
+
+                break
+
+    # Must replace NaN values otherwise pandas throws a ValueError when trying to filter
+    data_frame["relevant"].replace(
+        to_replace=np.nan,
+        value=False,
+        inplace=True,
+    )
+    data_frame["clinical_id"].replace(to_replace=np.nan, value="", inplace=True)
+
+    return data_frame
+
+
+class _WorkbookEditor:
+    def __init__(self, args: argparse.Namespace):
+        self._args = args
+        self._workbook: Workbook = openpyxl.Workbook()
+
+        self._clinical_sheetname = "Clinically Relevant Proteins"
+        self._all_proteins_sheetname = "All Proteins"
+        self._headings = ["SDC", "SDC-C18", "Urea", "Urea-C18"]
+        self._subheadings = [
+            "Dried\nAverage",
+            "Dried\n%CV",
+            "Liquid\nAverage",
+            "Liquid\n%CV",
+            "D/L\nRatio",
+        ]
+
+        self._first_setup: bool = self._setup_workbook()
+
+        if self.first_setup:
+            self._workbook[self._all_proteins_sheetname].delete_cols(3)
+            self._remerge_cells()
+
+    def _setup_workbook(self) -> bool:
+        if pathlib.Path.exists(pathlib.Path(self._args.excel)):
+            self._workbook = openpyxl.load_workbook(self._args.excel)
+            return False
+        else:
+            self._workbook = openpyxl.Workbook()
+
+            del self._workbook["Sheet"]
+
+            self._workbook.create_sheet(self.clinical_sheetname)
+            self._workbook.create_sheet(self.all_proteins_sheetname)
+
+            self._set_formatting()
+            self._write_headings()
+
+            return True
+
+    def _set_formatting(self) -> None:
+        """
+        This function is responsible for any formatting required of the excel sheet
+        This includes setting alignments, freezing rows for headers, and setting borders
+        :return:
+        """
+        # Freeze top two rows for headers
+        self._workbook[self.clinical_sheetname].freeze_panes = "A3"
+        self._workbook[self._all_proteins_sheetname].freeze_panes = "A3"
+
+        # Set alignment
+        for sheet in self._workbook.worksheets:
+            for row in range(1, 3):
+                for col in range(1, 24):
+                    sheet.cell(row, col).alignment = Alignment(
+                        wrapText=True, horizontal="center", vertical="center"
+                    )
+
+        medium_left_border = Border(left=Side(style="medium"))
+        medium_bottom_border = Border(bottom=Side(style="medium"))
+
+        # Add vertical borders between each experiment (SDC, SDC-C18, etc.)
+        for row in range(3, 500):
+            for column in range(4, 25, 5):
+                self._workbook[self._clinical_sheetname].cell(
+                    row=row, column=column
+                ).border = medium_left_border
+                self._workbook[self._all_proteins_sheetname].cell(
+                    row=row, column=column
+                ).border = medium_left_border
+
+        # Add horizontal border below subheading
+        for column in range(1, 24):
+            self._workbook[self._clinical_sheetname].cell(
+                row=2, column=column
+            ).border = medium_bottom_border
+            self._workbook[self._all_proteins_sheetname].cell(
+                row=2, column=column
+            ).border = medium_bottom_border
+
+        self._workbook[self._clinical_sheetname].column_dimensions["A"].width = 51
+        self._workbook[self._clinical_sheetname].column_dimensions["B"].width = 12
+        self._workbook[self._all_proteins_sheetname].column_dimensions["A"].width = 70
+        self._workbook[self._all_proteins_sheetname].column_dimensions["B"].width = 35
+
+    def _write_headings(self) -> None:
+        """
+        This function will write the heading values for each worksheet
+        :return:
+        """
+        clinical_sheet: Worksheet = self._workbook[self.clinical_sheetname]
+        all_proteins_sheet: Worksheet = self._workbook[self.all_proteins_sheetname]
+
+        clinical_sheet["A1"] = "Clinically Relevant"
+        clinical_sheet["C1"] = "Typical\nPlasma\nConc"
+        clinical_sheet.merge_cells("C1:C2")
+
+        all_proteins_sheet["A1"] = "Identified Proteins"
+
+        for sheet in self._workbook.worksheets:
+            sheet["A2"] = "Protein\nName"
+            sheet["B2"] = "Majority\nProtein\nID"
+            sheet.merge_cells("A1:B1")
+
+            for i, col_num in enumerate(range(4, 24, 5)):
+                sheet.cell(row=1, column=col_num, value=self._headings[i])
+                sheet.merge_cells(
+                    start_row=1, end_row=1, start_column=col_num, end_column=col_num + 4
+                )
+
+                for sub_col_num in range(0, 5):
+                    sheet.cell(
+                        row=2,
+                        column=col_num + sub_col_num,
+                        value=self._subheadings[sub_col_num],
+                    )
+
+    def _remerge_cells(self):
+        """
+        This function will re-merge cells after deleting a column
+
+        :return: None
+        """
+        delete_index = 3
+        for merged_cells in self._workbook[self.all_proteins_sheetname].merged_cells:
+            if delete_index < merged_cells.min_col:
+                merged_cells.shift(col_shift=-1)
+            elif delete_index <= merged_cells.max_col:
+                merged_cells.shrink(right=1)
+
+    def get_column_write_start(self, sheet_title: str) -> int:
+        """
+        This function is responsible for determining which column should be written to when adding data to the excel file
+        :param sheet_title:
+        :return:
+        """
+        if str(self._args.method).lower() == "direct":
+            start_col = 4
+        else:
+            start_col = 9
+
+        if str(self._args.experiment).lower() == "urea":
+            start_col += 10
+
+        # The third column of All Proteins is deleted
+        if not self.first_setup and sheet_title == self.all_proteins_sheetname:
+            start_col -= 1
+
+        return start_col
+
+    @property
+    def workbook(self) -> Workbook:
+        return self._workbook
+
+    @property
+    def clinical_sheetname(self) -> str:
+        return self._clinical_sheetname
+
+    @property
+    def all_proteins_sheetname(self) -> str:
+        return self._all_proteins_sheetname
+
+    @property
+    def first_setup(self) -> bool:
+        return self._first_setup
+
+
+class ClinicallyRelevant:
+    def __init__(self, data_frame: pd.DataFrame, args: argparse.Namespace):
+        self._args = args
+        self._editor = _WorkbookEditor(args)
+        self._workbook: Workbook = self._editor.workbook
+        self._sheet: Worksheet = self._workbook[self._editor.clinical_sheetname]
+        self._dataframe: pd.DataFrame = data_frame[data_frame["relevant"]].reset_index(
+            drop=True
+        )
+
+        if self._editor.first_setup:
+            self._write_clinical_name_id()
+
+        self._write_clinical_data()
+        self._workbook.save(self._args.excel)
+
+    def _write_clinical_name_id(self):
+        """
+        This function will write ONLY the clinicaly name and ID contained in the clinically_relevant.tsv file to columns 1 and 2 in the excel file
+        :return:
+        """
+        clinical_df: pd.DataFrame = pd.read_csv(filter_values.CLINICAL_FILE, sep="\t")
+        clinical_df.sort_values(
+            "protein_name",
+            ignore_index=True,
+            inplace=True,
+            key=lambda col: col.str.lower(),
+        )
+
+        for i, (name, protein_id, concentration) in enumerate(
+            zip(
+                clinical_df["protein_name"],
+                clinical_df["protein_id"],
+                clinical_df["expected_concentration [log10(pg/ml)]"],
+            )
+        ):
+            self._sheet.cell(row=i + 3, column=1, value=name)
+            self._sheet.cell(row=i + 3, column=2, value=protein_id)
+
+            if int(concentration) != -1:
+                self._sheet.cell(row=i + 3, column=3, value=concentration)
+
+    def _write_clinical_data(self):
+        """
+        This function will match clinically relevant MaxQuant data lines located in the Clinically Relevant Proteins file
+        :return: None
+        """
+        start_col = self._editor.get_column_write_start(self._sheet.title)
+
+        for i, (
+            clinical_id,
+            dried_average,
+            dried_variation,
+            liquid_average,
+            liquid_variation,
+            ratio,
+        ) in enumerate(
+            zip(
+                self._dataframe["clinical_id"],
+                self._dataframe["dried_average"],
+                self._dataframe["dried_variation"],
+                self._dataframe["liquid_average"],
+                self._dataframe["liquid_variation"],
+                self._dataframe["dried_liquid_ratio"],
+            )
+        ):
+            for j, row_contents in enumerate(
+                self._sheet.iter_rows(min_row=3, min_col=2, max_col=2)
+            ):
+                row_index = j + 3
+                excel_id: str = row_contents[0].value
+
+                if clinical_id == excel_id:
+                    self._sheet.cell(row=row_index, column=start_col, value=dried_average)
+                    self._sheet.cell(row=row_index, column=start_col + 1, value=dried_variation)
+                    self._sheet.cell(row=row_index, column=start_col + 2, value=liquid_average)
+                    self._sheet.cell(row=row_index, column=start_col + 3, value=liquid_variation)
+                    self._sheet.cell(row=row_index, column=start_col + 4, value=ratio)
+
+                    break
+
+
+class AllProteins:
+    def __init__(self, data_frame: pd.DataFrame, args: argparse.Namespace):
+        self._args = args
+        self._editor = _WorkbookEditor(args)
+        self._workbook: Workbook = self._editor.workbook
+
+        self._sheet: Worksheet = self._workbook[self._editor.all_proteins_sheetname]
+
+        self._dataframe: pd.DataFrame = data_frame[
+            data_frame["relevant"] == False
+        ].reset_index(drop=True)
+
+        self._ingested_df: pd.DataFrame = self._ingest_protein_data()
+        self._incoming_frame: pd.DataFrame = self._format_incoming_frame()
+        self._merged_frame: pd.DataFrame = pd.concat(
+            [self._ingested_df, self._incoming_frame]
+        )
+
+        # Sort using protein name, then index
+        self._sorted_df: pd.DataFrame = self._merged_frame.sort_values(
+            ["protein_name", "index"]
+        ).reset_index(drop=True)
+
+        self._write_data()
+        self._workbook.save(self._args.excel)
+
+    def _ingest_protein_data(self) -> pd.DataFrame:
+        """
+        This function will be responsible for returning a dataframe containing the information from the current excel file
+        :return:
+        """
+        ingested_data: dict[str, list] = {
+            "protein_name": [],
+            "protein_id": [],
+            "method": [],
+            "experiment": [],
+            "value": [],
+            "index": [],
+        }
+
+        for i, row in enumerate(
+            self._sheet.iter_rows(min_row=3, min_col=1, max_col=22)
+        ):
+            # Indexes are used to ensure dried/liquid averages, etc. will map to the correct location
+            ingested_data["index"].extend([0, 1, 2, 3, 4] * 4)
+
+            for j, cell in enumerate(row):
+                if j >= 2:
+                    ingested_data["protein_name"].append(row[0].value)
+                    ingested_data["protein_id"].append(row[1].value)
+                    try:
+                        ingested_data["value"].append(float(cell.value))
+                    except TypeError:
+                        ingested_data["value"].append(0.0)
+
+                # Direct SDC values
+                if 2 <= j <= 6:
+                    ingested_data["method"].append("Direct")
+                    ingested_data["experiment"].append("SDC")
+
+                # C18 SDC values
+                elif 7 <= j <= 11:
+                    ingested_data["method"].append("C18")
+                    ingested_data["experiment"].append("SDC")
+
+                # Direct Urea values
+                elif 12 <= j <= 16:
+                    ingested_data["method"].append("Direct")
+                    ingested_data["experiment"].append("Urea")
+
+                # C18 Urea values
+                elif 17 <= j <= 21:
+                    ingested_data["method"].append("C18")
+                    ingested_data["experiment"].append("Urea")
+
+        return pd.DataFrame.from_dict(ingested_data)
+
+    def _format_incoming_frame(self) -> pd.DataFrame:
+        """
+        This function is responsible for creating a long dataframe from the incoming data frame
+        :return:
+        """
+        required_data: pd.DataFrame = self._dataframe[
+            (self._dataframe["relevant"] == False)
+            & (self._dataframe["protein_name"] != "")
+        ]
+        data_matches: dict[str, list] = {
+            "protein_name": [],
+            "protein_id": [],
+            "method": [],
+            "experiment": [],
+            "value": [],
+            "index": [],
+        }
+
+        for (
+            name,
+            protein_id,
+            dried_average,
+            dried_variation,
+            liquid_average,
+            liquid_variation,
+            ratio,
+        ) in zip(
+            required_data["protein_name"],
+            required_data["protein_id"],
+            required_data["dried_average"],
+            required_data["dried_variation"],
+            required_data["liquid_average"],
+            required_data["liquid_variation"],
+            required_data["dried_liquid_ratio"],
+        ):
+            data_matches["protein_name"].extend([name] * 5)
+            data_matches["protein_id"].extend([protein_id] * 5)
+            data_matches["method"].extend([self._args.method] * 5)
+            data_matches["experiment"].extend([self._args.experiment] * 5)
+            data_matches["value"].extend(
+                [
+                    int(dried_average),
+                    float(dried_variation),
+                    int(liquid_average),
+                    float(liquid_variation),
+                    float(ratio),
+                ]
+            )
+            data_matches["index"].extend([0, 1, 2, 3, 4])
+
+        return pd.DataFrame.from_dict(data_matches)
+
+    def _write_data(self):
+        """
+        This function is responsible for taking the merged data frame and writing data to the appropriate location
+        :return:
+        """
+        row_index = 3
+        for i, (
+            protein_name,
+            protein_id,
+            method,
+            experiment,
+            value,
+            index,
+        ) in enumerate(
+            zip(
+                self._sorted_df["protein_name"],
+                self._sorted_df["protein_id"],
+                self._sorted_df["method"],
+                self._sorted_df["experiment"],
+                self._sorted_df["value"],
+                self._sorted_df["index"],
+            )
+        ):
+            # Skip unknown protein names
+            if protein_name is None:
+                continue
+
+            if method.lower() == "direct":
+                column_index = 3
+            else:
+                column_index = 8
+
+            if experiment.lower() == "urea":
+                column_index += 10
+
+            column_index += index
+
+            # Don't want to write 0.00 values, write empty string instead
+            if value == 0:
+                value = ""
+
+            self._sheet.cell(row=row_index, column=1, value=protein_name)
+            self._sheet.cell(row=row_index, column=2, value=protein_id)
+            self._sheet.cell(row=row_index, column=column_index, value=value)
+
+            # Write to next row if current protein name differs from next protein name
+            try:
+                next_name = self._sorted_df.loc[i + 1, "protein_name"]
+                if protein_name != next_name:
+                    row_index += 1
+            except KeyError:
+                pass
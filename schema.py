@@ -0,0 +1,184 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# The conditions compared by the analysis
+CONDITIONS: list[str] = ["dried", "liquid"]
+
+# Replicate intensity columns are named "<condition>_<replicate number>", such as "dried_1"
+# Any number of replicates is allowed, they are read as one (proteins x replicates) block per condition
+REPLICATE_PATTERN = re.compile(r"^(?P<condition>[a-z]+)_(?P<replicate>\d+)$")
+
+# Columns holding protein identifiers and names
+STRING_COLUMNS: list[str] = [
+    "protein_id",
+    "canonical_id",
+    "gene_name",
+    "protein_name",
+    "clinical_id",
+]
+
+# Intensities, and statistics calculated from them, are stored as float32
+INTENSITY_DTYPE = np.float32
+
+# Columns that require the full range of float64, as p-values can be smaller than the float32 minimum
+FLOAT64_COLUMNS: list[str] = ["p_value", "q_value"]
+
+
+def string_dtype(values: pd.Series) -> pd.api.extensions.ExtensionDtype | str:
+    """
+    This function will determine the data type used for a string column
+
+    Arrow-backed strings are used if pyarrow is installed, as they store each column in a single buffer
+    Otherwise, categorical strings are used if values repeat often enough for categories to save memory
+
+    :param values: The string column
+    :return: A pandas data type
+    """
+    try:
+        import pyarrow  # noqa: F401
+
+        return pd.StringDtype("pyarrow")
+    except ImportError:
+        pass
+
+    if isinstance(values.dtype, pd.CategoricalDtype) or values.nunique() < len(values) / 2:
+        return "category"
+    return pd.StringDtype("python")
+
+
+def apply_compact_schema(data_frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function will convert the columns of the data frame to their compact data types
+    String columns are converted to string_dtype(), and numeric columns to INTENSITY_DTYPE
+    Only columns that do not have their compact data type yet are converted; if there are none, the data frame is
+    returned as it is
+
+    :param data_frame: The data frame to convert
+    :return: The converted data frame
+    """
+    dtypes: dict = {}
+    for column, dtype in data_frame.dtypes.items():
+        if column in STRING_COLUMNS:
+            dtypes[column] = string_dtype(data_frame[column])
+        elif column not in FLOAT64_COLUMNS and pd.api.types.is_numeric_dtype(dtype):
+            if not pd.api.types.is_bool_dtype(dtype):
+                dtypes[column] = INTENSITY_DTYPE
+    dtypes = {column: dtype for column, dtype in dtypes.items() if data_frame[column].dtype != dtype}
+
+    if not dtypes:
+        return data_frame
+    return data_frame.astype(dtypes)
+
+
+def check_compact_schema(data_frame: pd.DataFrame, stage: str) -> None:
+    """
+    This function will make sure a pipeline stage has not silently converted columns to larger data types
+
+    :param data_frame: The data frame returned by the stage
+    :param stage: The name of the stage, used in the error message
+    :return: None
+    """
+    upcast_columns: list[str] = []
+    for column, dtype in data_frame.dtypes.items():
+        if column in STRING_COLUMNS and dtype == object:
+            upcast_columns.append(f"{column} ({dtype})")
+        elif column not in FLOAT64_COLUMNS and dtype == np.float64:
+            upcast_columns.append(f"{column} ({dtype})")
+        elif dtype == np.int64:
+            upcast_columns.append(f"{column} ({dtype})")
+
+    if upcast_columns:
+        raise TypeError(
+            f"The '{stage}' stage returned columns with non-compact data types: {', '.join(upcast_columns)}"
+        )
+
+
+def memory_per_row(data_frame: pd.DataFrame) -> tuple[float, float]:
+    """
+    This function will calculate the memory used by each protein row of the data frame
+
+    The memory of the same frame stored with Python object strings and int64/float64 values is calculated for comparison
+
+    :param data_frame: The data frame to measure
+    :return: The bytes per row of the compact frame, and of the uncompacted frame
+    """
+    num_rows = max(len(data_frame), 1)
+    compact_bytes = data_frame.memory_usage(deep=True, index=False).sum()
+
+    legacy_dtypes: dict = {}
+    for column, dtype in data_frame.dtypes.items():
+        if column in STRING_COLUMNS:
+            legacy_dtypes[column] = object
+        elif dtype == INTENSITY_DTYPE:
+            legacy_dtypes[column] = np.float64
+    legacy_bytes = (
+        data_frame.astype(legacy_dtypes).memory_usage(deep=True, index=False).sum()
+    )
+
+    return compact_bytes / num_rows, legacy_bytes / num_rows
+
+
+def replicate_columns(data_frame: pd.DataFrame, condition: str | None = None) -> list[str]:
+    """
+    This function will find the replicate intensity columns of the data frame, ordered by replicate number
+
+    :param data_frame: The intensity dataframe
+    :param condition: Only return the replicates of this condition (default: every condition)
+    :return: The names of the columns matching REPLICATE_PATTERN
+    """
+    columns: list[tuple[str, int, str]] = []
+    for column in data_frame.columns:
+        match = REPLICATE_PATTERN.match(str(column))
+        if match and (condition is None or match["condition"] == condition):
+            columns.append((match["condition"], int(match["replicate"]), column))
+
+    # Conditions are kept in the order they first appear, replicates are ordered by number
+    condition_order = {name: i for i, name in enumerate(dict.fromkeys(name for name, _, _ in columns))}
+    columns.sort(key=lambda column: (condition_order[column[0]], column[1]))
+
+    return [column for _, _, column in columns]
+
+
+def replicate_block(
+    data_frame: pd.DataFrame, condition: str, dtype: type = np.float64
+) -> np.ndarray:
+    """
+    This function will return the replicate intensities of a condition as a single 2-D array
+
+    Statistics are calculated on these blocks, so they work for any number of replicates
+
+    :param data_frame: The intensity dataframe
+    :param condition: The condition, such as "dried"
+    :param dtype: The data type of the array
+    :return: A (proteins x replicates) array
+    """
+    columns = replicate_columns(data_frame, condition)
+    if not columns:
+        raise ValueError(f"No replicate columns were found for the condition '{condition}'")
+
+    return data_frame[columns].to_numpy(dtype=dtype)
+
+
+def replicate_frame(
+    blocks: dict[str, np.ndarray], index: pd.Index | None = None
+) -> pd.DataFrame:
+    """
+    This function will create the replicate intensity columns from one block per condition
+
+    :param blocks: A dictionary of condition: (proteins x replicates) array
+    :param index: The index of the dataframe
+    :return: A dataframe with the columns "<condition>_1" to "<condition>_N" for each condition
+    """
+    return pd.concat(
+        [
+            pd.DataFrame(
+                block,
+                columns=[f"{condition}_{i}" for i in range(1, block.shape[1] + 1)],
+                index=index,
+            )
+            for condition, block in blocks.items()
+        ],
+        axis=1,
+    )
@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import pathlib
+import signal
+import tempfile
+import urllib.parse
+
+import pandas as pd
+
+import filter_values
+import pipeline
+
+# Uploads larger than this are rejected
+MAX_UPLOAD_BYTES = 2 * 1024**3
+
+# PipelineConfig settings that may be given as query parameters, and their types
+_QUERY_SETTINGS = {
+    "method": str,
+    "experiment": str,
+    "normalization": str,
+    "imputation": str,
+    "test": str,
+    "regression": str,
+    "weighted_regression": lambda value: value.lower() in ["1", "true", "yes"],
+    "log_regression": lambda value: value.lower() in ["1", "true", "yes"],
+    "bootstrap": int,
+    "seed": int,
+    "max_variation": float,
+    "variation_rule": str,
+}
+
+_STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    411: "Length Required",
+    413: "Payload Too Large",
+}
+
+
+def _warm_worker() -> None:
+    """
+    This function is run once in every worker process when it starts
+    It loads the clinically relevant proteins, so they are not read again for each request
+
+    :return: None
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    filter_values.load_clinical_proteins()
+
+
+def _analyze_upload(
+    contents: bytes, settings: dict
+) -> tuple[pd.DataFrame, dict, dict[str, str]]:
+    """
+    This function will analyze an uploaded proteinGroups.txt file in a worker process
+
+    The upload is written to a temporary directory, as the reader requires a file
+
+    :param contents: The contents of the uploaded file
+    :param settings: The PipelineConfig settings of this request, without the input file
+    :return: The filtered dataframe, a summary of the results, and the plotly json of each figure
+    """
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        input_file = pathlib.Path(temporary_directory) / "proteinGroups.txt"
+        input_file.write_bytes(contents)
+
+        config = pipeline.PipelineConfig(
+            input=input_file, write_plots=False, verbose=False, cache=False, **settings
+        )
+        result = pipeline.analyze(config)
+
+    summary = {
+        "method": config.method,
+        "experiment": config.experiment,
+        "excluded_rows": result.excluded_rows,
+        "quantified_proteins": len(result.quantified_df),
+        "filtered_proteins": len(result.data_frame),
+        "clinically_relevant_proteins": int(result.data_frame["relevant"].sum()),
+        "outlier_replicates": result.replicate_qc.outliers,
+    }
+    figures = {
+        plot_type.value: figure.to_json() for plot_type, figure in result.figures.items()
+    }
+
+    return result.data_frame, summary, figures
+
+
+class AnalysisService:
+    def __init__(self, args: argparse.Namespace):
+        """
+        A local HTTP service that analyzes uploaded proteinGroups.txt files
+
+        Analyses run in a pool of worker processes that keep modules and the clinically relevant proteins loaded
+        Results are streamed back as newline-delimited json while they are serialized
+        If an excel file is given, results are written to it by a single background task, so requests never wait on it
+
+        Endpoints:
+        - GET /health
+        - POST /analyze?method=direct&experiment=urea, with the contents of proteinGroups.txt as the request body
+          Any other PipelineConfig setting, such as test or regression, may also be given as a query parameter
+
+        :param args: The arguments retrieved from the command line
+        """
+        self._args = args
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=args.workers, initializer=_warm_worker
+        )
+        self._excel_queue: asyncio.Queue | None = None
+
+    async def serve(self) -> None:
+        """
+        This function will start the service and handle requests until an interrupt or terminate signal is received
+
+        :return: None
+        """
+        self._excel_queue = asyncio.Queue()
+        excel_writer_task = asyncio.create_task(self._write_excel_results())
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGINT, stop.set)
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+
+        server = await asyncio.start_server(
+            self._handle_connection, host=self._args.host, port=self._args.port
+        )
+        print(f"Serving on http://{self._args.host}:{self._args.port}")
+        async with server:
+            await stop.wait()
+
+        # Finish writing queued results before stopping
+        print("Stopping, waiting for queued excel results to be written")
+        await self._excel_queue.join()
+        excel_writer_task.cancel()
+        self._executor.shutdown(wait=True)
+
+    async def _write_excel_results(self) -> None:
+        """
+        This function will write queued results to the excel file, one at a time
+        Writing is done in a thread, so the event loop keeps handling requests
+
+        :return: None
+        """
+        while True:
+            data_frame, config = await self._excel_queue.get()
+            try:
+                await asyncio.to_thread(pipeline.write_excel, data_frame, config)
+            except Exception as error:
+                print(f"Failed to write results to {config.excel}: {error}")
+            finally:
+                self._excel_queue.task_done()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        This function will read a single HTTP request and send its response
+
+        :param reader: The connection reader
+        :param writer: The connection writer
+        :return: None
+        """
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers: dict[str, str] = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            if len(request_line) != 3:
+                await self._send_json(writer, 400, {"error": "Malformed request"})
+                return
+
+            request_method, target, _ = request_line
+            url = urllib.parse.urlsplit(target)
+
+            if request_method == "GET" and url.path == "/health":
+                await self._send_json(writer, 200, {"status": "ok"})
+            elif request_method == "POST" and url.path == "/analyze":
+                await self._analyze(reader, writer, headers, url.query)
+            else:
+                await self._send_json(writer, 404, {"error": f"Unknown endpoint {target}"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _analyze(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        headers: dict[str, str],
+        query: str,
+    ) -> None:
+        """
+        This function will handle a POST /analyze request
+
+        :param reader: The connection reader
+        :param writer: The connection writer
+        :param headers: The request headers
+        :param query: The query string of the request
+        :return: None
+        """
+        if "content-length" not in headers:
+            await self._send_json(writer, 411, {"error": "Content-Length is required"})
+            return
+        try:
+            content_length = int(headers["content-length"])
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            await self._send_json(
+                writer, 400, {"error": "Content-Length must be a non-negative integer"}
+            )
+            return
+        if content_length > MAX_UPLOAD_BYTES:
+            await self._send_json(writer, 413, {"error": "The upload is too large"})
+            return
+
+        # Settings are validated before the upload is read, so invalid requests fail quickly
+        try:
+            settings = {}
+            for name, value in urllib.parse.parse_qsl(query):
+                if name not in _QUERY_SETTINGS:
+                    raise ValueError(f"Unknown setting '{name}'")
+                settings[name] = _QUERY_SETTINGS[name](value)
+            config = pipeline.PipelineConfig(input="", **settings)
+        except (TypeError, ValueError) as error:
+            await self._send_json(writer, 400, {"error": str(error)})
+            return
+
+        contents = await reader.readexactly(content_length)
+
+        self._start_stream(writer)
+        await self._send_event(writer, json.dumps({"event": "accepted"}))
+
+        loop = asyncio.get_running_loop()
+        try:
+            data_frame, summary, figures = await loop.run_in_executor(
+                self._executor, _analyze_upload, contents, settings
+            )
+        except Exception as error:
+            await self._send_event(writer, json.dumps({"event": "error", "error": str(error)}))
+            await self._end_stream(writer)
+            return
+
+        await self._send_event(writer, json.dumps({"event": "summary", **summary}))
+
+        if self._args.excel is not None:
+            config.excel = self._args.excel
+            await self._excel_queue.put((data_frame, config))
+            await self._send_event(
+                writer, json.dumps({"event": "excel_queued", "excel": str(config.excel)})
+            )
+
+        # Figures are already serialized by plotly, so they are inserted into the line instead of being parsed again
+        for plot_type, figure_json in figures.items():
+            await self._send_event(
+                writer,
+                f'{{"event": "figure", "plot_type": {json.dumps(plot_type)}, "figure": {figure_json}}}',
+            )
+
+        await self._send_event(writer, json.dumps({"event": "done"}))
+        await self._end_stream(writer)
+
+    @staticmethod
+    async def _send_json(writer: asyncio.StreamWriter, status: int, body: dict) -> None:
+        """
+        This function will send a complete json response
+
+        :param writer: The connection writer
+        :param status: The HTTP status code
+        :param body: The json body
+        :return: None
+        """
+        contents = json.dumps(body).encode()
+        writer.write(
+            (
+                f"HTTP/1.1 {status} {_STATUS_TEXT[status]}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(contents)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode()
+            + contents
+        )
+        await writer.drain()
+
+    @staticmethod
+    def _start_stream(writer: asyncio.StreamWriter) -> None:
+        writer.write(
+            (
+                "HTTP/1.1 200 OK\r\n"
+                "Content-Type: application/x-ndjson\r\n"
+                "Transfer-Encoding: chunked\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode()
+        )
+
+    @staticmethod
+    async def _send_event(writer: asyncio.StreamWriter, line: str) -> None:
+        """
+        This function will send one json line as an HTTP chunk
+
+        :param writer: The connection writer
+        :param line: The serialized json event
+        :return: None
+        """
+        contents = (line + "\n").encode()
+        writer.write(f"{len(contents):X}\r\n".encode() + contents + b"\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _end_stream(writer: asyncio.StreamWriter) -> None:
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    This function will parse the service command line arguments
+
+    :return: The parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Run a local HTTP service that analyzes uploaded proteinGroups.txt files"
+    )
+    parser.add_argument(
+        "--host", default="127.0.0.1", help="The address to listen on (default: 127.0.0.1)"
+    )
+    parser.add_argument(
+        "--port", type=int, default=8080, help="The port to listen on (default: 8080)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=2, help="The number of worker processes"
+    )
+    parser.add_argument(
+        "-x",
+        "--excel",
+        metavar="file.xlsx",
+        default=None,
+        help="An excel file to write every result to (optional)",
+    )
+
+    args = parser.parse_args()
+    if args.excel is not None and ".xlsx" not in args.excel:
+        print("Make sure the --excel flag points to an excel file with an extension '.xlsx'")
+        exit(1)
+
+    return args
+
+
+if __name__ == "__main__":
+    service = AnalysisService(parse_arguments())
+    asyncio.run(service.serve())
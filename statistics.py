@@ -1,15 +1,41 @@
+import functools
+import time
+import warnings
+
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression
+
+import schema
+
+# The maximum number of pairs of points a Theil-Sen slope is calculated from, for the trendline and each bootstrap resample
+# Up to 316 points every pair is used, beyond that the same random sample of pairs is used by both, see _theil_sen_pairs
+THEIL_SEN_MAX_PAIRS: int = 50_000
 
 
 class CalculateLinearRegression:
-    def __init__(self, data_frame: pd.DataFrame, remove_albumin: bool = True):
+    def __init__(
+        self,
+        data_frame: pd.DataFrame,
+        remove_albumin: bool = True,
+        method: str = "ordinary",
+        weighted: bool = False,
+        log_scale: bool = False,
+    ):
         """
-        Calculate the trendline required for linear regression
+        Calculate the trendline required for linear regression, with Dried Average as a function of Liquid Average
+
+        The line is fit in closed form using NumPy
+        Available methods are:
+        - ordinary: Least squares
+        - huber: Least squares with Huber weights, calculated by iteratively reweighted least squares
+        - theil_sen: The median of the slopes between all pairs of points
 
         From: https://stackoverflow.com/questions/65135524/adding-trendline-on-plotly-scatterplot
-        :param data_frame:
+        :param data_frame: The dataframe containing dried and liquid averages and variations
+        :param remove_albumin: Remove albumin (ALB) from the calculation
+        :param method: The fitting method, one of "ordinary", "huber", or "theil_sen"
+        :param weighted: Weight each protein by the inverse of its average %CV. Not used by theil_sen
+        :param log_scale: Fit log10(Dried Average) against log10(Liquid Average). Proteins with a zero average are excluded
         :return:
         """
 
@@ -17,55 +43,536 @@ class CalculateLinearRegression:
         if remove_albumin:
             data_frame = data_frame[data_frame["gene_name"] != "ALB"]
 
-        x_values = np.array(data_frame["liquid_average"]).reshape((-1, 1))
-        y_values = np.array(data_frame["dried_average"])
+        if log_scale:
+            data_frame = data_frame[
+                (data_frame["liquid_average"] > 0) & (data_frame["dried_average"] > 0)
+            ]
+
+        # Sort by liquid average so the fit can be drawn as a line
+        data_frame = data_frame.sort_values("liquid_average")
+        self.x_values: np.ndarray = data_frame["liquid_average"].to_numpy(float)
+        self.y_values: np.ndarray = data_frame["dried_average"].to_numpy(float)
+
+        self.__log_scale = log_scale
+        x_values = np.log10(self.x_values) if log_scale else self.x_values
+        y_values = np.log10(self.y_values) if log_scale else self.y_values
 
-        self.__linear_regression = LinearRegression()
-        self.__linear_regression.fit(X=x_values, y=y_values)
+        weights = np.ones(len(x_values))
+        if weighted:
+            weights = self._inverse_variation_weights(data_frame)
+
+        # Keep the values in the space the line is fit in, they are required for bootstrapping
+        self.__fit_x_values = x_values
+        self.__fit_y_values = y_values
+        self.__weights = weights
+        self.__method = method
+
+        if method == "ordinary":
+            self.__slope, self.__y_intercept = _weighted_least_squares(
+                x_values, y_values, weights
+            )
+        elif method == "huber":
+            self.__slope, self.__y_intercept = _huber_regression(
+                x_values, y_values, weights
+            )
+        elif method == "theil_sen":
+            self.__slope, self.__y_intercept = _theil_sen_regression(x_values, y_values)
+        else:
+            raise ValueError(
+                f"Unknown regression method '{method}', expected 'ordinary', 'huber', or 'theil_sen'"
+            )
+
+        fitted_values = self.__slope * x_values + self.__y_intercept
+        self.linear_fit: np.ndarray = 10**fitted_values if log_scale else fitted_values
+
+        # R² is calculated in the space the line was fit in
+        mean_y = np.sum(weights * y_values) / np.sum(weights)
+        residual_sum = np.sum(weights * (y_values - fitted_values) ** 2)
+        total_sum = np.sum(weights * (y_values - mean_y) ** 2)
+        self.__calculate_r_squared = float(1 - residual_sum / total_sum)
+
+    @staticmethod
+    def _inverse_variation_weights(data_frame: pd.DataFrame) -> np.ndarray:
+        """
+        This function will calculate the weight of each protein as the inverse of its average %CV
 
-        self.linear_fit: np.ndarray = self.__linear_regression.predict(x_values)
+        A %CV of 0 means the variation could not be calculated, these proteins are given the median weight
 
-        self.__calculate_r_squared = float(
-            self.__linear_regression.score(X=x_values, y=y_values)
+        :param data_frame: The dataframe containing an "average_variation" column
+        :return: A 1D array of weights
+        """
+        variation = data_frame["average_variation"].to_numpy(float)
+        known = variation > 0
+
+        weights = np.ones(len(variation))
+        if known.any():
+            weights[known] = 1 / variation[known]
+            weights[~known] = np.median(weights[known])
+
+        return weights
+
+    def bootstrap(
+        self,
+        num_resamples: int = 2000,
+        confidence: float = 0.95,
+        seed: int | None = 0,
+    ) -> "BootstrapRegression":
+        """
+        This function will calculate bootstrap confidence intervals for this trendline
+
+        Resamples are fit with the method and weights of this trendline, in the same space as this trendline,
+        so the intervals describe the slope and y-intercept that are shown
+
+        :param num_resamples: The number of bootstrap resamples
+        :param confidence: The confidence level of the intervals
+        :param seed: The seed of the random number generator, used for reproducible intervals
+        :return: A BootstrapRegression
+        """
+        return BootstrapRegression(
+            x_values=self.__fit_x_values,
+            y_values=self.__fit_y_values,
+            weights=self.__weights,
+            num_resamples=num_resamples,
+            confidence=confidence,
+            seed=seed,
+            log_scale=self.__log_scale,
+            method=self.__method,
         )
 
     @property
     def slope(self) -> float:
-        return float(self.__linear_regression.coef_)
+        return self.__slope
 
     @property
     def y_intercept(self) -> float:
-        return float(self.__linear_regression.intercept_)
+        return self.__y_intercept
 
     @property
     def r_squared(self) -> float:
         return self.__calculate_r_squared
 
+    @property
+    def log_scale(self) -> bool:
+        return self.__log_scale
+
+
+class BootstrapRegression:
+    def __init__(
+        self,
+        x_values: np.ndarray,
+        y_values: np.ndarray,
+        weights: np.ndarray | None = None,
+        num_resamples: int = 2000,
+        confidence: float = 0.95,
+        seed: int | None = 0,
+        log_scale: bool = False,
+        band_points: int = 100,
+        batch_size: int = 5_000_000,
+        method: str = "ordinary",
+        max_pairs: int = THEIL_SEN_MAX_PAIRS,
+    ):
+        """
+        Calculate bootstrap confidence intervals for a trendline
+
+        All resamples are drawn as one (resamples x points) index matrix and fit together with matrix operations
+        The matrix is processed in batches of at most batch_size elements to bound memory use
+        Each resample is fit with the same method as the trendline, see CalculateLinearRegression
+
+        :param x_values: A 1D array of x values, in the space the line is fit in
+        :param y_values: A 1D array of y values, in the space the line is fit in
+        :param weights: A 1D array of weights for each point
+        :param num_resamples: The number of bootstrap resamples
+        :param confidence: The confidence level of the intervals
+        :param seed: The seed of the random number generator, used for reproducible intervals
+        :param log_scale: The values are log10 intensities, the confidence band is returned as intensities
+        :param band_points: The number of x values to calculate the confidence band at
+        :param batch_size: The maximum number of elements of the index matrix to fit at once
+        :param method: The fitting method, one of "ordinary", "huber", or "theil_sen"
+        :param max_pairs: theil_sen only: the maximum number of pairs of points to calculate slopes for in each resample.
+                          If there are more pairs, the same random sample of pairs is used for every resample
+        """
+        x_values = np.asarray(x_values, dtype=float)
+        y_values = np.asarray(y_values, dtype=float)
+        if weights is None:
+            weights = np.ones(len(x_values))
+
+        rng = np.random.default_rng(seed)
+        num_points = len(x_values)
+
+        if method == "ordinary":
+            fit_resamples = self._fit_resamples
+            row_size = num_points
+        elif method == "huber":
+            fit_resamples = self._fit_resamples_huber
+            row_size = num_points
+        elif method == "theil_sen":
+            # The pairs of positions in each resample, the same pairs _theil_sen_regression fits the trendline with
+            first, second = _theil_sen_pairs(num_points, max_pairs)
+            fit_resamples = functools.partial(self._fit_resamples_theil_sen, first=first, second=second)
+            row_size = max(num_points, len(first))
+        else:
+            raise ValueError(
+                f"Unknown regression method '{method}', expected 'ordinary', 'huber', or 'theil_sen'"
+            )
+        rows_per_batch = max(1, batch_size // max(row_size, 1))
+
+        slopes = np.empty(num_resamples)
+        y_intercepts = np.empty(num_resamples)
+        r_squared = np.empty(num_resamples)
+        for start in range(0, num_resamples, rows_per_batch):
+            stop = min(start + rows_per_batch, num_resamples)
+            indices = rng.integers(0, num_points, size=(stop - start, num_points))
+            (
+                slopes[start:stop],
+                y_intercepts[start:stop],
+                r_squared[start:stop],
+            ) = fit_resamples(x_values[indices], y_values[indices], weights[indices])
+
+        # Resamples where every x value is identical can not be fit, and are ignored
+        tail = (1 - confidence) / 2 * 100
+        percentiles = [tail, 100 - tail]
+        self.__slope_interval = tuple(np.nanpercentile(slopes, percentiles))
+        self.__y_intercept_interval = tuple(np.nanpercentile(y_intercepts, percentiles))
+        self.__r_squared_interval = tuple(np.nanpercentile(r_squared, percentiles))
+
+        # Evaluate every resampled line on a grid of x values: (resamples x band_points)
+        band_x = np.linspace(x_values.min(), x_values.max(), band_points)
+        band_lines = y_intercepts[:, np.newaxis] + slopes[:, np.newaxis] * band_x
+        band_lower, band_upper = np.nanpercentile(band_lines, percentiles, axis=0)
+
+        if log_scale:
+            band_x, band_lower, band_upper = 10**band_x, 10**band_lower, 10**band_upper
+
+        self.band_x: np.ndarray = band_x
+        self.band_lower: np.ndarray = band_lower
+        self.band_upper: np.ndarray = band_upper
+        self.__confidence = confidence
+        self.__num_resamples = num_resamples
+        self.__method = method
+
+    @staticmethod
+    def _fit_resamples(
+        x_values: np.ndarray, y_values: np.ndarray, weights: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        This function will fit a weighted least squares line to every row of the resampled matrices
+
+        :param x_values: A (resamples x points) matrix of x values
+        :param y_values: A (resamples x points) matrix of y values
+        :param weights: A (resamples x points) matrix of weights
+        :return: The slope, y-intercept, and R² of each resample
+        """
+        total_weight = weights.sum(axis=1, keepdims=True)
+        x_centered = x_values - (weights * x_values).sum(axis=1, keepdims=True) / total_weight
+        y_centered = y_values - (weights * y_values).sum(axis=1, keepdims=True) / total_weight
+
+        sum_xy = np.sum(weights * x_centered * y_centered, axis=1)
+        sum_xx = np.sum(weights * x_centered**2, axis=1)
+        sum_yy = np.sum(weights * y_centered**2, axis=1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slopes = sum_xy / sum_xx
+            r_squared = sum_xy**2 / (sum_xx * sum_yy)
+
+        y_intercepts = (weights * y_values).sum(axis=1) / total_weight[:, 0] - slopes * (
+            weights * x_values
+        ).sum(axis=1) / total_weight[:, 0]
+
+        return slopes, y_intercepts, r_squared
+
+    @staticmethod
+    def _r_squared(
+        x_values: np.ndarray,
+        y_values: np.ndarray,
+        weights: np.ndarray,
+        slopes: np.ndarray,
+        y_intercepts: np.ndarray,
+    ) -> np.ndarray:
+        """
+        This function will calculate the weighted R² of a line fit to every row of the resampled matrices,
+        the same way CalculateLinearRegression calculates the R² of the trendline
+
+        :param x_values: A (resamples x points) matrix of x values
+        :param y_values: A (resamples x points) matrix of y values
+        :param weights: A (resamples x points) matrix of weights
+        :param slopes: The slope of each resample
+        :param y_intercepts: The y-intercept of each resample
+        :return: The R² of each resample
+        """
+        fitted_values = slopes[:, np.newaxis] * x_values + y_intercepts[:, np.newaxis]
+        mean_y = (weights * y_values).sum(axis=1, keepdims=True) / weights.sum(axis=1, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return 1 - np.sum(weights * (y_values - fitted_values) ** 2, axis=1) / np.sum(
+                weights * (y_values - mean_y) ** 2, axis=1
+            )
+
+    @staticmethod
+    def _fit_resamples_huber(
+        x_values: np.ndarray,
+        y_values: np.ndarray,
+        weights: np.ndarray,
+        epsilon: float = 1.345,
+        max_iterations: int = 50,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        This function will fit a line with Huber weights to every row of the resampled matrices
+        Every row is reweighted together, the same way _huber_regression reweights a single line,
+        and a row is no longer updated once it has converged
+
+        :param x_values: A (resamples x points) matrix of x values
+        :param y_values: A (resamples x points) matrix of y values
+        :param weights: A (resamples x points) matrix of weights
+        :param epsilon: The scaled residual at which points start to be down-weighted
+        :param max_iterations: The maximum number of reweighting iterations
+        :return: The slope, y-intercept, and R² of each resample
+        """
+        slopes, y_intercepts, _ = BootstrapRegression._fit_resamples(x_values, y_values, weights)
+        active = np.isfinite(slopes)
+
+        for _ in range(max_iterations):
+            if not active.any():
+                break
+
+            residuals = y_values[active] - (
+                slopes[active, np.newaxis] * x_values[active] + y_intercepts[active, np.newaxis]
+            )
+            scale = 1.4826 * np.median(
+                np.abs(residuals - np.median(residuals, axis=1, keepdims=True)), axis=1
+            )
+            # Rows whose residuals have no spread are stopped, as _huber_regression stops
+            rows = np.flatnonzero(active)
+            active[rows[scale == 0]] = False
+            fit = scale != 0
+            rows, residuals, scale = rows[fit], residuals[fit], scale[fit]
+
+            scaled_residuals = np.abs(residuals / scale[:, np.newaxis])
+            huber_weights = np.where(
+                scaled_residuals <= epsilon, 1, epsilon / np.maximum(scaled_residuals, epsilon)
+            )
+            new_slopes, new_y_intercepts, _ = BootstrapRegression._fit_resamples(
+                x_values[rows], y_values[rows], weights[rows] * huber_weights
+            )
+
+            converged = np.isclose(new_slopes, slopes[rows], rtol=1e-10, atol=0) & np.isclose(
+                new_y_intercepts, y_intercepts[rows], rtol=1e-10, atol=0
+            )
+            slopes[rows], y_intercepts[rows] = new_slopes, new_y_intercepts
+            active[rows[converged]] = False
+
+        return (
+            slopes,
+            y_intercepts,
+            BootstrapRegression._r_squared(x_values, y_values, weights, slopes, y_intercepts),
+        )
+
+    @staticmethod
+    def _fit_resamples_theil_sen(
+        x_values: np.ndarray,
+        y_values: np.ndarray,
+        weights: np.ndarray,
+        first: np.ndarray,
+        second: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        This function will fit a Theil-Sen line to every row of the resampled matrices
+        Weights are not used for the fit, as with _theil_sen_regression, only for R²
+
+        :param x_values: A (resamples x points) matrix of x values
+        :param y_values: A (resamples x points) matrix of y values
+        :param weights: A (resamples x points) matrix of weights
+        :param first: The first position of each pair of points
+        :param second: The second position of each pair of points
+        :return: The slope, y-intercept, and R² of each resample
+        """
+        x_difference = x_values[:, second] - x_values[:, first]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pair_slopes = np.where(
+                x_difference != 0, (y_values[:, second] - y_values[:, first]) / x_difference, np.nan
+            )
+        with warnings.catch_warnings():
+            # Resamples where every x value is identical have no slope, and are ignored
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            slopes = np.nanmedian(pair_slopes, axis=1)
+        y_intercepts = np.median(y_values - slopes[:, np.newaxis] * x_values, axis=1)
+
+        return (
+            slopes,
+            y_intercepts,
+            BootstrapRegression._r_squared(x_values, y_values, weights, slopes, y_intercepts),
+        )
+
+    @property
+    def slope_interval(self) -> tuple[float, float]:
+        return self.__slope_interval
+
+    @property
+    def y_intercept_interval(self) -> tuple[float, float]:
+        return self.__y_intercept_interval
+
+    @property
+    def r_squared_interval(self) -> tuple[float, float]:
+        return self.__r_squared_interval
+
+    @property
+    def confidence(self) -> float:
+        return self.__confidence
+
+    @property
+    def num_resamples(self) -> int:
+        return self.__num_resamples
+
+    @property
+    def method(self) -> str:
+        return self.__method
+
+
+def _weighted_least_squares(
+    x_values: np.ndarray, y_values: np.ndarray, weights: np.ndarray
+) -> tuple[float, float]:
+    """
+    This function will calculate the slope and y-intercept of a weighted least squares line
+
+    :param x_values: A 1D array of x values
+    :param y_values: A 1D array of y values
+    :param weights: A 1D array of weights for each point
+    :return: The slope and y-intercept
+    """
+    mean_x = np.sum(weights * x_values) / np.sum(weights)
+    mean_y = np.sum(weights * y_values) / np.sum(weights)
+
+    slope = np.sum(weights * (x_values - mean_x) * (y_values - mean_y)) / np.sum(
+        weights * (x_values - mean_x) ** 2
+    )
+    y_intercept = mean_y - slope * mean_x
+
+    return float(slope), float(y_intercept)
+
+
+def _huber_regression(
+    x_values: np.ndarray,
+    y_values: np.ndarray,
+    weights: np.ndarray,
+    epsilon: float = 1.345,
+    max_iterations: int = 50,
+) -> tuple[float, float]:
+    """
+    This function will calculate a line that is robust to outliers using Huber weights
+
+    Residuals are scaled by their median absolute deviation
+    Points with a scaled residual larger than epsilon are down-weighted
+
+    :param x_values: A 1D array of x values
+    :param y_values: A 1D array of y values
+    :param weights: A 1D array of weights for each point
+    :param epsilon: The scaled residual at which points start to be down-weighted
+    :param max_iterations: The maximum number of reweighting iterations
+    :return: The slope and y-intercept
+    """
+    slope, y_intercept = _weighted_least_squares(x_values, y_values, weights)
+
+    for _ in range(max_iterations):
+        residuals = y_values - (slope * x_values + y_intercept)
+        scale = 1.4826 * np.median(np.abs(residuals - np.median(residuals)))
+        if scale == 0:
+            break
+
+        scaled_residuals = np.abs(residuals / scale)
+        huber_weights = np.where(
+            scaled_residuals <= epsilon, 1, epsilon / np.maximum(scaled_residuals, epsilon)
+        )
+
+        new_slope, new_y_intercept = _weighted_least_squares(
+            x_values, y_values, weights * huber_weights
+        )
+        converged = np.allclose(
+            [new_slope, new_y_intercept], [slope, y_intercept], rtol=1e-10, atol=0
+        )
+        slope, y_intercept = new_slope, new_y_intercept
+
+        if converged:
+            break
+
+    return slope, y_intercept
+
+
+def _theil_sen_pairs(num_points: int, max_pairs: int = THEIL_SEN_MAX_PAIRS) -> tuple[np.ndarray, np.ndarray]:
+    """
+    This function will choose the pairs of points a Theil-Sen slope is calculated from
+
+    Every pair is used if there are at most max_pairs, otherwise a random sample of max_pairs pairs
+    The sample is always drawn with the same seed, so the trendline and its bootstrap resamples use the same pairs
+
+    :param num_points: The number of points
+    :param max_pairs: The maximum number of pairs
+    :return: The positions of the first and second point of each pair
+    """
+    if num_points * (num_points - 1) // 2 <= max_pairs:
+        return np.triu_indices(num_points, k=1)
+
+    rng = np.random.default_rng(0)
+    first = rng.integers(0, num_points, size=max_pairs)
+    second = rng.integers(0, num_points, size=max_pairs)
+    return first, second
+
+
+def _theil_sen_regression(
+    x_values: np.ndarray, y_values: np.ndarray, max_pairs: int = THEIL_SEN_MAX_PAIRS
+) -> tuple[float, float]:
+    """
+    This function will calculate the Theil-Sen line
+    The slope is the median of the slopes between every pair of points, and the y-intercept is the median of y - slope * x
+
+    If there are more than max_pairs pairs of points, a random sample of pairs is used
+
+    :param x_values: A 1D array of x values
+    :param y_values: A 1D array of y values
+    :param max_pairs: The maximum number of pairs to calculate slopes for
+    :return: The slope and y-intercept
+    """
+    first, second = _theil_sen_pairs(len(x_values), max_pairs)
+
+    x_difference = x_values[second] - x_values[first]
+    valid = x_difference != 0
+    pair_slopes = (y_values[second] - y_values[first])[valid] / x_difference[valid]
+
+    slope = np.median(pair_slopes)
+    y_intercept = np.median(y_values - slope * x_values)
+
+    return float(slope), float(y_intercept)
+
 
 def calculate_statistics(intensities: pd.DataFrame) -> pd.DataFrame:
     """
     This function will calculate various statistics required for graph creation
 
-    :param intensities: The pandas dataframe containing various intensity values for liquid/dried experiments
+    :param intensities: The pandas dataframe containing the "dried_N" and "liquid_N" replicate intensities
     :return: A pandas dataframe with additional statistics
     """
+    # Replicates of each condition are a single (proteins x replicates) block, so any number of replicates is supported
+    dried = schema.replicate_block(intensities, "dried")
+    liquid = schema.replicate_block(intensities, "liquid")
+
+    # A standard deviation of a single replicate is NaN, it is reset to 0 below
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        dried_std_dev = dried.std(axis=1, ddof=1)
+        liquid_std_dev = liquid.std(axis=1, ddof=1)
+
     # Calculate averages
-    intensities["dried_average"] = round(
-        intensities[["dried_1", "dried_2", "dried_3"]].mean(axis=1), 4
+    intensities["dried_average"] = np.round(dried.mean(axis=1), 4).astype(
+        schema.INTENSITY_DTYPE
     )
-    intensities["liquid_average"] = round(
-        intensities[["liquid_1", "liquid_2", "liquid_3"]].mean(axis=1), 4
+    intensities["liquid_average"] = np.round(liquid.mean(axis=1), 4).astype(
+        schema.INTENSITY_DTYPE
     )
     intensities["average_intensity"] = round(
         intensities[["liquid_average", "dried_average"]].mean(axis=1), 4
     )
 
     # Calculate standard deviations
-    intensities["dried_std_dev"] = round(
-        intensities[["dried_1", "dried_2", "dried_3"]].std(axis=1), 4
-    )
-    intensities["liquid_std_dev"] = round(
-        intensities[["liquid_1", "liquid_2", "liquid_3"]].std(axis=1), 4
+    intensities["dried_std_dev"] = np.round(dried_std_dev, 4).astype(schema.INTENSITY_DTYPE)
+    intensities["liquid_std_dev"] = np.round(liquid_std_dev, 4).astype(
+        schema.INTENSITY_DTYPE
     )
 
     # Calculate coefficient of variation
@@ -88,8 +595,227 @@ def calculate_statistics(intensities: pd.DataFrame) -> pd.DataFrame:
 
     # Some averages are 0 (or inf), and dividing by 0 = NaN
     # Fix this by resetting values to 0 and changing inf values to zero
+    # Only numeric columns are reset, so protein IDs and names are kept for clinical matching
     intensities.fillna(0, inplace=True)
-    intensities[intensities["dried_liquid_ratio"] == np.inf] = 0
+    numeric_columns = intensities.select_dtypes("number").columns
+    intensities.loc[intensities["dried_liquid_ratio"] == np.inf, numeric_columns] = 0
     intensities.reset_index(drop=True, inplace=True)
 
     return intensities
+
+
+def benjamini_hochberg(p_values: np.ndarray) -> np.ndarray:
+    """
+    This function will apply the Benjamini-Hochberg correction to an array of p-values
+
+    NaN p-values (i.e., proteins that could not be tested) are ignored, and are returned as NaN q-values
+
+    :param p_values: A 1D array of p-values
+    :return: A 1D array of q-values, in the same order as p_values
+    """
+    p_values = np.asarray(p_values, dtype=float)
+    q_values = np.full_like(p_values, np.nan)
+
+    valid = ~np.isnan(p_values)
+    num_tests = int(valid.sum())
+    if num_tests == 0:
+        return q_values
+
+    order = np.argsort(p_values[valid])
+    ranked = p_values[valid][order] * num_tests / np.arange(1, num_tests + 1)
+
+    # q-values must be monotonic, so take the running minimum from the largest p-value down
+    ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+
+    valid_q_values = np.empty(num_tests)
+    valid_q_values[order] = np.minimum(ranked, 1)
+    q_values[valid] = valid_q_values
+
+    return q_values
+
+
+def _welch_t_test(dried: np.ndarray, liquid: np.ndarray) -> np.ndarray:
+    """
+    This function will perform a two-sided Welch's t-test on every row of the dried and liquid matrices at once
+
+    Missing values must be NaN. Rows with less than two values in either condition are given a NaN p-value
+
+    :param dried: A (proteins x replicates) matrix of log intensities
+    :param liquid: A (proteins x replicates) matrix of log intensities
+    :return: A 1D array of p-values
+    """
+    # scipy is only required for the t distribution, import it here to keep startup fast
+    from scipy.special import stdtr
+
+    dried_count = np.sum(~np.isnan(dried), axis=1)
+    liquid_count = np.sum(~np.isnan(liquid), axis=1)
+    testable = (dried_count >= 2) & (liquid_count >= 2)
+
+    # Rows that can not be tested produce empty-slice warnings, they are set to NaN below
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        dried_error = np.nanvar(dried, axis=1, ddof=1) / dried_count
+        liquid_error = np.nanvar(liquid, axis=1, ddof=1) / liquid_count
+        standard_error = dried_error + liquid_error
+
+        t_statistic = (np.nanmean(dried, axis=1) - np.nanmean(liquid, axis=1)) / np.sqrt(
+            standard_error
+        )
+
+        # Welch-Satterthwaite degrees of freedom
+        degrees_freedom = standard_error**2 / (
+            dried_error**2 / (dried_count - 1) + liquid_error**2 / (liquid_count - 1)
+        )
+
+    p_values = 2 * stdtr(degrees_freedom, -np.abs(t_statistic))
+    p_values[~testable | (standard_error == 0)] = np.nan
+
+    return p_values
+
+
+@functools.lru_cache(maxsize=None)
+def _mann_whitney_distribution(num_x: int, num_y: int) -> np.ndarray:
+    """
+    This function will calculate the exact null distribution of the Mann-Whitney U statistic
+
+    The distribution only depends on the number of values in each group, so it is cached
+
+    :param num_x: The number of values in the first group
+    :param num_y: The number of values in the second group
+    :return: The cumulative distribution of U, indexed by U
+    """
+    # counts[i][j] holds the number of orderings for each U value with i values in x and j values in y
+    counts = [[np.ones(1) for _ in range(num_y + 1)] for _ in range(num_x + 1)]
+    for i in range(1, num_x + 1):
+        for j in range(1, num_y + 1):
+            frequency = np.zeros(i * j + 1)
+            # The largest value belongs to y, U is unchanged
+            frequency[: (i * (j - 1)) + 1] += counts[i][j - 1]
+            # The largest value belongs to x, it is larger than all j values in y
+            frequency[j : j + (i - 1) * j + 1] += counts[i - 1][j]
+            counts[i][j] = frequency
+
+    distribution = counts[num_x][num_y]
+    return np.cumsum(distribution) / distribution.sum()
+
+
+def _mann_whitney_test(dried: np.ndarray, liquid: np.ndarray) -> np.ndarray:
+    """
+    This function will perform a two-sided Mann-Whitney U test on every row of the dried and liquid matrices at once
+
+    Exact p-values are used, as replicate counts are small. Ties are counted as one half
+
+    :param dried: A (proteins x replicates) matrix of log intensities, missing values are NaN
+    :param liquid: A (proteins x replicates) matrix of log intensities, missing values are NaN
+    :return: A 1D array of p-values
+    """
+    # Compare every dried replicate with every liquid replicate: (proteins x dried x liquid)
+    dried_values = dried[:, :, np.newaxis]
+    liquid_values = liquid[:, np.newaxis, :]
+    u_statistic = np.sum(dried_values > liquid_values, axis=(1, 2)) + 0.5 * np.sum(
+        dried_values == liquid_values, axis=(1, 2)
+    )
+
+    dried_count = np.sum(~np.isnan(dried), axis=1)
+    liquid_count = np.sum(~np.isnan(liquid), axis=1)
+
+    p_values = np.full(len(u_statistic), np.nan)
+
+    # Rows are grouped by their number of non-missing values, as each group shares a null distribution
+    group_sizes = np.unique(np.stack([dried_count, liquid_count], axis=1), axis=0)
+    for num_dried, num_liquid in group_sizes:
+        if num_dried == 0 or num_liquid == 0:
+            continue
+
+        in_group = (dried_count == num_dried) & (liquid_count == num_liquid)
+        cumulative = _mann_whitney_distribution(int(num_dried), int(num_liquid))
+        group_u = u_statistic[in_group]
+
+        # P(U <= u) and P(U >= u), rounding half values of U conservatively
+        lower_tail = cumulative[np.floor(group_u).astype(int)]
+        upper_index = np.ceil(group_u).astype(int) - 1
+        upper_tail = 1 - np.where(upper_index >= 0, cumulative[np.maximum(upper_index, 0)], 0)
+
+        p_values[in_group] = np.minimum(1, 2 * np.minimum(lower_tail, upper_tail))
+
+    return p_values
+
+
+def differential_intensity(
+    intensities: pd.DataFrame, test: str = "welch"
+) -> pd.DataFrame:
+    """
+    This function will test each protein for a difference between its dried and liquid intensities
+
+    All proteins are tested at once using matrix operations on the log2 replicate intensities
+    Zero intensities are treated as missing values
+    P-values are corrected for multiple testing using the Benjamini-Hochberg procedure
+
+    It will add the columns "log2_fold_change", "p_value", and "q_value"
+
+    :param intensities: The pandas dataframe containing the dried and liquid replicate intensities
+    :param test: The statistical test to use, either "welch" or "mann_whitney"
+    :return: A pandas dataframe with the additional columns
+    """
+    dried = schema.replicate_block(intensities, "dried")
+    liquid = schema.replicate_block(intensities, "liquid")
+
+    # Intensities of 0 were not quantified, and can not be log transformed
+    dried[dried <= 0] = np.nan
+    liquid[liquid <= 0] = np.nan
+    dried = np.log2(dried)
+    liquid = np.log2(liquid)
+
+    if test == "welch":
+        p_values = _welch_t_test(dried, liquid)
+    elif test == "mann_whitney":
+        p_values = _mann_whitney_test(dried, liquid)
+    else:
+        raise ValueError(f"Unknown test '{test}', expected 'welch' or 'mann_whitney'")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        fold_change = np.nanmean(dried, axis=1) - np.nanmean(liquid, axis=1)
+
+    intensities["log2_fold_change"] = np.round(fold_change, 4).astype(np.float32)
+    intensities["p_value"] = p_values
+    intensities["q_value"] = benjamini_hochberg(p_values)
+
+    return intensities
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    num_proteins = 100_000
+    for num_replicates in [3, 12]:
+        replicates = rng.lognormal(mean=20, sigma=2, size=(num_proteins, 2 * num_replicates))
+        replicates[rng.random(replicates.shape) < 0.1] = 0
+        benchmark_df = schema.replicate_frame(
+            {
+                "dried": replicates[:, :num_replicates],
+                "liquid": replicates[:, num_replicates:],
+            }
+        )
+
+        start = time.perf_counter()
+        calculate_statistics(benchmark_df)
+        print(
+            f"statistics: {num_proteins} proteins x {num_replicates} replicates in {time.perf_counter() - start:.3f} seconds"
+        )
+        for test_name in ["welch", "mann_whitney"]:
+            start = time.perf_counter()
+            differential_intensity(benchmark_df, test=test_name)
+            print(
+                f"{test_name}: {num_proteins} proteins x {num_replicates} replicates tested in {time.perf_counter() - start:.3f} seconds"
+            )
+
+    # Bootstrap a trendline through a clinically relevant sized set of proteins
+    num_points = 150
+    liquid_values = rng.lognormal(mean=20, sigma=1, size=num_points)
+    dried_values = 0.8 * liquid_values * rng.normal(1, 0.1, size=num_points)
+    for method in ["ordinary", "huber", "theil_sen"]:
+        start = time.perf_counter()
+        BootstrapRegression(liquid_values, dried_values, num_resamples=10_000, seed=0, method=method)
+        print(
+            f"bootstrap ({method}): 10000 resamples of {num_points} proteins in {time.perf_counter() - start:.3f} seconds"
+        )
@@ -0,0 +1,297 @@
+import argparse
+import json
+import pathlib
+import time
+
+import numpy as np
+import pandas as pd
+
+import file_operations
+import schema
+
+# The table formats results can be exported to, and their file extensions
+# Arrow IPC files are written uncompressed, so they can be memory-mapped by downstream jobs
+TABLE_FORMATS: dict[str, str] = {"parquet": "parquet", "arrow": "arrow"}
+
+# The version of the exported schema, stored in the file metadata
+# It is increased whenever a column is renamed, removed, or changes type
+SCHEMA_VERSION = 1
+
+# The metadata key holding the schema version and the settings of the run
+METADATA_KEY = b"maxquant_analysis"
+
+# The columns of every exported table, in order, and their types
+# Replicate intensity columns ("dried_1", ...) are placed after the identifiers, as their number depends on the input
+IDENTIFIER_COLUMNS: list[str] = ["protein_id", "canonical_id", "gene_name", "protein_name"]
+RESULT_COLUMNS: dict[str, str] = {
+    "dried_average": "float32",
+    "liquid_average": "float32",
+    "average_intensity": "float32",
+    "dried_std_dev": "float32",
+    "liquid_std_dev": "float32",
+    "dried_variation": "float32",
+    "liquid_variation": "float32",
+    "dried_liquid_ratio": "float32",
+    "average_variation": "float32",
+    "log2_fold_change": "float32",
+    "p_value": "float64",
+    "q_value": "float64",
+    "relevant": "bool",
+    "expected_concentration": "float32",
+    "clinical_id": "string",
+}
+
+
+def _import_pyarrow():
+    """
+    This function will import pyarrow, which is an optional dependency only needed to export tables
+
+    :return: The pyarrow module
+    """
+    try:
+        import pyarrow
+    except ImportError:
+        raise ValueError(
+            "Exporting Parquet or Arrow tables requires the pyarrow package. Install it with 'pip install pyarrow'"
+        )
+
+    return pyarrow
+
+
+def table_schema(data_frame: pd.DataFrame, metadata: dict | None = None):
+    """
+    This function will create the arrow schema of an exported table
+
+    The schema only depends on the number of replicates, so tables of every run can be read the same way:
+    the identifiers, then the replicate intensities, then RESULT_COLUMNS
+    Columns that are not part of the schema are not exported
+
+    :param data_frame: The intensity dataframe
+    :param metadata: Settings of the run, stored in the schema metadata with SCHEMA_VERSION
+    :return: A pyarrow schema
+    """
+    pyarrow = _import_pyarrow()
+    types = {
+        "string": pyarrow.string(),
+        "float32": pyarrow.float32(),
+        "float64": pyarrow.float64(),
+        "bool": pyarrow.bool_(),
+    }
+
+    fields = [pyarrow.field(column, pyarrow.string()) for column in IDENTIFIER_COLUMNS]
+    fields += [
+        pyarrow.field(column, pyarrow.float32())
+        for column in schema.replicate_columns(data_frame)
+    ]
+    fields += [pyarrow.field(column, types[dtype]) for column, dtype in RESULT_COLUMNS.items()]
+
+    return pyarrow.schema(
+        fields,
+        metadata={
+            METADATA_KEY: json.dumps({"schema_version": SCHEMA_VERSION, **(metadata or {})})
+        },
+    )
+
+
+def to_table(data_frame: pd.DataFrame, metadata: dict | None = None):
+    """
+    This function will convert the intensity dataframe to an arrow table with the schema of table_schema
+
+    Columns of the schema that the dataframe does not have are exported as nulls, so the schema never changes
+
+    :param data_frame: The intensity dataframe
+    :param metadata: Settings of the run, stored in the schema metadata
+    :return: A pyarrow table
+    """
+    pyarrow = _import_pyarrow()
+    arrow_schema = table_schema(data_frame, metadata)
+
+    arrays = []
+    for field in arrow_schema:
+        if field.name not in data_frame.columns:
+            arrays.append(pyarrow.nulls(len(data_frame), type=field.type))
+        elif pyarrow.types.is_string(field.type):
+            # Missing names are stored as empty strings in the dataframe, and exported as they are
+            arrays.append(
+                pyarrow.array(data_frame[field.name].astype(str).to_numpy(dtype=object), type=field.type)
+            )
+        else:
+            arrays.append(
+                pyarrow.array(
+                    data_frame[field.name].to_numpy(dtype=field.type.to_pandas_dtype()),
+                    type=field.type,
+                )
+            )
+
+    return pyarrow.Table.from_arrays(arrays, schema=arrow_schema)
+
+
+def write_table(
+    data_frame: pd.DataFrame,
+    output_path: pathlib.Path | str,
+    table_format: str,
+    metadata: dict | None = None,
+) -> pathlib.Path:
+    """
+    This function will write the intensity dataframe to a Parquet or Arrow IPC file
+
+    Parquet files are compressed, and are the smaller choice for storage
+    Arrow IPC files are not compressed, so they can be memory-mapped and read without copying or decoding
+
+    :param data_frame: The intensity dataframe
+    :param output_path: The file to write
+    :param table_format: The table format, a key of TABLE_FORMATS
+    :param metadata: Settings of the run, stored in the schema metadata
+    :return: The path of the written file
+    """
+    if table_format not in TABLE_FORMATS:
+        raise ValueError(
+            f"Unknown table format '{table_format}', expected one of {', '.join(TABLE_FORMATS)}"
+        )
+    pyarrow = _import_pyarrow()
+    table = to_table(data_frame, metadata)
+    output_path = pathlib.Path(output_path)
+
+    if table_format == "parquet":
+        import pyarrow.parquet
+
+        pyarrow.parquet.write_table(table, output_path, compression="zstd")
+    else:
+        import pyarrow.ipc
+
+        with pyarrow.ipc.new_file(output_path, table.schema) as writer:
+            writer.write_table(table)
+
+    return output_path
+
+
+def write_results(
+    data_frame: pd.DataFrame, args: argparse.Namespace, table_format: str
+) -> pathlib.Path:
+    """
+    This function will write the results of a run next to the input file, with the plots
+
+    The method, experiment, and input file are stored in the schema metadata
+
+    :param data_frame: The filtered dataframe returned by pipeline.analyze
+    :param args: The arguments retrieved from the command line using arg_parse
+    :param table_format: The table format, a key of TABLE_FORMATS
+    :return: The path of the written file
+    """
+    file_name = f"results_{file_operations.get_output_file_name(args)}.{TABLE_FORMATS[table_format]}"
+    output_path = pathlib.Path(args.input).parent.joinpath(file_name)
+
+    metadata = {
+        "method": args.method,
+        "experiment": args.experiment,
+        "input": pathlib.Path(args.input).name,
+    }
+    return write_table(data_frame, output_path, table_format, metadata=metadata)
+
+
+def read_table(input_file: pathlib.Path | str, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    This function will read a table written by write_table
+
+    Arrow IPC files are memory-mapped, so only the columns that are used are read from disk
+
+    :param input_file: A .parquet or .arrow file
+    :param columns: Only read these columns (default: every column)
+    :return: The intensity dataframe, with the compact data types of schema.apply_compact_schema
+    """
+    _import_pyarrow()
+    input_file = pathlib.Path(input_file)
+
+    if input_file.suffix.lower() == ".parquet":
+        import pyarrow.parquet
+
+        data_frame = pyarrow.parquet.read_table(input_file, columns=columns).to_pandas()
+    else:
+        import pyarrow.ipc
+
+        with pyarrow.memory_map(str(input_file)) as source:
+            table = pyarrow.ipc.open_file(source).read_all()
+            if columns is not None:
+                table = table.select(columns)
+            data_frame = table.to_pandas()
+
+    return schema.apply_compact_schema(data_frame)
+
+
+def table_metadata(input_file: pathlib.Path | str) -> dict:
+    """
+    This function will read the schema version and run settings stored in a table written by write_table
+
+    Only the schema is read, not the data
+
+    :param input_file: A .parquet or .arrow file
+    :return: A dictionary containing "schema_version", "method", "experiment", and "input"
+    """
+    _import_pyarrow()
+    input_file = pathlib.Path(input_file)
+
+    if input_file.suffix.lower() == ".parquet":
+        import pyarrow.parquet
+
+        arrow_schema = pyarrow.parquet.read_schema(input_file)
+    else:
+        import pyarrow.ipc
+
+        with pyarrow.memory_map(str(input_file)) as source:
+            arrow_schema = pyarrow.ipc.open_file(source).schema
+
+    return json.loads((arrow_schema.metadata or {}).get(METADATA_KEY, b"{}"))
+
+
+if __name__ == "__main__":
+    import openpyxl
+
+    import excel_writer
+    import statistics
+
+    # Compare reading the results of a run back from each format
+    num_proteins = 20_000
+    random_generator = np.random.default_rng(0)
+    intensities = random_generator.lognormal(20, 2, size=(num_proteins, 6)).astype(np.float32)
+    benchmark_df = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "protein_id": [f"P{i:05d}" for i in range(num_proteins)],
+                    "gene_name": [f"GENE{i}" for i in range(num_proteins)],
+                    "protein_name": [f"Protein {i}" for i in range(num_proteins)],
+                }
+            ),
+            schema.replicate_frame({"dried": intensities[:, :3], "liquid": intensities[:, 3:]}),
+        ],
+        axis=1,
+    )
+    benchmark_df = statistics.calculate_statistics(benchmark_df)
+    benchmark_df["relevant"] = False
+    benchmark_df["clinical_id"] = ""
+
+    output_directory = pathlib.Path("./table_export_benchmark")
+    output_directory.mkdir(exist_ok=True)
+    args = argparse.Namespace(
+        input=str(output_directory / "proteinGroups.txt"),
+        excel=str(output_directory / "results.xlsx"),
+        method="Direct",
+        experiment="SDC",
+    )
+    pathlib.Path(args.excel).unlink(missing_ok=True)
+    excel_writer.AllProteins(benchmark_df, args)
+
+    start = time.perf_counter()
+    workbook = openpyxl.load_workbook(args.excel, read_only=True)
+    excel_rows = list(workbook["All Proteins"].iter_rows(values_only=True))
+    workbook.close()
+    print(f"xlsx: read {len(excel_rows) - 2} rows in {1000 * (time.perf_counter() - start):.0f} ms")
+
+    for table_format in TABLE_FORMATS:
+        output_path = write_results(benchmark_df, args, table_format)
+        start = time.perf_counter()
+        read_df = read_table(output_path)
+        print(
+            f"{table_format}: read {len(read_df)} rows in {1000 * (time.perf_counter() - start):.1f} ms "
+            f"({output_path.stat().st_size / 1024**2:.1f} MB)"
+        )
@@ -0,0 +1,34 @@
+import pathlib
+import sys
+
+import pytest
+
+# The modules of the program are at the root of the repository
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+
+import equivalence  # noqa: E402
+import pipeline  # noqa: E402
+
+
+@pytest.fixture
+def protein_groups(tmp_path) -> pathlib.Path:
+    """
+    A generated proteinGroups.txt, with missing replicates and proteins only quantified in one condition
+    """
+    return equivalence.generate_protein_groups(tmp_path / "proteinGroups.txt", num_proteins=300)
+
+
+@pytest.fixture
+def config(protein_groups) -> pipeline.PipelineConfig:
+    """
+    The settings of an analysis of protein_groups, without plots, bootstrap resamples, or output
+    """
+    return pipeline.PipelineConfig(
+        input=str(protein_groups),
+        method="Direct",
+        experiment="SDC",
+        write_plots=False,
+        verbose=False,
+        bootstrap=10,
+        cache=False,
+    )
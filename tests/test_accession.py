@@ -0,0 +1,50 @@
+import random
+
+import pandas as pd
+import pytest
+
+import accession
+
+
+def test_canonical_accession():
+    for protein_id in ["P02768-2", "CON__P02768", "REV__P02768", "sp|P02768|ALBU_HUMAN", "P02768.3", " P02768"]:
+        assert accession.canonical_accession(protein_id) == "P02768"
+
+
+def test_canonical_ids_match_canonical_key():
+    random_generator = random.Random(0)
+    accessions = [
+        "P02768",
+        "P02768-2",
+        "CON__P02768",
+        "REV__Q9Y6R7",
+        "CON__REV__Q9Y6R7",
+        "sp|P05155|IC1_HUMAN",
+        "tr|A0A0B4J2F0|X_HUMAN",
+        "sp|P05155-2|IC1_HUMAN",
+        "P01880.3",
+        "P01880-2.1",
+        " P05155 ",
+        "",
+        "-2",
+        "sp|P1",
+    ]
+    protein_ids = pd.Series(
+        [
+            ";".join(random_generator.choice(accessions) for _ in range(random_generator.randint(1, 4)))
+            for _ in range(5000)
+        ]
+    )
+
+    expected = protein_ids.map(accession.canonical_key)
+    assert accession.canonical_ids(protein_ids).tolist() == expected.tolist()
+    assert accession.canonical_ids(protein_ids.iloc[:0]).tolist() == []
+
+    # Arrow-backed strings, as read by file_operations, can be split in several chunks
+    pyarrow = pytest.importorskip("pyarrow")
+    chunked_ids = pd.Series(
+        pd.arrays.ArrowStringArray(
+            pyarrow.chunked_array([protein_ids.iloc[:2500].tolist(), protein_ids.iloc[2500:].tolist()])
+        )
+    )
+    assert accession.canonical_ids(chunked_ids).tolist() == expected.tolist()
@@ -0,0 +1,59 @@
+import checkpoint
+import file_operations
+import pipeline
+
+
+def _run_chain(config: pipeline.PipelineConfig, cache_directory=None) -> checkpoint.StageRunner:
+    runner = checkpoint.StageRunner(pipeline.build_stages(config), cache_directory)
+    runner.output("filter_variation")
+    return runner
+
+
+def test_ingest_unchanged_by_later_stages(config):
+    runner = _run_chain(config)
+
+    ingest_df = runner.output("ingest")
+    expected_df = file_operations.create_intensity_dataframe(config.input)
+    assert list(ingest_df.columns) == list(expected_df.columns)
+    assert ingest_df.equals(expected_df)
+    assert ingest_df.attrs["excluded_rows"] == expected_df.attrs["excluded_rows"]
+
+
+def test_cached_output_matches_computed_output(config, tmp_path):
+    cold_runner = _run_chain(config, tmp_path / "checkpoints")
+    warm_runner = _run_chain(config, tmp_path / "checkpoints")
+
+    assert {record.status for record in warm_runner.records} == {"cached"}
+    for name in ["ingest", "normalize", "filter_variation"]:
+        assert warm_runner.output(name).equals(cold_runner.output(name))
+
+
+def test_output_returns_a_copy(config):
+    runner = checkpoint.StageRunner(pipeline.build_stages(config), None)
+
+    runner.output("ingest")["dried_1"] = 0
+    assert not (runner.output("ingest")["dried_1"] == 0).all()
+
+
+def test_code_change_changes_key(tmp_path, monkeypatch):
+    # A stage function whose module uses a helper module from the same directory
+    (tmp_path / "stage_helper.py").write_text("def scale(value):\n    return value * 2\n")
+    (tmp_path / "stage_module.py").write_text(
+        "import stage_helper\n\n\ndef stage(value):\n    return stage_helper.scale(value)\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import stage_module
+
+    def stage_key() -> str:
+        checkpoint._module_fingerprint.cache_clear()
+        runner = checkpoint.StageRunner(
+            [checkpoint.Stage(name="stage", function=stage_module.stage, parameters={"value": 1})], None
+        )
+        return runner.key("stage")
+
+    original_key = stage_key()
+    assert stage_key() == original_key
+
+    # Changing the code the stage calls changes its key, so its old checkpoint is not used
+    (tmp_path / "stage_helper.py").write_text("def scale(value):\n    return value * 3\n")
+    assert stage_key() != original_key
@@ -0,0 +1,40 @@
+import pathlib
+
+import pytest
+
+import equivalence
+
+# A recorded proteinGroups.txt, with fractional intensities and rows flagged as reverse, contaminant, or site-only
+RECORDED_INPUT = pathlib.Path(__file__).parent / "data" / "proteinGroups.txt"
+
+
+def test_generated_input_is_equivalent(protein_groups):
+    equivalence.assert_equivalent(equivalence.check_equivalence([protein_groups]))
+
+
+def test_recorded_input_is_equivalent():
+    equivalence.assert_equivalent(equivalence.check_equivalence([RECORDED_INPUT]))
+
+
+def test_optimized_paths_are_not_slower(tmp_path):
+    # Large enough for the paths to be checked for speed, see SPEED_CHECK_MIN_PROTEINS
+    input_file = equivalence.generate_protein_groups(
+        tmp_path / "proteinGroups.txt", num_proteins=2 * equivalence.SPEED_CHECK_MIN_PROTEINS
+    )
+    results = equivalence.check_equivalence(
+        [input_file], repeats=3, paths=["ingest", "statistics", "clinical"]
+    )
+
+    assert [result.path for result in results] == ["ingest", "statistics", "clinical"]
+    equivalence.assert_equivalent(results)
+
+
+def test_slower_path_is_a_regression():
+    result = equivalence.EquivalenceResult(
+        "ingest", "proteinGroups.txt", equivalence.SPEED_CHECK_MIN_PROTEINS, 0.01, 0.02
+    )
+
+    assert result.equivalent
+    assert result.regressed
+    with pytest.raises(AssertionError, match="0.50x the speed of the reference"):
+        equivalence.assert_equivalent([result])
@@ -0,0 +1,94 @@
+import gzip
+
+import numpy as np
+import pytest
+
+import file_operations
+
+
+def test_compressed_input_matches_plain_input(protein_groups, tmp_path):
+    compressed = tmp_path / "proteinGroups.txt.gz"
+    compressed.write_bytes(gzip.compress(protein_groups.read_bytes()))
+
+    plain_df = file_operations.create_intensity_dataframe(protein_groups)
+    compressed_df = file_operations.create_intensity_dataframe(compressed)
+
+    assert compressed_df.equals(plain_df)
+    assert plain_df.attrs["read_statistics"]["bytes"] == protein_groups.stat().st_size
+    assert compressed_df.attrs["read_statistics"]["bytes"] == protein_groups.stat().st_size
+
+
+@pytest.fixture(params=["arrow", "pandas"])
+def reader(request, monkeypatch):
+    """
+    Read with the arrow reader, or with the pandas reader used when pyarrow is not installed
+    """
+    if request.param == "pandas":
+
+        def missing_pyarrow(*args, **kwargs):
+            raise ImportError("No module named 'pyarrow'")
+
+        monkeypatch.setattr(file_operations, "_read_rows_arrow", missing_pyarrow)
+    return request.param
+
+
+def _write_protein_groups(output_file, rows: list[list[str]]):
+    header = ["", "Protein IDs", "", "", "", "Protein names", "Gene names"]
+    header += [f"LFQ intensity Dried_{i}" for i in range(1, 4)]
+    header += [f"LFQ intensity Liquid_{i}" for i in range(1, 4)]
+    header += ["Reverse", "Potential contaminant"]
+    lines = ["\t".join(header)] + [
+        "\t".join(["", protein_id, "", "", "", f"{protein_id} name", "GENE"] + values + flags)
+        for protein_id, *values, flags in [(*row[:-1], row[-1]) for row in rows]
+    ]
+    output_file.write_text("\n".join(lines) + "\n")
+    return output_file
+
+
+def test_flagged_rows_are_not_converted(reader, tmp_path):
+    input_file = _write_protein_groups(
+        tmp_path / "proteinGroups.txt",
+        [
+            ["P1", "1", "2", "3", "4", "5", "6", ["", ""]],
+            # The intensities of flagged rows are never converted, so values that are not numbers do not fail
+            ["REV__P2", "n/a", "n/a", "n/a", "n/a", "n/a", "n/a", ["+", ""]],
+            ["CON__P3", "x", "", "", "", "", "", ["", "+"]],
+            ["P4", "7", "8", "9", "10", "11", "12", ["", ""]],
+        ],
+    )
+
+    data_frame = file_operations.create_intensity_dataframe(input_file)
+
+    assert data_frame["protein_id"].tolist() == ["P1", "P4"]
+    assert data_frame.attrs["excluded_rows"] == {
+        "reverse": 1,
+        "potential_contaminant": 1,
+        "only_identified_by_site": 0,
+    }
+    np.testing.assert_array_equal(data_frame["liquid_3"], [6, 12])
+
+
+def test_empty_intensities_are_zero(reader, tmp_path):
+    input_file = _write_protein_groups(
+        tmp_path / "proteinGroups.txt",
+        [
+            ["P1", "", "2", "3", "4", "", "6", ["", ""]],
+            ["P2", "1.5E+08", "2", "3", "4", "5", "", ["", ""]],
+        ],
+    )
+
+    data_frame = file_operations.create_intensity_dataframe(input_file)
+
+    assert data_frame["dried_1"].dtype == np.float32
+    np.testing.assert_array_equal(data_frame["dried_1"], [0, 1.5e8])
+    np.testing.assert_array_equal(data_frame["liquid_2"], [0, 5])
+    np.testing.assert_array_equal(data_frame["liquid_3"], [6, 0])
+
+
+def test_header_only_input(reader, tmp_path):
+    data_frame = file_operations.create_intensity_dataframe(
+        _write_protein_groups(tmp_path / "proteinGroups.txt", [])
+    )
+
+    assert data_frame.empty
+    assert "dried_3" in data_frame.columns
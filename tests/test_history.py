@@ -0,0 +1,68 @@
+import argparse
+import datetime
+
+import pandas as pd
+
+import history
+import pipeline
+
+
+def _run_frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "protein_id": ["P02768-2;CON__Q9Y6R7", "sp|P01009|A1AT_HUMAN", "P11"],
+            "gene_name": ["ALB", "SERPINA1", "X"],
+            "protein_name": ["Albumin", "Alpha-1-antitrypsin", "X"],
+            "dried_variation": [10.0, 20.0, 30.0],
+            "liquid_variation": [11.0, 21.0, 31.0],
+            "relevant": [True, False, False],
+        }
+    )
+
+
+def _append(tmp_path, protein_groups, day):
+    args = argparse.Namespace(input=str(protein_groups), method="Direct", experiment="SDC")
+    history.append_run(
+        _run_frame(),
+        tmp_path / "history",
+        args,
+        run_time=datetime.datetime(2026, 10, day, tzinfo=datetime.timezone.utc),
+    )
+
+
+def test_proteins_match_any_accession_of_the_group(tmp_path, protein_groups):
+    _append(tmp_path, protein_groups, 1)
+    _append(tmp_path, protein_groups, 2)
+
+    # Q9Y6R7 is the second accession of the first group, so it is not its lead accession
+    trend_df = history.read_trends(tmp_path / "history", proteins=["Q9Y6R7"])
+    assert trend_df["lead_accession"].astype(str).tolist() == ["P02768", "P02768"]
+    assert trend_df["dried_variation"].tolist() == [10.0, 10.0]
+
+    # Accessions are matched as whole tokens, so P1 does not match P11 or P01009
+    assert history.read_trends(tmp_path / "history", proteins=["P1"]).empty
+
+    trend_df = history.read_trends(tmp_path / "history", proteins=["sp|P01009|A1AT_HUMAN", "P02768-3"])
+    assert sorted(set(trend_df["lead_accession"].astype(str))) == ["P01009", "P02768"]
+
+
+def test_default_reads_relevant_proteins(tmp_path, protein_groups):
+    _append(tmp_path, protein_groups, 1)
+
+    trend_df = history.read_trends(tmp_path / "history", method="Direct", experiment="SDC")
+    assert trend_df["gene_name"].astype(str).tolist() == ["ALB"]
+    assert history.read_trends(tmp_path / "history", method="C18").empty
+
+
+def test_arguments_accept_the_pipeline_names(monkeypatch, protein_groups):
+    monkeypatch.setattr(
+        "sys.argv",
+        ["history.py", "history", "-o", "trends.tsv", "--method", "C18", "--experiment", "Urea"],
+    )
+    args = history.parse_arguments()
+
+    # The names given to the trend report are the ones the runs are stored under
+    run_config = pipeline.PipelineConfig(
+        input=str(protein_groups), method=args.method.lower(), experiment=args.experiment.lower()
+    )
+    assert (run_config.method, run_config.experiment) == (args.method, args.experiment)
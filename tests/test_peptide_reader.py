@@ -0,0 +1,54 @@
+import numpy as np
+
+import peptide_reader
+
+
+def _write_peptides(output_file, rows: list[list[str]]):
+    header = ["Sequence", "Proteins", "Leading razor protein", "Protein group IDs", "Gene names", "Protein names"]
+    header += [f"Intensity Dried_{i}" for i in range(1, 4)]
+    header += [f"Intensity Liquid_{i}" for i in range(1, 4)]
+    header += ["Reverse", "Potential contaminant", "id"]
+    lines = ["\t".join(header)] + [
+        "\t".join([f"PEPTIDE{i}", razor_protein, razor_protein, group_ids, "GENE", "name", *values, "", "", str(i)])
+        for i, (razor_protein, group_ids, *values) in enumerate(rows)
+    ]
+    output_file.write_text("\n".join(lines) + "\n")
+    return output_file
+
+
+def _write_protein_groups(output_file, groups: list[list[str]]):
+    header = ["Protein IDs", "Majority protein IDs", "", "", "", "Protein names", "Gene names", "id"]
+    lines = ["\t".join(header)] + [
+        "\t".join([protein_ids, majority_protein_ids, "", "", "", f"{group_id} name", f"GENE{group_id}", group_id])
+        for group_id, protein_ids, majority_protein_ids in groups
+    ]
+    output_file.write_text("\n".join(lines) + "\n")
+    return output_file
+
+
+PEPTIDES = [
+    ["P1", "0", "1", "1", "1", "1", "1", "1"],
+    ["P2", "0", "2", "2", "2", "2", "2", "2"],
+    # A peptide shared by both groups is summed for the group of its razor protein
+    ["P3", "0;1", "4", "4", "4", "4", "4", "4"],
+]
+
+
+def test_peptides_are_summed_per_protein_group(tmp_path):
+    _write_protein_groups(tmp_path / "proteinGroups.txt", [["0", "P1;P2;P4", "P1;P2"], ["1", "P3;P4", "P3;P4"]])
+    input_file = _write_peptides(tmp_path / "peptides.txt", PEPTIDES)
+
+    data_frame = peptide_reader.create_peptide_intensity_dataframe(input_file).set_index("protein_id")
+
+    assert sorted(data_frame.index) == ["P1;P2", "P3;P4"]
+    np.testing.assert_array_equal(data_frame.loc[["P1;P2", "P3;P4"], "dried_1"], [3, 4])
+    assert data_frame.at["P3;P4", "gene_name"] == "GENE1"
+
+
+def test_peptides_are_summed_per_razor_protein_without_protein_groups(tmp_path):
+    input_file = _write_peptides(tmp_path / "peptides.txt", PEPTIDES)
+
+    data_frame = peptide_reader.create_peptide_intensity_dataframe(input_file).set_index("protein_id")
+
+    assert sorted(data_frame.index) == ["P1", "P2", "P3"]
+    np.testing.assert_array_equal(data_frame.loc[["P1", "P2", "P3"], "dried_1"], [1, 2, 4])
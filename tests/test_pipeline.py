@@ -0,0 +1,28 @@
+import numpy as np
+
+import file_operations
+import multivariate
+import normalization
+import pipeline
+import quality_control
+
+
+def test_replicate_qc_uses_unmodified_intensities(config):
+    result = pipeline.analyze(config)
+
+    expected = quality_control.replicate_qc(file_operations.create_intensity_dataframe(config.input))
+    assert result.replicate_qc.replicates == expected.replicates
+    np.testing.assert_allclose(result.replicate_qc.missing_rate, expected.missing_rate)
+    np.testing.assert_allclose(result.replicate_qc.outlier_score, expected.outlier_score, equal_nan=True)
+    np.testing.assert_allclose(result.replicate_qc.correlation, expected.correlation, equal_nan=True)
+
+
+def test_multivariate_uses_unmodified_intensities(config):
+    result = pipeline.analyze(config)
+
+    expected = multivariate.multivariate_analysis(
+        normalization.normalize_intensities(file_operations.create_intensity_dataframe(config.input))
+    )
+    assert result.multivariate_result.samples == expected.samples
+    np.testing.assert_allclose(result.multivariate_result.scores, expected.scores, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(result.multivariate_result.correlation, expected.correlation, equal_nan=True)
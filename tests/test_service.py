@@ -0,0 +1,48 @@
+import argparse
+import asyncio
+import json
+
+import pytest
+
+import service
+
+
+async def _request(request: bytes) -> tuple[int, dict]:
+    """
+    Send a raw request to a service on a free port, and return the status and json body of the response
+    """
+    analysis_service = service.AnalysisService(
+        argparse.Namespace(host="127.0.0.1", port=0, workers=1, excel=None)
+    )
+    server = await asyncio.start_server(analysis_service._handle_connection, host="127.0.0.1", port=0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout=10)
+        writer.close()
+    finally:
+        server.close()
+        await server.wait_closed()
+        analysis_service._executor.shutdown()
+
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+@pytest.mark.parametrize("content_length", ["abc", "-5", "1.5", ""])
+def test_invalid_content_length(content_length):
+    request = (
+        "POST /analyze?method=direct&experiment=urea HTTP/1.1\r\n"
+        f"Content-Length: {content_length}\r\n\r\n"
+    ).encode()
+
+    status, body = asyncio.run(_request(request))
+    assert status == 400
+    assert "Content-Length" in body["error"]
+
+
+def test_missing_content_length():
+    status, _ = asyncio.run(_request(b"POST /analyze HTTP/1.1\r\n\r\n"))
+    assert status == 411
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import statistics
+
+
+def _points_with_outliers(num_points: int = 120, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    x_values = rng.uniform(1, 10, size=num_points)
+    y_values = 0.97 * x_values + rng.normal(0, 0.1, size=num_points)
+    # A few large outliers pull the least squares line, but not the robust lines
+    y_values[:8] += 15
+    return x_values, y_values
+
+
+@pytest.mark.parametrize("method", ["huber", "theil_sen"])
+def test_resample_fit_matches_trendline_fit(method):
+    x_values, y_values = _points_with_outliers()
+    weights = np.ones(len(x_values))
+
+    if method == "huber":
+        expected = statistics._huber_regression(x_values, y_values, weights)
+        slopes, y_intercepts, _ = statistics.BootstrapRegression._fit_resamples_huber(
+            x_values[np.newaxis], y_values[np.newaxis], weights[np.newaxis]
+        )
+    else:
+        expected = statistics._theil_sen_regression(x_values, y_values)
+        first, second = statistics._theil_sen_pairs(len(x_values))
+        slopes, y_intercepts, _ = statistics.BootstrapRegression._fit_resamples_theil_sen(
+            x_values[np.newaxis], y_values[np.newaxis], weights[np.newaxis], first=first, second=second
+        )
+
+    np.testing.assert_allclose([slopes[0], y_intercepts[0]], expected, rtol=1e-8)
+
+
+def test_theil_sen_bootstrap_uses_trendline_pairs():
+    # More points than THEIL_SEN_MAX_PAIRS pairs, so both sample the same pairs
+    x_values, y_values = _points_with_outliers(num_points=400)
+    assert 400 * 399 // 2 > statistics.THEIL_SEN_MAX_PAIRS
+    weights = np.ones(len(x_values))
+
+    expected = statistics._theil_sen_regression(x_values, y_values)
+    first, second = statistics._theil_sen_pairs(len(x_values))
+    assert len(first) == statistics.THEIL_SEN_MAX_PAIRS
+    slopes, y_intercepts, _ = statistics.BootstrapRegression._fit_resamples_theil_sen(
+        x_values[np.newaxis], y_values[np.newaxis], weights[np.newaxis], first=first, second=second
+    )
+
+    np.testing.assert_allclose([slopes[0], y_intercepts[0]], expected, rtol=1e-8)
+
+
+@pytest.mark.parametrize("method", ["huber", "theil_sen"])
+def test_bootstrap_intervals_use_regression_method(method):
+    x_values, y_values = _points_with_outliers()
+
+    robust = statistics.BootstrapRegression(x_values, y_values, num_resamples=300, seed=0, method=method)
+    ordinary = statistics.BootstrapRegression(x_values, y_values, num_resamples=300, seed=0)
+
+    # The outliers make least squares resamples vary much more than robust resamples
+    assert robust.method == method
+    assert robust.slope_interval[0] <= 0.97 <= robust.slope_interval[1]
+    assert np.diff(robust.slope_interval)[0] < np.diff(ordinary.slope_interval)[0] / 5
+
+
+def test_unknown_bootstrap_method():
+    with pytest.raises(ValueError):
+        statistics.BootstrapRegression(np.arange(5.0), np.arange(5.0), method="lasso")
@@ -0,0 +1,41 @@
+import argparse
+import concurrent.futures
+
+import pandas as pd
+
+import pipeline
+import watcher
+
+
+def _finished_future(result) -> concurrent.futures.Future:
+    future = concurrent.futures.Future()
+    future.set_result(result)
+    return future
+
+
+def test_collect_continues_after_failed_excel_write(tmp_path, monkeypatch):
+    args = argparse.Namespace(
+        directory=str(tmp_path),
+        pattern=watcher.DEFAULT_PATTERN,
+        ledger=str(tmp_path / "processed_inputs.json"),
+        workers=1,
+    )
+    directory_watcher = watcher.DirectoryWatcher(args)
+
+    def write_excel(data_frame: pd.DataFrame, config: pipeline.PipelineConfig) -> None:
+        if config.method == "Direct":
+            raise PermissionError("The workbook is locked")
+
+    monkeypatch.setattr(pipeline, "write_excel", write_excel)
+    for digest, method in [("failed", "direct"), ("written", "c18")]:
+        config = pipeline.PipelineConfig(
+            input="", method=method, experiment="sdc", excel=str(tmp_path / "results.xlsx")
+        )
+        future = _finished_future(pd.DataFrame())
+        directory_watcher._pending[future] = (tmp_path / method / "proteinGroups.txt", digest, config)
+
+    directory_watcher.collect()
+
+    assert "failed" not in directory_watcher._ledger
+    assert "written" in directory_watcher._ledger
+    assert not directory_watcher._pending
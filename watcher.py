@@ -0,0 +1,290 @@
+import argparse
+import concurrent.futures
+import datetime
+import json
+import pathlib
+import re
+import signal
+import time
+
+import pandas as pd
+
+import arg_parse
+import file_operations
+import filter_values
+import pipeline
+
+# Matches paths such as ".../direct/urea/proteinGroups.txt" or ".../C18/SDC/proteinGroups.txt.gz"
+DEFAULT_PATTERN = r"(?P<method>direct|c18)/(?P<experiment>sdc|urea)/proteinGroups\.txt(\.(gz|bz2|xz|zst))?$"
+
+
+class _Ledger:
+    def __init__(self, ledger_path: pathlib.Path):
+        """
+        A record of every input that has already been processed, keyed by a hash of the file contents
+        It is stored as a json file, so processed inputs are skipped after the watcher is restarted
+
+        :param ledger_path: The location of the ledger json file
+        """
+        self._ledger_path = ledger_path
+        self._entries: dict[str, dict] = {}
+
+        if self._ledger_path.exists():
+            with open(self._ledger_path, "r") as i_stream:
+                self._entries = json.load(i_stream)
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._entries
+
+    def add(self, digest: str, input_file: pathlib.Path) -> None:
+        """
+        This function will record a processed input and save the ledger
+
+        The ledger is written to a temporary file first, so it is never left partially written
+
+        :param digest: The hash of the input file contents
+        :param input_file: The input file
+        :return: None
+        """
+        self._entries[digest] = {
+            "input": str(input_file),
+            "processed": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+
+        temporary_path = self._ledger_path.with_suffix(".tmp")
+        with open(temporary_path, "w") as o_stream:
+            json.dump(self._entries, o_stream, indent=2)
+        temporary_path.replace(self._ledger_path)
+
+
+def parse_run_arguments(
+    input_file: pathlib.Path,
+    directory: pathlib.Path,
+    pattern: re.Pattern,
+    template: argparse.Namespace,
+) -> pipeline.PipelineConfig | None:
+    """
+    This function will infer the method and experiment of an input file from its path
+
+    The pattern must contain the named groups "method" (direct or c18) and "experiment" (sdc or urea)
+    It is matched against the path relative to the watched directory
+
+    :param input_file: The proteinGroups.txt file
+    :param directory: The watched directory
+    :param pattern: The compiled path pattern
+    :param template: The watcher arguments, containing the excel file and analysis arguments
+    :return: The settings for this run, or None if the path does not match the pattern
+    """
+    relative_path = input_file.relative_to(directory).as_posix()
+    match = pattern.search(relative_path)
+    if match is None:
+        return None
+
+    run_args = argparse.Namespace(**vars(template))
+    run_args.input = str(input_file)
+    run_args.method = "Direct" if match["method"].lower() == "direct" else "C18"
+    run_args.experiment = "Urea" if match["experiment"].lower() == "urea" else "SDC"
+
+    return pipeline.PipelineConfig.from_namespace(run_args)
+
+
+def _warm_worker() -> None:
+    """
+    This function is run once in every worker process when it starts
+    It loads the clinically relevant proteins, so they are not read again for each input
+    Interrupts are ignored, as the watcher shuts the workers down itself
+
+    :return: None
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    filter_values.load_clinical_proteins()
+
+
+def _analyze_run(config: pipeline.PipelineConfig) -> pd.DataFrame:
+    """
+    This function will analyze one input in a worker process
+    Only the dataframe is returned, as the figures have already been written to file
+
+    :param config: The settings for this run
+    :return: The filtered dataframe, used to write the excel file
+    """
+    return pipeline.analyze(config).data_frame
+
+
+class DirectoryWatcher:
+    def __init__(self, args: argparse.Namespace):
+        """
+        Watch a directory for new or changed MaxQuant results, and analyze them in a pool of worker processes
+
+        Files are only processed once their size and modification time have not changed for settle_time seconds,
+        so files that are still being copied are not read
+        Analysis is done in the worker processes; the excel file is written by this process, one input at a time
+
+        :param args: The arguments retrieved from the command line
+        """
+        self._args = args
+        self._directory = pathlib.Path(args.directory)
+        self._pattern = re.compile(args.pattern, flags=re.IGNORECASE)
+        self._ledger = _Ledger(pathlib.Path(args.ledger))
+
+        # The last seen (size, modification time) of each file, and when it was first seen with those values
+        self._file_states: dict[pathlib.Path, tuple[tuple[int, int], float]] = {}
+        # Files that have been submitted, with the state they were submitted at
+        self._submitted_states: dict[pathlib.Path, tuple[int, int]] = {}
+
+        self._pending: dict[concurrent.futures.Future, tuple] = {}
+        self._stopping: bool = False
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=args.workers, initializer=_warm_worker
+        )
+
+    def poll(self) -> None:
+        """
+        This function will check the watched directory once, and submit every settled file that has not been processed
+
+        :return: None
+        """
+        now = time.monotonic()
+        for input_file in self._directory.rglob("proteinGroups.txt*"):
+            stat = input_file.stat()
+            state = (stat.st_size, stat.st_mtime_ns)
+
+            previous_state, first_seen = self._file_states.get(input_file, (None, now))
+            if state != previous_state:
+                self._file_states[input_file] = (state, now)
+                continue
+
+            settled = now - first_seen >= self._args.settle_time
+            if not settled or self._submitted_states.get(input_file) == state:
+                continue
+            self._submitted_states[input_file] = state
+
+            config = parse_run_arguments(
+                input_file, self._directory, self._pattern, self._args
+            )
+            if config is None:
+                print(f"Skipping {input_file}, the path does not match the pattern")
+                continue
+
+            digest = file_operations.file_digest(input_file)
+            if digest in self._ledger:
+                print(f"Skipping {input_file}, it has already been processed")
+                continue
+
+            print(f"Submitting {input_file} ({config.method} {config.experiment})")
+            future = self._executor.submit(_analyze_run, config)
+            self._pending[future] = (input_file, digest, config)
+
+    def collect(self) -> None:
+        """
+        This function will write the results of finished analyses to the excel file, and record them in the ledger
+
+        An input whose results could not be written is not recorded, so it is processed again when the watcher restarts
+
+        :return: None
+        """
+        finished = [future for future in self._pending if future.done()]
+        for future in finished:
+            input_file, digest, config = self._pending.pop(future)
+
+            try:
+                intensities_df = future.result()
+            except Exception as error:
+                print(f"Failed to process {input_file}: {error}")
+                continue
+
+            if config.excel is not None:
+                try:
+                    pipeline.write_excel(intensities_df, config)
+                except Exception as error:
+                    print(f"Failed to write results of {input_file} to {config.excel}: {error}")
+                    continue
+            self._ledger.add(digest, input_file)
+            print(f"Finished {input_file}")
+
+    def stop(self, *_) -> None:
+        """
+        This function will ask the watcher to stop after the current check of the directory
+        It is used as the interrupt handler, so the excel file is never left partially written
+
+        :return: None
+        """
+        self._stopping = True
+
+    def run_forever(self) -> None:
+        """
+        This function will poll the watched directory until interrupted
+
+        :return: None
+        """
+        self._stopping = False
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        print(f"Watching {self._directory}")
+        while not self._stopping:
+            self.poll()
+            self.collect()
+            time.sleep(self._args.interval)
+
+        print("Stopping, waiting for running analyses to finish")
+        self._executor.shutdown(wait=True)
+        self.collect()
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    This function will parse the watcher command line arguments
+
+    :return: The parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Watch a directory for MaxQuant results and analyze each new proteinGroups.txt file"
+    )
+    parser.add_argument(
+        "--directory",
+        required=True,
+        help="The directory to watch, including subdirectories",
+    )
+    arg_parse.add_excel_arguments(parser)
+    parser.add_argument(
+        "--pattern",
+        default=DEFAULT_PATTERN,
+        help="A regular expression matched against each file path relative to the directory. "
+        "It must contain the named groups 'method' (direct/c18) and 'experiment' (sdc/urea)",
+    )
+    parser.add_argument(
+        "--ledger",
+        default=None,
+        help="The json file recording processed inputs (default: processed_inputs.json in the watched directory)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=2, help="The number of worker processes"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=5,
+        help="The number of seconds between checking the directory",
+    )
+    parser.add_argument(
+        "--settle-time",
+        type=float,
+        default=10,
+        help="The number of seconds a file must be unchanged before it is processed",
+    )
+    arg_parse.add_analysis_arguments(parser)
+
+    args = parser.parse_args()
+    arg_parse.validate_analysis_arguments(args)
+    arg_parse.validate_excel_arguments(args)
+
+    if args.ledger is None:
+        args.ledger = str(pathlib.Path(args.directory) / "processed_inputs.json")
+
+    return args
+
+
+if __name__ == "__main__":
+    watcher = DirectoryWatcher(parse_arguments())
+    watcher.run_forever()